@@ -17,6 +17,8 @@ import pickle
 
 import netCDF4 as nc4
 
+import nc_storage_profiles
+
 import datetime
 import numpy as np
 
@@ -62,6 +64,10 @@ ic(max_nbr_of_samples)
 # ------------------------------------------------------------------------------------------
 print("***** prepare the dataset")
 
+# the storage of the netCDF variables (chunk shapes, compression): "contiguous" (uncompressed, as before), or the
+# opt-in "trajectory" or "time_window"; see nc_storage_profiles.py
+nc_storage_profile = "contiguous"
+
 output_file = "data_drift_2017_April_Spitsbergen_Bank.nc"
 
 with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
@@ -151,11 +157,11 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # ------------------------------------------------------------
     # variables
 
-    trajectory_var = nc4_out.createVariable("trajectory_id", "c", ("trajectory", "len_of_name"))
+    trajectory_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "trajectory_id", "c", ("trajectory", "len_of_name"))
     trajectory_var.standard_name = "platform_id"
     trajectory_var.long_name = "platform name"
 
-    time_var = nc4_out.createVariable("time", "f8", ("trajectory", "observation"))
+    time_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "time", "f8", ("trajectory", "observation"))
     time_var.standard_name = "time"
     time_var.long_name = "time"
     time_var.units = "seconds since 1970-01-01 00:00:00 +0000"
@@ -163,12 +169,12 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # --------------------
     # geographic location variables
 
-    lon_var = nc4_out.createVariable("lon", "f4", ("trajectory", "observation"))
+    lon_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "lon", "f4", ("trajectory", "observation"))
     lon_var.standard_name = "longitude"
     lon_var.long_name = "longitude"
     lon_var.units = "degrees_east"
 
-    lat_var = nc4_out.createVariable("lat", "f4", ("trajectory", "observation"))
+    lat_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "lat", "f4", ("trajectory", "observation"))
     lat_var.standard_name = "latitude"
     lat_var.long_name = "latitude"
     lat_var.units = "degrees_north"
@@ -237,36 +243,48 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
 
         all_ordered_data[crrt_instrument] = list_measurements_cleaned
 
+    # the fixes of all instruments, filled in memory and written to the variables at the end
+    array_trajectory_id = np.full((nbr_of_instruments, length_of_name), b"\0", dtype="S1")
+    array_is_entry = np.full((nbr_of_instruments, max_nbr_of_samples), False)
+    array_is_gnss = np.full((nbr_of_instruments, max_nbr_of_samples), False)
+    array_time = np.full((nbr_of_instruments, max_nbr_of_samples), nc4.default_fillvals["f8"])
+    array_lon = np.full((nbr_of_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+    array_lat = np.full((nbr_of_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+
     for crrt_instrument in all_data:
         crrt_ordered_data = all_ordered_data[crrt_instrument]  # the data we need to add
         crrt_trajectory = list(all_data.keys()).index(crrt_instrument)  # the trajectory number; so that numbering fits with the index of the instrument to use
 
-        # fill the name variable
-        for crrt_ind, crrt_char in enumerate(crrt_instrument):
-            nc4_out["trajectory_id"][crrt_trajectory, crrt_ind] = crrt_char
+        # fill the name variable; the end of the name is already "\0"
+        array_trajectory_id[crrt_trajectory, :len(crrt_instrument)] = list(crrt_instrument)
 
-        for crrt_ind in range(crrt_ind+1, length_of_name):
-            nc4_out["trajectory_id"][crrt_trajectory, crrt_ind] = "\0"
+        array_is_entry[crrt_trajectory, :len(crrt_ordered_data)] = True
 
         for crrt_observation, crrt_data_entry in enumerate(crrt_ordered_data):
-            time_var[crrt_trajectory, crrt_observation] = \
+            array_time[crrt_trajectory, crrt_observation] = \
                 crrt_data_entry.datetime_fix.timestamp()
 
-            datetime_start = min(datetime_start, crrt_data_entry.datetime_fix)
-            datetime_end = max(datetime_end, crrt_data_entry.datetime_fix)
-
             if isinstance(crrt_data_entry, GNSS_Packet):  # is it a GNSS entry?
-                lon_var[crrt_trajectory, crrt_observation] = crrt_data_entry.longitude
-                lat_var[crrt_trajectory, crrt_observation] = crrt_data_entry.latitude
-
-                lat_min = min(lat_min, crrt_data_entry.latitude)
-                lat_max = max(lat_max, crrt_data_entry.latitude)
-                lon_min = min(lon_min, crrt_data_entry.longitude)
-                lon_max = max(lon_max, crrt_data_entry.longitude)
+                array_is_gnss[crrt_trajectory, crrt_observation] = True
+                array_lon[crrt_trajectory, crrt_observation] = crrt_data_entry.longitude
+                array_lat[crrt_trajectory, crrt_observation] = crrt_data_entry.latitude
             else:
                 print(f"WARNING: unknown kind for packet: {crrt_data_entry}")
                 #raise RuntimeError("unknown kind for packet: {}".format(crrt_data_entry))
 
+    trajectory_var[:] = array_trajectory_id
+    time_var[:] = array_time
+    lon_var[:] = array_lon
+    lat_var[:] = array_lat
+
+    # the extreme bounds: positions from the GNSS entries, times from all the entries
+    lat_min = float(np.min(array_lat[array_is_gnss], initial=lat_min))
+    lat_max = float(np.max(array_lat[array_is_gnss], initial=lat_max))
+    lon_min = float(np.min(array_lon[array_is_gnss], initial=lon_min))
+    lon_max = float(np.max(array_lon[array_is_gnss], initial=lon_max))
+    datetime_start = datetime.datetime.fromtimestamp(np.min(array_time[array_is_entry], initial=datetime_start.timestamp()), tz=datetime_start.tzinfo)
+    datetime_end = datetime.datetime.fromtimestamp(np.max(array_time[array_is_entry], initial=datetime_end.timestamp()), tz=datetime_end.tzinfo)
+
     nc4_out.geospatial_lat_min = str(lat_min)
     nc4_out.geospatial_lat_max = str(lat_max)
     nc4_out.geospatial_lon_min = str(lon_min)
@@ -5,7 +5,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from scipy import integrate
-from utils import sort_dict_keys_by_date
+from utils import sort_dict_keys_by_date_within
 
 # initially from ../generate_dict_data/load_Iridium_wave_data ugly but...
 def expand_raw_variables(dict_data):
@@ -124,16 +124,16 @@ time_start = datetime(year=2018, month=9, day=15, hour=00, tzinfo=None)  # the b
 time_end = datetime(year=2018, month=10, day=15, hour=23, tzinfo=None)  # long enough later that all stopped to work
 
 # %% sort dictionary by date of transmission
-keys_sorted_by_date = sort_dict_keys_by_date(dict_data)
+(keys_sorted_by_date, array_is_within_time) = sort_dict_keys_by_date_within(dict_data, time_start, time_end)
 
 # %% load the whole data; this is ugly and should be broken in a series of functions, but...
 dict_data_each_logger = {}
 
-for crrt_key in keys_sorted_by_date:
+for (crrt_key, crrt_is_within_time) in zip(keys_sorted_by_date, array_is_within_time):
     crrt_time = dict_data[crrt_key]['datetime']
 
     # check if within the time
-    if crrt_time > time_start and crrt_time < time_end:
+    if crrt_is_within_time:
         crrt_logger_ID = dict_data[crrt_key]['Device']
 
         # if a spectrum file, fill in the status
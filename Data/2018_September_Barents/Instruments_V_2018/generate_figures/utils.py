@@ -1,3 +1,6 @@
+import numpy as np
+
+
 # a function to return an ordered list of keys for which in the right time interval, ordered by time
 def sort_dict_keys_by_date(dict_in):
     list_key_datetime = []
@@ -12,4 +15,18 @@ def sort_dict_keys_by_date(dict_in):
     return(sorted_keys)
 
 
+# the same, together with a boolean array telling for each of the sorted keys if it is strictly within (time_start, time_end);
+# the datetimes are sorted and compared to the bounds as one array, rather than one by one
+def sort_dict_keys_by_date_within(dict_in, time_start, time_end):
+    list_keys = list(dict_in)
+    array_datetimes = np.array([dict_in[crrt_key]['datetime'] for crrt_key in list_keys], dtype="datetime64[us]")
+
+    array_order = np.argsort(array_datetimes, kind="stable")
+    sorted_keys = [list_keys[crrt_index] for crrt_index in array_order]
+    array_datetimes = array_datetimes[array_order]
+    array_is_within = (array_datetimes > np.datetime64(time_start, "us")) & (array_datetimes < np.datetime64(time_end, "us"))
+
+    return(sorted_keys, array_is_within)
+
+
 # a function to return only the keys that correspond to a given kind of data (status / spectrum)
@@ -1,6 +1,5 @@
 """Generate data python dict from the rock7 csv hex message files."""
 
-from datetime import datetime
 from binascii import unhexlify
 
 import csv
@@ -8,6 +7,7 @@ import pickle
 
 import load_Iridium_wave_data
 import load_status_information
+import rock7_datetimes
 
 verbose = 5
 
@@ -39,6 +39,9 @@ for crrt_rock7_id in list_rock7_ids:
         for index, row in enumerate(input_dict):
             dict_entries[index] = row
 
+    # parse the datetimes of all the entries in one go, rather than one strptime per entry
+    dict_entry_datetimes = dict(zip(dict_entries, rock7_datetimes.parse_rock7_datetimes_to_datetimes([dict_entries[crrt_entry]["Date Time (UTC)"] for crrt_entry in dict_entries])))
+
     for crrt_entry in dict_entries:
         if verbose > 0:
             print(crrt_entry)
@@ -70,7 +73,7 @@ for crrt_rock7_id in list_rock7_ids:
             pass
         else:
             raise RuntimeError("invalid crrt_datetime string length")
-        crrt_datetime = datetime.strptime(crrt_date_string, '%d/%b/%Y %H:%M:%S')
+        crrt_datetime = dict_entry_datetimes[crrt_entry]
         crrt_data['datetime'] = crrt_datetime
 
         if verbose > 0:
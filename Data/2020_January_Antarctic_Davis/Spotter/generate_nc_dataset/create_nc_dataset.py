@@ -17,6 +17,8 @@ import pickle
 
 import netCDF4 as nc4
 
+import nc_storage_profiles
+
 import datetime
 import numpy as np
 
@@ -68,6 +70,10 @@ ic(nbr_instruments)
 # ------------------------------------------------------------------------------------------
 print("***** prepare the dataset")
 
+# the storage of the netCDF variables (chunk shapes, compression): "contiguous" (uncompressed, as before), or the
+# opt-in "trajectory" or "time_window"; see nc_storage_profiles.py
+nc_storage_profile = "contiguous"
+
 output_file = "data_Spotter_Antarctic_Davis_2020_01.nc"
 
 with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
@@ -168,13 +174,13 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # "metadata" variables
 
     # the frequency base used for the spectra
-    frequency_var = nc4_out.createVariable("frequency", "f4", ("frequency"))
+    frequency_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "frequency", "f4", ("frequency"))
     frequency_var.long_name = "frequency bins of the spectra"
     frequency_var.units = "s-1"
 
     # --------------------
     # instrument names
-    trajectory_var = nc4_out.createVariable("trajectory_id", "c", ("trajectory", "len_of_name"))
+    trajectory_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "trajectory_id", "c", ("trajectory", "len_of_name"))
     trajectory_var.standard_name = "platform_id"
     trajectory_var.long_name = "platform name"
 
@@ -182,12 +188,12 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # time and kind of message variables
 
     # the kind of each entry: 'G' for GPS entry, 'W' for wave spectrum entry, 'N' for no entry
-    kind_var = nc4_out.createVariable("message_kind", "c", ("trajectory", "observation"))
+    kind_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "message_kind", "c", ("trajectory", "observation"))
     kind_var.long_name = "whether the current [trajectory, observation] is a 'small' packet with GPS and wave stats [kind S]" +\
         ", or both GNSS, wave stats, and wave spectra [kind B], or None [kind N, in case of failed transmission] " +\
         "data."
 
-    time_var = nc4_out.createVariable("time", "f8", ("trajectory", "observation"))
+    time_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "time", "f8", ("trajectory", "observation"))
     time_var.standard_name = "time"
     time_var.long_name = "time"
     time_var.units = "seconds since 1970-01-01 00:00:00 +0000"
@@ -195,12 +201,12 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # --------------------
     # geographic location variables
 
-    lon_var = nc4_out.createVariable("lon", "f4", ("trajectory", "observation"))
+    lon_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "lon", "f4", ("trajectory", "observation"))
     lon_var.standard_name = "longitude"
     lon_var.long_name = "longitude"
     lon_var.units = "degrees_east"
 
-    lat_var = nc4_out.createVariable("lat", "f4", ("trajectory", "observation"))
+    lat_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "lat", "f4", ("trajectory", "observation"))
     lat_var.standard_name = "latitude"
     lat_var.long_name = "latitude"
     lat_var.units = "degrees_north"
@@ -208,21 +214,21 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # --------------------
     # wave information variables
 
-    spectrum_var = nc4_out.createVariable("wave_spectrum", "f4", ("trajectory", "observation", "frequency"))
+    spectrum_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "wave_spectrum", "f4", ("trajectory", "observation", "frequency"))
     spectrum_var.long_name = "under sampled wave spectrum S of the sea ice surface elevation"
     spectrum_var.units = "m2.s"
 
-    hs_var = nc4_out.createVariable("hs", "f4", ("trajectory", "observation"))
+    hs_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "hs", "f4", ("trajectory", "observation"))
     hs_var.standard_name = "sea_surface_swell_wave_significant_height"
     hs_var.long_name = "significant wave height of sea ice surface elevation computed as 4*sqrt(m0)"
     hs_var.units = "m"
 
-    tp_var = nc4_out.createVariable("tp", "f4", ("trajectory", "observation"))
+    tp_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "tp", "f4", ("trajectory", "observation"))
     tp_var.standard_name = "sea_surface_swell_wave_period"
     tp_var.long_name = "period of sea ice surface elevation computed as sqrt(m0/m2)"
     tp_var.units = "s"
 
-    tm_var = nc4_out.createVariable("tm", "f4", ("trajectory", "observation"))
+    tm_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "tm", "f4", ("trajectory", "observation"))
     tm_var.standard_name = "sea_surface_swell_wave_peak_period"
     tm_var.long_name = "peak period of sea ice surface elevation"
     tm_var.units = "s"
@@ -230,8 +236,7 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # ------------------------------------------------------------
     # filling the "meta" data in
 
-    for crrt_ind, crrt_frequency in enumerate(DEFAULT_FREQS):
-        frequency_var[crrt_ind] = crrt_frequency
+    frequency_var[:] = np.array(DEFAULT_FREQS)
 
     # ------------------------------------------------------------
     # filling the data in and get the "extreme bounds"
@@ -243,13 +248,22 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     datetime_start = datetime.datetime.fromtimestamp(2e10)
     datetime_end = datetime.datetime.fromtimestamp(0)
 
+    # all observations go to these arrays first, and are written to the variables at the end
+    array_trajectory_id = np.full((nbr_instruments, length_of_name), b"\0", dtype="S1")
+    array_kind = np.full((nbr_instruments, max_nbr_of_samples), b"\0", dtype="S1")
+    array_is_entry = np.full((nbr_instruments, max_nbr_of_samples), False)
+    array_time = np.full((nbr_instruments, max_nbr_of_samples), nc4.default_fillvals["f8"])
+    array_lon = np.full((nbr_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+    array_lat = np.full((nbr_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+    array_spectrum = np.full((nbr_instruments, max_nbr_of_samples, nbr_of_frequency_bins), nc4.default_fillvals["f4"])
+    array_hs = np.full((nbr_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+    array_tp = np.full((nbr_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+    array_tm = np.full((nbr_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+
     for crrt_trajectory, crrt_instrument in enumerate(list_instruments):
 
-        # fill the name variable
-        for crrt_ind, crrt_char in enumerate(crrt_instrument):
-            nc4_out["trajectory_id"][crrt_trajectory, crrt_ind] = crrt_char
-        for crrt_ind in range(crrt_ind+1, length_of_name):
-            nc4_out["trajectory_id"][crrt_trajectory, crrt_ind] = "\0"
+        # fill the name variable; the end of the name is already "\0"
+        array_trajectory_id[crrt_trajectory, :len(crrt_instrument)] = list(crrt_instrument)
 
         # fill in all observations
         for crrt_observation, crrt_timestamp in enumerate(dict_metadata[crrt_instrument]["timestamps"]):
@@ -263,32 +277,21 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
             ic(crrt_timestamp)
             ic(crrt_entry)
 
-            crrt_datetime = datetime.datetime.fromtimestamp(crrt_timestamp)
-            crrt_lat = crrt_entry["lat"]
-            crrt_lon = crrt_entry["lon"]
+            array_is_entry[crrt_trajectory, crrt_observation] = True
+            array_time[crrt_trajectory, crrt_observation] = crrt_timestamp
+            array_lon[crrt_trajectory, crrt_observation] = crrt_entry["lon"]
+            array_lat[crrt_trajectory, crrt_observation] = crrt_entry["lat"]
 
-            time_var[crrt_trajectory, crrt_observation] = crrt_timestamp
-            lon_var[crrt_trajectory, crrt_observation] = crrt_lon
-            lat_var[crrt_trajectory, crrt_observation] = crrt_lat
-
-            datetime_start = min(datetime_start, crrt_datetime)
-            datetime_end = max(datetime_end, crrt_datetime)
-            lat_min = min(lat_min, crrt_lat)
-            lat_max = max(lat_max, crrt_lat)
-            lon_min = min(lon_min, crrt_lon)
-            lon_max = max(lon_max, crrt_lon)
-
-            hs_var[crrt_trajectory, crrt_observation] = crrt_entry["hs"]
-            tp_var[crrt_trajectory, crrt_observation] = crrt_entry["mean_period"]
-            tm_var[crrt_trajectory, crrt_observation] = crrt_entry["peak_period"]
+            array_hs[crrt_trajectory, crrt_observation] = crrt_entry["hs"]
+            array_tp[crrt_trajectory, crrt_observation] = crrt_entry["mean_period"]
+            array_tm[crrt_trajectory, crrt_observation] = crrt_entry["peak_period"]
 
             # if both, put also the spectrum
             if crrt_entry["kind"] == "B":
-                kind_var[crrt_trajectory, crrt_observation] = "B"
-                for crrt_frq_ind in range(nbr_of_frequency_bins):
-                    spectrum_var[crrt_trajectory, crrt_observation, crrt_frq_ind] = crrt_entry["spectrum"][crrt_frq_ind]
+                array_kind[crrt_trajectory, crrt_observation] = "B"
+                array_spectrum[crrt_trajectory, crrt_observation, :] = crrt_entry["spectrum"][:nbr_of_frequency_bins]
             elif crrt_entry["kind"] == "S":
-                kind_var[crrt_trajectory, crrt_observation] = "S"
+                array_kind[crrt_trajectory, crrt_observation] = "S"
             else:
                 raise RuntimeError(f"got entry kind {crrt_entry['kind']}, not a valid entry")
 
@@ -324,6 +327,24 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
             kind_var[crrt_trajectory, crrt_observation] = "N"
     """
 
+    trajectory_var[:] = array_trajectory_id
+    kind_var[:] = array_kind
+    time_var[:] = array_time
+    lon_var[:] = array_lon
+    lat_var[:] = array_lat
+    spectrum_var[:] = array_spectrum
+    hs_var[:] = array_hs
+    tp_var[:] = array_tp
+    tm_var[:] = array_tm
+
+    # the extreme bounds, from all the entries
+    lat_min = float(np.min(array_lat[array_is_entry], initial=lat_min))
+    lat_max = float(np.max(array_lat[array_is_entry], initial=lat_max))
+    lon_min = float(np.min(array_lon[array_is_entry], initial=lon_min))
+    lon_max = float(np.max(array_lon[array_is_entry], initial=lon_max))
+    datetime_start = datetime.datetime.fromtimestamp(np.min(array_time[array_is_entry], initial=datetime_start.timestamp()))
+    datetime_end = datetime.datetime.fromtimestamp(np.max(array_time[array_is_entry], initial=datetime_end.timestamp()))
+
     nc4_out.geospatial_lat_min = str(lat_min)
     nc4_out.geospatial_lat_max = str(lat_max)
     nc4_out.geospatial_lon_min = str(lon_min)
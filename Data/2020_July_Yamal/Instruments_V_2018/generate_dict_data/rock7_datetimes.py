@@ -0,0 +1,95 @@
+"""Parse the "Date Time (UTC)" column of the rock7 csv exports, all at once."""
+
+import datetime
+
+import numpy as np
+
+# the format of the rock7 datetimes, for example "03/May/2022 08:14:52"
+ROCK7_DATETIME_FORMAT = '%d/%b/%Y %H:%M:%S'
+
+# the fixed layout of the rock7 datetimes: the positions of the separators, and of the fields
+_R7_DATETIME_LENGTH = 20
+_R7_DATETIME_SEPARATORS = {2: "/", 6: "/", 11: " ", 14: ":", 17: ":"}
+_R7_DATETIME_DIGITS = {"day": (0, 2), "year": (7, 11), "hour": (12, 14), "minute": (15, 17), "second": (18, 20)}
+_R7_DATETIME_MONTH = (3, 6)
+_R7_MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+# the month names, as the sum of their unicode code points weighted by 2**16, 2**8, 1 (all month names are ascii)
+_R7_MONTH_CODES = np.array([(ord(crrt_name[0]) << 16) + (ord(crrt_name[1]) << 8) + ord(crrt_name[2]) for crrt_name in _R7_MONTH_NAMES], dtype=np.int64)
+
+
+def parse_rock7_datetimes(list_rock7_datetimes):
+    """The posix timestamps (UTC, as an int64 array) of a whole column of rock7 datetime strings, parsed in one go
+    as a matrix of characters. The strings that do not follow the usual layout (for example, a month name in another
+    case) are parsed one by one with strptime, which raises a ValueError if they are not datetimes at all."""
+    array_strings = np.asarray(list_rock7_datetimes, dtype=str).reshape(-1)
+    array_posix = np.zeros((array_strings.shape[0],), dtype=np.int64)
+    if array_strings.shape[0] == 0:
+        return array_posix
+
+    # one row of unicode code points per string, padded with 0s
+    array_chars = np.ascontiguousarray(array_strings).view(np.uint32).reshape(array_strings.shape[0], -1).astype(np.int64)
+    if array_chars.shape[1] < _R7_DATETIME_LENGTH:
+        array_chars = np.pad(array_chars, ((0, 0), (0, _R7_DATETIME_LENGTH - array_chars.shape[1])))
+    array_is_usual = np.all(array_chars[:, _R7_DATETIME_LENGTH:] == 0, axis=1)
+
+    for (crrt_position, crrt_separator) in _R7_DATETIME_SEPARATORS.items():
+        array_is_usual &= array_chars[:, crrt_position] == ord(crrt_separator)
+
+    dict_fields = {}
+    for (crrt_field, (crrt_start, crrt_end)) in _R7_DATETIME_DIGITS.items():
+        crrt_digits = array_chars[:, crrt_start:crrt_end] - ord("0")
+        array_is_usual &= np.all((crrt_digits >= 0) & (crrt_digits <= 9), axis=1)
+        dict_fields[crrt_field] = crrt_digits @ (10 ** np.arange(crrt_end - crrt_start - 1, -1, -1))
+
+    # month name lookup: the code of each name, searched in the sorted codes of the 12 month names
+    array_month_codes = array_chars[:, _R7_DATETIME_MONTH[0]:_R7_DATETIME_MONTH[1]] @ np.array([1 << 16, 1 << 8, 1])
+    array_sorter = np.argsort(_R7_MONTH_CODES)
+    array_sorted_indexes = np.minimum(np.searchsorted(_R7_MONTH_CODES[array_sorter], array_month_codes), len(_R7_MONTH_CODES) - 1)
+    array_months = array_sorter[array_sorted_indexes]
+    array_is_usual &= _R7_MONTH_CODES[array_months] == array_month_codes
+
+    array_is_usual &= (dict_fields["day"] >= 1) & (dict_fields["hour"] < 24) & (dict_fields["minute"] < 60) & (dict_fields["second"] < 60)
+
+    # the strings off the layout get a dummy date, so that the calendar below does not overflow on garbage
+    dict_fields = {crrt_field: np.where(array_is_usual, crrt_values, 1) for (crrt_field, crrt_values) in dict_fields.items()}
+    dict_fields["year"] = np.where(array_is_usual, dict_fields["year"], 1970)
+    array_months = np.where(array_is_usual, array_months, 0)
+
+    # days since the epoch, from the calendar of numpy; a day past the end of its month ends up in the next month
+    array_month_start = (dict_fields["year"] - 1970).astype("datetime64[Y]").astype("datetime64[M]") + array_months.astype("timedelta64[M]")
+    array_days = array_month_start.astype("datetime64[D]") + (dict_fields["day"] - 1).astype("timedelta64[D]")
+    array_is_usual &= array_days.astype("datetime64[M]") == array_month_start
+
+    array_posix[:] = array_days.astype(np.int64) * 86400 + dict_fields["hour"] * 3600 + dict_fields["minute"] * 60 + dict_fields["second"]
+
+    # the fallback, for the few strings off the usual layout
+    for crrt_index in np.flatnonzero(~array_is_usual).tolist():
+        crrt_datetime = datetime.datetime.strptime(str(array_strings[crrt_index]), ROCK7_DATETIME_FORMAT)
+        array_posix[crrt_index] = int(crrt_datetime.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+    return array_posix
+
+
+def parse_rock7_datetimes_to_datetimes(list_rock7_datetimes):
+    """Same as parse_rock7_datetimes, but as a list of naive datetimes (in UTC), as would be given by strptime."""
+    return parse_rock7_datetimes(list_rock7_datetimes).astype("datetime64[s]").tolist()
+
+
+def auto_test():
+    # the second one goes through the strptime fallback
+    assert list(parse_rock7_datetimes(["03/May/2022 08:14:52", "3/may/2022 08:14:52", "29/Feb/2024 23:59:59"])) == [1651565692, 1651565692, 1709251199]
+    assert parse_rock7_datetimes_to_datetimes(["03/May/2022 08:14:52"]) == [datetime.datetime(2022, 5, 3, 8, 14, 52)]
+    assert parse_rock7_datetimes([]).shape == (0,)
+
+    # a day past the end of its month is not a datetime, as for strptime
+    try:
+        parse_rock7_datetimes(["30/Feb/2024 00:00:00"])
+        raise AssertionError("30/Feb/2024 should not parse")
+    except ValueError:
+        pass
+
+    print("rock7_datetimes: auto test ok")
+
+
+if __name__ == "__main__":
+    auto_test()
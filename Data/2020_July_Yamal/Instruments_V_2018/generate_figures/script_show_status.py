@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 import pytz
 import pickle
-from utils import sort_dict_keys_by_date
+from utils import sort_dict_keys_by_date_within
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from matplotlib.patches import Rectangle
@@ -21,16 +21,16 @@ with open(path_to_dump, 'rb') as fh:
     dict_data = pickle.load(fh)
 
 # sort dictionary by date of transmission
-keys_sorted_by_date = sort_dict_keys_by_date(dict_data)
+(keys_sorted_by_date, array_is_within_time) = sort_dict_keys_by_date_within(dict_data, time_start, time_end)
 
 # load the whole data for each logger in a separated dict entry
 dict_data_each_logger = {}
 
-for crrt_key in keys_sorted_by_date:
+for (crrt_key, crrt_is_within_time) in zip(keys_sorted_by_date, array_is_within_time):
     crrt_time = dict_data[crrt_key]['datetime']
 
     # check if within the time
-    if crrt_time > time_start and crrt_time < time_end:
+    if crrt_is_within_time:
         crrt_logger_ID = dict_data[crrt_key]['Device']
 
         # if a status file, fill in the status
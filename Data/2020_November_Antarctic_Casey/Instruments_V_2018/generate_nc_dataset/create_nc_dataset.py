@@ -17,6 +17,8 @@ import pickle
 
 import netCDF4 as nc4
 
+import nc_storage_profiles
+
 import datetime
 import numpy as np
 
@@ -77,6 +79,10 @@ nbr_of_frequency_bins = len(freq)
 # ------------------------------------------------------------------------------------------
 print("***** prepare the dataset")
 
+# the storage of the netCDF variables (chunk shapes, compression): "contiguous" (uncompressed, as before), or the
+# opt-in "trajectory" or "time_window"; see nc_storage_profiles.py
+nc_storage_profile = "contiguous"
+
 output_file = "data_waves_Antarctic_Casey_2020_10.nc"
 
 with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
@@ -175,13 +181,13 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # "metadata" variables
 
     # the frequency base used for the spectra
-    frequency_var = nc4_out.createVariable("frequency", "f4", ("frequency"))
+    frequency_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "frequency", "f4", ("frequency"))
     frequency_var.long_name = "frequency bins of the spectra"
     frequency_var.units = "s-1"
 
     # --------------------
     # instrument names
-    trajectory_var = nc4_out.createVariable("trajectory_id", "c", ("trajectory", "len_of_name"))
+    trajectory_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "trajectory_id", "c", ("trajectory", "len_of_name"))
     trajectory_var.standard_name = "platform_id"
     trajectory_var.long_name = "platform name"
 
@@ -189,12 +195,12 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # time and kind of message variables
 
     # the kind of each entry: 'G' for GPS entry, 'W' for wave spectrum entry, 'N' for no entry
-    kind_var = nc4_out.createVariable("message_kind", "c", ("trajectory", "observation"))
+    kind_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "message_kind", "c", ("trajectory", "observation"))
     kind_var.long_name = "whether the current [trajectory, observation] contains GPS [kind G]" +\
         ", or Waves [kind W], or None [kind N, in case of failed transmission] " +\
         "data."
 
-    time_var = nc4_out.createVariable("time", "f8", ("trajectory", "observation"))
+    time_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "time", "f8", ("trajectory", "observation"))
     time_var.standard_name = "time"
     time_var.long_name = "time"
     time_var.units = "seconds since 1970-01-01 00:00:00 +0000"
@@ -202,12 +208,12 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # --------------------
     # geographic location variables
 
-    lon_var = nc4_out.createVariable("lon", "f4", ("trajectory", "observation"))
+    lon_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "lon", "f4", ("trajectory", "observation"))
     lon_var.standard_name = "longitude"
     lon_var.long_name = "longitude"
     lon_var.units = "degrees_east"
 
-    lat_var = nc4_out.createVariable("lat", "f4", ("trajectory", "observation"))
+    lat_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "lat", "f4", ("trajectory", "observation"))
     lat_var.standard_name = "latitude"
     lat_var.long_name = "latitude"
     lat_var.units = "degrees_north"
@@ -215,26 +221,26 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # --------------------
     # wave information variables
 
-    spectrum_var = nc4_out.createVariable("wave_spectrum", "f4", ("trajectory", "observation", "frequency"))
+    spectrum_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "wave_spectrum", "f4", ("trajectory", "observation", "frequency"))
     spectrum_var.long_name = "under sampled wave spectrum S of the sea ice surface elevation"
     spectrum_var.units = "m2.s"
 
-    swh_var = nc4_out.createVariable("swh", "f4", ("trajectory", "observation"))
+    swh_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "swh", "f4", ("trajectory", "observation"))
     swh_var.standard_name = "sea_surface_swell_wave_significant_height"
     swh_var.long_name = "significant wave height of sea ice surface elevation computed as 4*std(eta)"
     swh_var.units = "m"
 
-    hs_var = nc4_out.createVariable("hs", "f4", ("trajectory", "observation"))
+    hs_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "hs", "f4", ("trajectory", "observation"))
     hs_var.standard_name = "sea_surface_swell_wave_significant_height"
     hs_var.long_name = "significant wave height of sea ice surface elevation computed as 4*sqrt(m0)"
     hs_var.units = "m"
 
-    tz_var = nc4_out.createVariable("tp", "f4", ("trajectory", "observation"))
+    tz_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "tp", "f4", ("trajectory", "observation"))
     tz_var.standard_name = "sea_surface_swell_wave_period"
     tz_var.long_name = "period of sea ice surface elevation computed as sqrt(m0/m2)"
     tz_var.units = "s"
 
-    tz0_var = nc4_out.createVariable("tz0", "f4", ("trajectory", "observation"))
+    tz0_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "tz0", "f4", ("trajectory", "observation"))
     tz0_var.standard_name = "sea_surface_swell_wave_zero_upcrossing_period"
     tz0_var.long_name = "period of sea ice surface elevation computed from zero upcrossing"
     tz0_var.units = "s"
@@ -242,8 +248,7 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # ------------------------------------------------------------
     # filling the "meta" data in
 
-    for crrt_ind, crrt_frequency in enumerate(freq):
-        frequency_var[crrt_ind] = crrt_frequency
+    frequency_var[:] = np.array(freq)
 
     # ------------------------------------------------------------
     # filling the data in and get the "extreme bounds"
@@ -255,6 +260,18 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     datetime_start = datetime.datetime.fromtimestamp(2e10)
     datetime_end = datetime.datetime.fromtimestamp(0)
 
+    # the G and W entries, kept in arrays; each variable is written in one go at the end
+    array_trajectory_id = np.full((nbr_of_instruments, length_of_name), b"\0", dtype="S1")
+    array_kind = np.full((nbr_of_instruments, max_nbr_of_samples), b"\0", dtype="S1")
+    array_time = np.full((nbr_of_instruments, max_nbr_of_samples), nc4.default_fillvals["f8"])
+    array_lon = np.full((nbr_of_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+    array_lat = np.full((nbr_of_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+    array_spectrum = np.full((nbr_of_instruments, max_nbr_of_samples, nbr_of_frequency_bins), nc4.default_fillvals["f4"])
+    array_swh = np.full((nbr_of_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+    array_hs = np.full((nbr_of_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+    array_tz = np.full((nbr_of_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+    array_tz0 = np.full((nbr_of_instruments, max_nbr_of_samples), nc4.default_fillvals["f4"])
+
     dict_crrt_observations = {}
     for crrt_instrument in list_instrument_ids:
         dict_crrt_observations[crrt_instrument] = 0
@@ -277,23 +294,19 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
         ic(crrt_trajectory)
         ic(crrt_observation)
 
-        # fill the name variable
-        for crrt_ind, crrt_char in enumerate(crrt_instrument):
-            nc4_out["trajectory_id"][crrt_trajectory, crrt_ind] = crrt_char
-
-        for crrt_ind in range(crrt_ind+1, length_of_name):
-            nc4_out["trajectory_id"][crrt_trajectory, crrt_ind] = "\0"
+        # fill the name variable; the end of the name is already "\0"
+        array_trajectory_id[crrt_trajectory, :len(crrt_instrument)] = list(crrt_instrument)
 
         # need to check that a valid transmission
         if crrt_entry["parsed_data"] is not None:
             # the base datetime is the one of the transmission; we will refine later
             # on if this is actually a GPS message
-            time_var[crrt_trajectory, crrt_observation] = \
+            array_time[crrt_trajectory, crrt_observation] = \
                 crrt_entry['datetime'].timestamp()
 
             # find the kind of data, and fill the correct data
             if crrt_entry['data_kind'] == "status":
-                kind_var[crrt_trajectory, crrt_observation] = "G"
+                array_kind[crrt_trajectory, crrt_observation] = "G"
 
                 # we actually use the correct time, not the iridium transmission time
                 crrt_datetime = \
@@ -304,36 +317,49 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
 
                 crrt_lat = crrt_entry['parsed_data']['GPRMC_binary_payload'].latitude
                 crrt_lon = crrt_entry['parsed_data']['GPRMC_binary_payload'].longitude
-                time_var[crrt_trajectory, crrt_observation] = crrt_datetime.timestamp()
-
-                lon_var[crrt_trajectory, crrt_observation] = crrt_lon
-                lat_var[crrt_trajectory, crrt_observation] = crrt_lat
+                array_time[crrt_trajectory, crrt_observation] = crrt_datetime.timestamp()
 
-                datetime_start = min(datetime_start, crrt_datetime)
-                datetime_end = max(datetime_end, crrt_datetime)
-                lat_min = min(lat_min, crrt_lat)
-                lat_max = max(lat_max, crrt_lat)
-                lon_min = min(lon_min, crrt_lon)
-                lon_max = max(lon_max, crrt_lon)
+                array_lon[crrt_trajectory, crrt_observation] = crrt_lon
+                array_lat[crrt_trajectory, crrt_observation] = crrt_lat
 
             elif crrt_entry['data_kind'] == "spectrum":
-                kind_var[crrt_trajectory, crrt_observation] = "W"
+                array_kind[crrt_trajectory, crrt_observation] = "W"
 
                 # no need to rewrite the time_var, we will not get better estimate
                 # than iridium date
 
-                for crrt_ind_spectrum, crrt_freq_entry in enumerate(crrt_entry['parsed_data']['raw_data']['a0_proc']):
-                    spectrum_var[crrt_trajectory, crrt_observation, crrt_ind_spectrum] = crrt_freq_entry
-                swh_var[crrt_trajectory, crrt_observation] = crrt_entry['parsed_data']['raw_data']['SWH']
-                hs_var[crrt_trajectory, crrt_observation] = crrt_entry['parsed_data']['raw_data']['Hs']
-                tz_var[crrt_trajectory, crrt_observation] = crrt_entry['parsed_data']['raw_data']['T_z']
-                tz0_var[crrt_trajectory, crrt_observation] = crrt_entry['parsed_data']['raw_data']['T_z0']
+                crrt_spectrum = crrt_entry['parsed_data']['raw_data']['a0_proc']
+                array_spectrum[crrt_trajectory, crrt_observation, :len(crrt_spectrum)] = crrt_spectrum
+                array_swh[crrt_trajectory, crrt_observation] = crrt_entry['parsed_data']['raw_data']['SWH']
+                array_hs[crrt_trajectory, crrt_observation] = crrt_entry['parsed_data']['raw_data']['Hs']
+                array_tz[crrt_trajectory, crrt_observation] = crrt_entry['parsed_data']['raw_data']['T_z']
+                array_tz0[crrt_trajectory, crrt_observation] = crrt_entry['parsed_data']['raw_data']['T_z0']
 
             else:
                 raise RuntimeError("unknown data_kind: {}".format(crrt_entry['data_kind']))
 
         else:
-            kind_var[crrt_trajectory, crrt_observation] = "N"
+            array_kind[crrt_trajectory, crrt_observation] = "N"
+
+    trajectory_var[:] = array_trajectory_id
+    kind_var[:] = array_kind
+    time_var[:] = array_time
+    lon_var[:] = array_lon
+    lat_var[:] = array_lat
+    spectrum_var[:] = array_spectrum
+    swh_var[:] = array_swh
+    hs_var[:] = array_hs
+    tz_var[:] = array_tz
+    tz0_var[:] = array_tz0
+
+    # the extreme bounds, from the GNSS entries
+    array_is_gnss = array_kind == b"G"
+    lat_min = float(np.min(array_lat[array_is_gnss], initial=lat_min))
+    lat_max = float(np.max(array_lat[array_is_gnss], initial=lat_max))
+    lon_min = float(np.min(array_lon[array_is_gnss], initial=lon_min))
+    lon_max = float(np.max(array_lon[array_is_gnss], initial=lon_max))
+    datetime_start = datetime.datetime.fromtimestamp(np.min(array_time[array_is_gnss], initial=datetime_start.timestamp()))
+    datetime_end = datetime.datetime.fromtimestamp(np.max(array_time[array_is_gnss], initial=datetime_end.timestamp()))
 
     nc4_out.geospatial_lat_min = str(lat_min)
     nc4_out.geospatial_lat_max = str(lat_max)
@@ -0,0 +1,83 @@
+"""
+Named storage profiles for the variables of the netCDF files written by create_nc_dataset.py.
+
+A profile sets, per variable, the chunk shape and the compression (zlib level, shuffle
+filter) used by netCDF4 to store it. All the profiles are lossless: the data read back
+are the same whatever the profile, only the size of the file and the cost of the
+different ways of reading it change. The profiles are:
+- "contiguous": the layout used before the profiles, contiguous and uncompressed;
+- "trajectory": tuned for reading the full time series of one trajectory; each chunk
+  holds one trajectory, along all (or many) observations;
+- "time_window": tuned for reading all the spectra (and positions) of all the
+  trajectories at one time window; each chunk holds all the trajectories, along a few
+  observations. The observations of the different trajectories are not on a common
+  time axis, but the instruments of a deployment sample at about the same rate, so
+  that a time window covers about the same observations on all of them.
+
+The padding of the observations (and of the spectra, on the GNSS entries) is stored as
+the netCDF4 fill value, which compresses very well; this is most of wave_spectrum.
+
+See script_benchmark_nc_storage.py to compare the profiles on a dataset.
+"""
+
+#--------------------------------------------------------------------------------
+# a few module constants
+
+# the chunk shape is given per dimension, as the maximum number of entries of a chunk along it;
+# the dimensions not listed are taken whole; "default" holds the settings of the variables not listed
+_SP_STORAGE_PROFILES = {
+    "contiguous": {
+        "default": {"contiguous": True},
+    },
+    "trajectory": {
+        "default": {"chunks": {"trajectory": 1}, "zlib": True, "complevel": 4, "shuffle": True},
+        "wave_spectrum": {"chunks": {"trajectory": 1, "observation": 1024}, "zlib": True, "complevel": 4, "shuffle": True},
+        "trajectory_id": {"contiguous": True},
+        "frequency": {"contiguous": True},
+    },
+    "time_window": {
+        "default": {"chunks": {"observation": 256}, "zlib": True, "complevel": 4, "shuffle": True},
+        "wave_spectrum": {"chunks": {"observation": 32}, "zlib": True, "complevel": 4, "shuffle": True},
+        "trajectory_id": {"contiguous": True},
+        "frequency": {"contiguous": True},
+    },
+}
+
+#--------------------------------------------------------------------------------
+# creating the variables following a profile
+
+
+def storage_profile_names():
+    """the names of all the storage profiles"""
+    return list(_SP_STORAGE_PROFILES)
+
+
+def storage_kwargs(nc4_out, storage_profile, name, dimensions):
+    """the keyword arguments of createVariable, to store the variable name of nc4_out following the storage profile;
+    the dimensions must already exist in nc4_out, as the chunk shape depends on their size"""
+    if storage_profile not in _SP_STORAGE_PROFILES:
+        raise RuntimeError("unknown storage profile {}, available: {}".format(storage_profile, storage_profile_names()))
+
+    if isinstance(dimensions, str):
+        dimensions = (dimensions,)
+
+    dict_profile = _SP_STORAGE_PROFILES[storage_profile]
+    dict_kwargs = dict(dict_profile.get(name, dict_profile["default"]))
+
+    if dict_kwargs.get("contiguous", False):
+        return {"contiguous": True}
+
+    dict_chunks = dict_kwargs.pop("chunks", {})
+    list_chunksizes = []
+    for crrt_dimension in dimensions:
+        crrt_size = max(len(nc4_out.dimensions[crrt_dimension]), 1)
+        crrt_max_chunk = dict_chunks.get(crrt_dimension, None)
+        list_chunksizes.append(crrt_size if crrt_max_chunk is None else min(crrt_max_chunk, crrt_size))
+    dict_kwargs["chunksizes"] = tuple(list_chunksizes)
+
+    return dict_kwargs
+
+
+def create_variable(nc4_out, storage_profile, name, datatype, dimensions):
+    """nc4_out.createVariable, with the chunk shape and compression of the storage profile"""
+    return nc4_out.createVariable(name, datatype, dimensions, **storage_kwargs(nc4_out, storage_profile, name, dimensions))
@@ -0,0 +1,125 @@
+"""A compact, memory mappable archive of the rock7 messages.
+
+All the binary payloads are stored back to back in a single bytes arena, and each message
+is described by a few columns: the offset and length of its payload in the arena, its
+device, its posix time of transmission, and its kind. On disk, the archive is a directory
+with one .npy file per column plus a small index, and is opened by memory mapping: scanning
+the columns of many messages does not need to unpickle (nor to read) the payloads.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+# the kinds of messages, as given by their length in script_load_messages.py
+ARCHIVE_KINDS = ["faulty", "status", "spectrum"]
+
+_MA_FORMAT_VERSION = 1
+_MA_INDEX_FILENAME = "index.json"
+_MA_COLUMNS = {
+    "arena": np.uint8,
+    "offset": np.int64,
+    "length": np.int32,
+    "device_index": np.int16,
+    "posix_timestamp": np.int64,
+    "kind_index": np.int8,
+}
+
+
+class MessageArchive:
+    """The binary payloads of many messages in one arena, together with the columns describing the messages."""
+
+    def __init__(self, columns, list_devices):
+        assert set(columns.keys()) == set(_MA_COLUMNS.keys())
+        self.columns = {}
+        for crrt_name, crrt_dtype in _MA_COLUMNS.items():
+            self.columns[crrt_name] = np.ascontiguousarray(columns[crrt_name], dtype=crrt_dtype)
+        self.list_devices = list(list_devices)
+
+        assert all(self.columns[crrt_name].shape == (len(self),) for crrt_name in _MA_COLUMNS if crrt_name != "arena")
+
+    @classmethod
+    def from_entries(cls, dict_entries):
+        """Build the archive from the dict of entries of script_load_messages.py, using the "Device", "datetime",
+        "data_kind" and "binary_payload" of each entry, in the order of the entries."""
+        list_entries = list(dict_entries.values())
+        list_devices = sorted({crrt_entry["Device"] for crrt_entry in list_entries})
+        dict_device_to_index = {crrt_device: crrt_index for (crrt_index, crrt_device) in enumerate(list_devices)}
+
+        array_length = np.array([len(crrt_entry["binary_payload"]) for crrt_entry in list_entries], dtype=np.int64)
+        columns = {
+            "arena": np.frombuffer(b"".join(crrt_entry["binary_payload"] for crrt_entry in list_entries), dtype=np.uint8),
+            "offset": np.cumsum(array_length) - array_length,
+            "length": array_length,
+            "device_index": [dict_device_to_index[crrt_entry["Device"]] for crrt_entry in list_entries],
+            "posix_timestamp": np.array([crrt_entry["datetime"] for crrt_entry in list_entries], dtype="datetime64[s]").astype(np.int64),
+            "kind_index": [ARCHIVE_KINDS.index(crrt_entry["data_kind"]) for crrt_entry in list_entries],
+        }
+
+        return cls(columns, list_devices)
+
+    def __len__(self):
+        return self.columns["offset"].shape[0]
+
+    def __repr__(self):
+        return "MessageArchive({} messages from {} devices, {} bytes of payloads)".format(len(self), len(self.list_devices), self.columns["arena"].shape[0])
+
+    def save(self, path):
+        """Write the archive as a directory of .npy columns; the previous content of path is replaced in one go."""
+        path_tmp = path + ".tmp"
+        if os.path.exists(path_tmp):
+            shutil.rmtree(path_tmp)
+        os.makedirs(path_tmp)
+
+        for crrt_name, crrt_column in self.columns.items():
+            np.save(os.path.join(path_tmp, crrt_name + ".npy"), crrt_column)
+        with open(os.path.join(path_tmp, _MA_INDEX_FILENAME), "w") as fh:
+            json.dump({"version": _MA_FORMAT_VERSION, "devices": self.list_devices, "kinds": ARCHIVE_KINDS}, fh, indent=2)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(path_tmp, path)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Open an archive written by save; by default the columns are memory mapped (read only)."""
+        with open(os.path.join(path, _MA_INDEX_FILENAME), "r") as fh:
+            dict_index = json.load(fh)
+        assert dict_index["version"] == _MA_FORMAT_VERSION, "unknown message archive format version {}".format(dict_index["version"])
+        assert dict_index["kinds"] == ARCHIVE_KINDS
+
+        columns = {crrt_name: np.load(os.path.join(path, crrt_name + ".npy"), mmap_mode=mmap_mode) for crrt_name in _MA_COLUMNS}
+        return cls(columns, dict_index["devices"])
+
+    def payload(self, index):
+        """The binary payload of a message, as the binary_payload of its entry."""
+        crrt_offset = self.columns["offset"][index]
+        return self.columns["arena"][crrt_offset: crrt_offset + self.columns["length"][index]].tobytes()
+
+    def devices(self):
+        """The device of each message, as an array of strings."""
+        return np.array(self.list_devices, dtype=str)[self.columns["device_index"]]
+
+    def datetimes(self):
+        """The time of transmission of each message, as a list of naive datetimes in UTC."""
+        return self.columns["posix_timestamp"].astype("datetime64[s]").tolist()
+
+    def select(self, device=None, kind=None, time_start=None, time_end=None):
+        """The indexes, sorted by time of transmission, of the messages from a device, of a kind, and strictly within
+        (time_start, time_end); the criteria that are None are not used."""
+        array_selected = np.ones((len(self),), dtype=bool)
+        if device is not None:
+            if device not in self.list_devices:
+                return np.zeros((0,), dtype=np.int64)
+            array_selected &= self.columns["device_index"] == self.list_devices.index(device)
+        if kind is not None:
+            array_selected &= self.columns["kind_index"] == ARCHIVE_KINDS.index(kind)
+        if time_start is not None:
+            array_selected &= self.columns["posix_timestamp"] > np.datetime64(time_start, "s").astype(np.int64)
+        if time_end is not None:
+            array_selected &= self.columns["posix_timestamp"] < np.datetime64(time_end, "s").astype(np.int64)
+
+        array_indexes = np.flatnonzero(array_selected)
+        return array_indexes[np.argsort(self.columns["posix_timestamp"][array_indexes], kind="stable")]
@@ -1,6 +1,5 @@
 """Generate data python dict from the rock7 csv hex message files."""
 
-from datetime import datetime
 from binascii import unhexlify
 
 import csv
@@ -8,6 +7,8 @@ import pickle
 
 import load_Iridium_wave_data
 import load_status_information
+import rock7_datetimes
+from message_archive import MessageArchive
 
 verbose = 5
 
@@ -26,6 +27,7 @@ list_rock7_ids = ["all"]
 for crrt_rock7_id in list_rock7_ids:
     path_to_data = data_root_path + csv_folder + crrt_rock7_id + ".csv"
     path_to_dump = data_root_path + dict_folder + crrt_rock7_id + ".pkl"
+    path_to_archive = data_root_path + dict_folder + crrt_rock7_id + "_messages"
 
     # summarize kinds of data: message_length -> data_kind
     dict_message_kinds = {138: 'status', 340: 'spectrum', 0: 'faulty'}
@@ -39,6 +41,9 @@ for crrt_rock7_id in list_rock7_ids:
         for index, row in enumerate(input_dict):
             dict_entries[index] = row
 
+    # parse the datetimes of all the entries in one go, rather than one strptime per entry
+    dict_entry_datetimes = dict(zip(dict_entries, rock7_datetimes.parse_rock7_datetimes_to_datetimes([dict_entries[crrt_entry]["Date Time (UTC)"] for crrt_entry in dict_entries])))
+
     for crrt_entry in dict_entries:
         if verbose > 0:
             print(crrt_entry)
@@ -66,7 +71,7 @@ for crrt_rock7_id in list_rock7_ids:
         if verbose > 0:
             print(crrt_date_string)
 
-        crrt_datetime = datetime.strptime(crrt_date_string, '%d/%b/%Y %H:%M:%S')
+        crrt_datetime = dict_entry_datetimes[crrt_entry]
         crrt_data['datetime'] = crrt_datetime
 
         if verbose > 0:
@@ -101,3 +106,6 @@ for crrt_rock7_id in list_rock7_ids:
 
     with open(path_to_dump, 'wb') as fh:
         pickle.dump(dict_entries, fh)
+
+    # the same messages, as a compact archive of the binary payloads that can be memory mapped (see message_archive.py)
+    MessageArchive.from_entries(dict_entries).save(path_to_archive)
@@ -5,7 +5,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from scipy import integrate
-from utils import sort_dict_keys_by_date
+from utils import sort_dict_keys_by_date_within
 from params import time_start, time_end, list_instruments
 
 # initially from ../generate_dict_data/load_Iridium_wave_data ugly but...
@@ -119,16 +119,16 @@ today_utc = now_utc.date()
 """ later on, want to look at damping, and compare with models?"""
 
 # %% sort dictionary by date of transmission
-keys_sorted_by_date = sort_dict_keys_by_date(dict_data)
+(keys_sorted_by_date, array_is_within_time) = sort_dict_keys_by_date_within(dict_data, time_start, time_end)
 
 # %% load the whole data; this is ugly and should be broken in a series of functions, but...
 dict_data_each_logger = {}
 
-for crrt_key in keys_sorted_by_date:
+for (crrt_key, crrt_is_within_time) in zip(keys_sorted_by_date, array_is_within_time):
     crrt_time = dict_data[crrt_key]['datetime']
 
     # check if within the time
-    if crrt_time > time_start and crrt_time < time_end:
+    if crrt_is_within_time:
         crrt_logger_ID = dict_data[crrt_key]['Device']
 
         # if a spectrum file, fill in the status
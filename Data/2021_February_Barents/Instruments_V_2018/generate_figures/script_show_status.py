@@ -1,7 +1,9 @@
 from datetime import datetime, timedelta
 import pytz
 import pickle
-from utils import sort_dict_keys_by_date
+import numpy as np
+import load_status_information
+from message_archive import MessageArchive
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from matplotlib.patches import Rectangle
@@ -13,43 +15,41 @@ plt.rcParams.update({'font.size': 14})
 now_utc = datetime.now(pytz.utc)
 today_utc = now_utc.date()
 
-# load the data
-path_to_dump = "../generate_dict_data/all.pkl"
-with open(path_to_dump, 'rb') as fh:
-    dict_data = pickle.load(fh)
+# load the messages: the archive is memory mapped, and only the payloads of the status messages within the time
+# bounds are read and parsed
+path_to_archive = "../generate_dict_data/all_messages"
+archive = MessageArchive.load(path_to_archive)
 
-# sort dictionary by date of transmission
-keys_sorted_by_date = sort_dict_keys_by_date(dict_data)
+# the messages out of the time bounds, sorted by date of transmission
+array_in_bounds = np.zeros((len(archive),), dtype=bool)
+array_in_bounds[archive.select(time_start=time_start, time_end=time_end)] = True
+list_datetimes_all = archive.datetimes()
+for crrt_index in archive.select():
+    if not array_in_bounds[crrt_index]:
+        print("***** WARNING time out of bounds: {}".format(list_datetimes_all[crrt_index]))
 
 # load the whole data for each logger in a separated dict entry
 dict_data_each_logger = {}
 
-for crrt_key in keys_sorted_by_date:
-    crrt_time = dict_data[crrt_key]['datetime']
+for crrt_logger_ID in archive.list_devices:
+    array_status_indexes = archive.select(device=crrt_logger_ID, kind="status", time_start=time_start, time_end=time_end)
+    if array_status_indexes.shape[0] == 0:
+        continue
 
-    # check if within the time
-    if crrt_time > time_start and crrt_time < time_end:
-        crrt_logger_ID = dict_data[crrt_key]['Device']
+    dict_data_each_logger[crrt_logger_ID] = {}
+    dict_data_each_logger[crrt_logger_ID]["datetime"] = []
+    dict_data_each_logger[crrt_logger_ID]["GPS"] = []
+    dict_data_each_logger[crrt_logger_ID]["File"] = []
+    dict_data_each_logger[crrt_logger_ID]["VBat"] = []
 
-        # if a status file, fill in the status
-        if dict_data[crrt_key]['data_kind'] == 'status':
+    for crrt_index in array_status_indexes:
+        crrt_parsed_data = load_status_information.load_status_information(archive.payload(crrt_index))
 
-            # add to the right list
-            if crrt_logger_ID not in dict_data_each_logger:
-                dict_data_each_logger[crrt_logger_ID] = {}
-                dict_data_each_logger[crrt_logger_ID]["datetime"] = []
-                dict_data_each_logger[crrt_logger_ID]["GPS"] = []
-                dict_data_each_logger[crrt_logger_ID]["File"] = []
-                dict_data_each_logger[crrt_logger_ID]["VBat"] = []
+        dict_data_each_logger[crrt_logger_ID]["datetime"].append(list_datetimes_all[crrt_index])
+        dict_data_each_logger[crrt_logger_ID]["GPS"].append(crrt_parsed_data['GPRMC_binary_payload'])
+        dict_data_each_logger[crrt_logger_ID]["File"].append(crrt_parsed_data['filename'])
+        dict_data_each_logger[crrt_logger_ID]["VBat"].append(float(crrt_parsed_data['battery_level_V']))
 
-            dict_data_each_logger[crrt_logger_ID]["datetime"].append(dict_data[crrt_key]['datetime'])
-            dict_data_each_logger[crrt_logger_ID]["GPS"].append(dict_data[crrt_key]['parsed_data']['GPRMC_binary_payload'])
-            dict_data_each_logger[crrt_logger_ID]["File"].append(dict_data[crrt_key]['parsed_data']['filename'])
-            dict_data_each_logger[crrt_logger_ID]["VBat"].append(float(dict_data[crrt_key]['parsed_data']['battery_level_V']))
-
-    else:
-        print("***** WARNING time out of bounds: {}".format(crrt_time))
-        
 with open("./dict_data_each_logger_status.pkl", "wb") as fh:
     pickle.dump(dict_data_each_logger, fh)
 
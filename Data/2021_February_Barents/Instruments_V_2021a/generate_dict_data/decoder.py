@@ -129,170 +129,151 @@ def unpack_gnss_packet(bin_msg, print_decoded=False):
     return (decoded_packet, char_next_byte)
 
 #--------------------------------------------------------------------------------
-# unpacking of waves messages
-
-# unpacking of wave spectra messages of type W, i.e. FFT_LEN 1024
-
-def unpack_wave_packet_W(bin_msg, print_decoded=True):
-    assert len(bin_msg) == _BINARY_DECODER_WAVES_PACKET_W_LENGTH, "wave spectra message should have length {}".format(_BINARY_DECODER_WAVES_PACKET_W_LENGTH)
+# layouts of the wave spectra packets for the different firmwares
+
+@dataclass(eq=False)
+class Waves_Packet_Layout:
+    """Everything needed to decode the wave spectra packets of a given firmware: the kind byte of the
+    messages, the binary layout as a numpy dtype (packet without the kind byte), and the frequency tables."""
+    kind: str
+    firmware: str
+    fft_len: int
+    min_bin: int
+    max_bin: int
+    scaler: float
+    dtype: np.dtype
+    frequencies: np.ndarray
+    omega_4: np.ndarray
+
+    @property
+    def packet_length(self):
+        return self.dtype.itemsize
+
+    @property
+    def nbr_bins(self):
+        return self.max_bin - self.min_bin
+
+
+def make_waves_packet_layout(kind, firmware, fft_len, min_bin, max_bin, scaler, sampling_freq_hz, nbr_alignment_bytes):
+    nbr_bins = max_bin - min_bin
+
+    dtype = np.dtype([
+        ("posix_timestamp", "<u4"),
+        ("max_value", "<f4"),
+        ("array_uint16", "<u2", (nbr_bins,)),
+        ("alignment", "u1", (nbr_alignment_bytes,)),
+        ("end_byte", "u1"),
+    ])
+
+    frequencies = np.arange(min_bin, max_bin) * sampling_freq_hz / fft_len
+    omega = 2.0 * math.pi * frequencies
+
+    return Waves_Packet_Layout(
+        kind=kind,
+        firmware=firmware,
+        fft_len=fft_len,
+        min_bin=min_bin,
+        max_bin=max_bin,
+        scaler=scaler,
+        dtype=dtype,
+        frequencies=frequencies,
+        omega_4=omega * omega * omega * omega,
+    )
 
-    # extract the data
-    posix_timestamp = four_bytes_to_long(bin_msg[0:4])
-    max_value = four_bytes_to_float(bin_msg[4:8])
-    nbr_bins = _BINARY_DECODER_WAVES_PACKET_W_SPECTRUM_MAX_BIN - _BINARY_DECODER_WAVES_PACKET_W_SPECTRUM_MIN_BIN
-    nbr_bytes = 2 * nbr_bins
 
-    spectra_energies = struct.unpack('<'+nbr_bins*'H', bytes(bin_msg[8:8+nbr_bytes]))
-    char_next_byte = byte_to_char(bin_msg[_BINARY_DECODER_WAVES_PACKET_W_LENGTH-1])
+# the registry of the wave packet layouts, by message kind byte; each firmware uses its own kind byte
+_BINARY_DECODER_WAVES_LAYOUTS = {
+    'W': make_waves_packet_layout(
+        'W', "FFT_LEN 1024", _BINARY_DECODER_WAVES_PACKET_W_SPECTRUM_NBR_SAMPLES_PER_SEGMENT,
+        _BINARY_DECODER_WAVES_PACKET_W_SPECTRUM_MIN_BIN, _BINARY_DECODER_WAVES_PACKET_W_SPECTRUM_MAX_BIN,
+        _BINARY_DECODER_WAVES_PACKET_W_SPECTRUM_SCALER, _BINARY_DECODER_WAVES_PACKET_W_SPECTRUM_SAMPLING_FREQ_HZ,
+        nbr_alignment_bytes=0,
+    ),
+    'X': make_waves_packet_layout(
+        'X', "FFT_LEN 2048", _BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_NBR_SAMPLES_PER_SEGMENT,
+        _BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_MIN_BIN, _BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_MAX_BIN,
+        _BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_SCALER, _BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_SAMPLING_FREQ_HZ,
+        nbr_alignment_bytes=2,
+    ),
+}
+
+assert _BINARY_DECODER_WAVES_LAYOUTS['W'].packet_length == _BINARY_DECODER_WAVES_PACKET_W_LENGTH
+assert _BINARY_DECODER_WAVES_LAYOUTS['X'].packet_length == _BINARY_DECODER_WAVES_PACKET_X_LENGTH
 
-    assert char_next_byte == 'E', "wave packets are transmitted one at a time, expect 'E' for end at the end"
+#--------------------------------------------------------------------------------
+# unpacking of waves messages
 
-    if print_decoded:
-        print("posix timestamp: {}".format(posix_timestamp))
-        print("max energy: {}".format(max_value))
-        print("encoded energies:")
-        for crrt_energy in spectra_energies:
-            print(crrt_energy)
+def unpack_wave_packets(list_bin_packets, layout):
+    """Unpack many wave packets following the same layout at once: all packets are read with a single
+    np.frombuffer, and the spectra and spectral moments are computed on the (nbr_packets, nbr_bins) matrices."""
+    array_packets = np.frombuffer(b"".join(list_bin_packets), dtype=layout.dtype)
+    assert array_packets.shape[0] == len(list_bin_packets)
+    assert np.all(array_packets["end_byte"] == ord('E')), "wave packets are transmitted one at a time, expect 'E' for end at the end"
 
-    # make sense of the data
-    datetime_fix = datetime.datetime.fromtimestamp(posix_timestamp)
-    list_energy_values = [1.0 * crrt_uint16 * max_value / 65000 for crrt_uint16 in spectra_energies]
+    array_energies = 1.0 * array_packets["array_uint16"] * array_packets["max_value"].astype(np.float64)[:, np.newaxis] / layout.scaler
+    array_elevation_energies = array_energies / layout.omega_4 * np.sqrt(layout.fft_len) * math.sqrt(2.0) * math.pi
 
-    wave_frequencies = [crrt_bin * _BINARY_DECODER_WAVES_PACKET_W_SPECTRUM_SAMPLING_FREQ_HZ / _BINARY_DECODER_WAVES_PACKET_W_SPECTRUM_NBR_SAMPLES_PER_SEGMENT for crrt_bin in range(_BINARY_DECODER_WAVES_PACKET_W_SPECTRUM_MIN_BIN, _BINARY_DECODER_WAVES_PACKET_W_SPECTRUM_MAX_BIN)]
+    m0 = np.trapz(array_elevation_energies, layout.frequencies, axis=1)
+    m2 = np.trapz(np.power(layout.frequencies, 2) * array_elevation_energies, layout.frequencies, axis=1)
+    m4 = np.trapz(np.power(layout.frequencies, 4) * array_elevation_energies, layout.frequencies, axis=1)
 
-    list_elevation_energies = []
-    for (crrt_frq, crrt_energy) in zip(wave_frequencies, list_energy_values):
-        crrt_omega = 2.0 * math.pi * crrt_frq
-        crrt_omega_4 = crrt_omega * crrt_omega * crrt_omega * crrt_omega
-        list_elevation_energies.append(crrt_energy / crrt_omega_4 * np.sqrt(1024) * math.sqrt(2.0) * math.pi)
+    list_frequencies = layout.frequencies.tolist()
+    list_waves_packets = []
 
-    def compute_spectral_moment(list_frequencies, list_elevation_energies, order):
-        list_to_integrate = [
-            math.pow(crrt_freq, order) * crrt_energy for (crrt_freq, crrt_energy) in zip(list_frequencies, list_elevation_energies)
-        ]
+    for crrt_index, crrt_bin_packet in enumerate(list_bin_packets):
+        list_waves_packets.append(Waves_Packet(
+            datetime_fix=datetime.datetime.fromtimestamp(int(array_packets["posix_timestamp"][crrt_index])),
+            list_frequencies=list_frequencies,
+            list_acceleration_energies=array_energies[crrt_index].tolist(),
+            list_elevation_normalized_energies=array_elevation_energies[crrt_index].tolist(),
+            m0=float(m0[crrt_index]),
+            m2=float(m2[crrt_index]),
+            m4=float(m4[crrt_index]),
+            hs=4*math.sqrt(m0[crrt_index]),
+            tp=1.0/math.sqrt(m2[crrt_index]/m0[crrt_index]),
+            raw=binascii.hexlify(crrt_bin_packet)
+        ))
 
-        moment = np.trapz(list_to_integrate, list_frequencies)
+    return list_waves_packets
 
-        return moment
 
-    m0 = compute_spectral_moment(wave_frequencies, list_elevation_energies, 0)
-    m2 = compute_spectral_moment(wave_frequencies, list_elevation_energies, 2)
-    m4 = compute_spectral_moment(wave_frequencies, list_elevation_energies, 4)
+def unpack_wave_packet(bin_msg, layout, print_decoded=True):
+    assert len(bin_msg) == layout.packet_length, "wave spectra message should have length {}, got {}".format(layout.packet_length, len(bin_msg))
 
-    waves_packet = Waves_Packet(
-        datetime_fix=datetime_fix,
-        list_frequencies=wave_frequencies,
-        list_acceleration_energies=list_energy_values,
-        list_elevation_normalized_energies=list_elevation_energies,
-        m0=m0,
-        m2=m2,
-        m4=m4,
-        hs=4*math.sqrt(m0),
-        tp=1.0/math.sqrt(m2/m0),
-        raw=binascii.hexlify(bin_msg)
-    )
+    waves_packet = unpack_wave_packets([bytes(bin_msg)], layout)[0]
+    char_next_byte = byte_to_char(bin_msg[layout.packet_length-1])
 
     if print_decoded:
         print("---------- decoded WAVE message ------------------------------")
-        print("acceleration spectrum at posix {}, i.e. {}".format(posix_timestamp, datetime_fix))
-        for crrt_bin_ind, (crrt_frq, crrt_energy) in enumerate(zip(wave_frequencies, list_energy_values)):
-            print("bin ind {:03d}: frq {:.5f} Hz, energy {:.4e}".format(crrt_bin_ind + _BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_MIN_BIN, crrt_frq, crrt_energy))
+        print("acceleration spectrum at {}, firmware {}".format(waves_packet.datetime_fix, layout.firmware))
+        for crrt_bin_ind, (crrt_frq, crrt_energy) in enumerate(zip(waves_packet.list_frequencies, waves_packet.list_acceleration_energies)):
+            print("bin ind {:03d}: frq {:.5f} Hz, energy {:.4e}".format(crrt_bin_ind + layout.min_bin, crrt_frq, crrt_energy))
 
         print("m0")
-        waves_packet.m0
+        print(waves_packet.m0)
         print("m2")
-        waves_packet.m2
+        print(waves_packet.m2)
         print("m4")
-        waves_packet.m4
+        print(waves_packet.m4)
         print("hs")
-        waves_packet.hs
+        print(waves_packet.hs)
         print("sqrt(m2/m0)")
-        waves_packet.tp
+        print(waves_packet.tp)
         print("--------------------------------------------------------------")
 
     return (waves_packet, char_next_byte)
 
 
-# case for FFT_LEN 2048; this is mostly a copy of the case 1024, TODO: refactor
-def unpack_wave_packet_X(bin_msg, print_decoded=True):
-    assert len(bin_msg) == _BINARY_DECODER_WAVES_PACKET_X_LENGTH, "wave spectra message should have length {}, got {}".format(_BINARY_DECODER_WAVES_PACKET_X_LENGTH, len(bin_msg))
-
-    # extract the data
-    posix_timestamp = four_bytes_to_long(bin_msg[0:4])
-    max_value = four_bytes_to_float(bin_msg[4:8])
-    nbr_bins = _BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_MAX_BIN - _BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_MIN_BIN
-    print("nbr_bins: {}".format(nbr_bins))
-    nbr_bytes = 2 * nbr_bins
-
-    spectra_energies = struct.unpack('<'+nbr_bins*'H', bytes(bin_msg[8:8+nbr_bytes]))
-    char_next_byte = byte_to_char(bin_msg[_BINARY_DECODER_WAVES_PACKET_X_LENGTH-1])
-
-    assert char_next_byte == 'E', "wave packets are transmitted one at a time, expect 'E' for end at the end"
-
-    if print_decoded:
-        print("posix timestamp: {}".format(posix_timestamp))
-        print("max energy: {}".format(max_value))
-        print("encoded energies:")
-        for crrt_energy in spectra_energies:
-            print(crrt_energy)
-
-    # make sense of the data
-    datetime_fix = datetime.datetime.fromtimestamp(posix_timestamp)
-    list_energy_values = [1.0 * crrt_uint16 * max_value / 65000 for crrt_uint16 in spectra_energies]
-
-    wave_frequencies = [crrt_bin * _BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_SAMPLING_FREQ_HZ / _BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_NBR_SAMPLES_PER_SEGMENT for crrt_bin in range(_BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_MIN_BIN, _BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_MAX_BIN) ]
-
-    list_elevation_energies = []
-    for (crrt_frq, crrt_energy) in zip(wave_frequencies, list_energy_values):
-        crrt_omega = 2.0 * math.pi * crrt_frq
-        crrt_omega_4 = crrt_omega * crrt_omega * crrt_omega * crrt_omega
-        list_elevation_energies.append(crrt_energy / crrt_omega_4 * np.sqrt(2048) * math.sqrt(2.0) * math.pi)
-
-    def compute_spectral_moment(list_frequencies, list_elevation_energies, order):
-        list_to_integrate = [
-            math.pow(crrt_freq, order) * crrt_energy for (crrt_freq, crrt_energy) in zip(list_frequencies, list_elevation_energies)
-        ]
-
-        moment = np.trapz(list_to_integrate, list_frequencies)
-
-        return moment
-
-    m0 = compute_spectral_moment(wave_frequencies, list_elevation_energies, 0)
-    m2 = compute_spectral_moment(wave_frequencies, list_elevation_energies, 2)
-    m4 = compute_spectral_moment(wave_frequencies, list_elevation_energies, 4)
+# unpacking of wave spectra messages of type W, i.e. FFT_LEN 1024
 
-    waves_packet = Waves_Packet(
-        datetime_fix=datetime_fix,
-        list_frequencies=wave_frequencies,
-        list_acceleration_energies=list_energy_values,
-        list_elevation_normalized_energies=list_elevation_energies,
-        m0=m0,
-        m2=m2,
-        m4=m4,
-        hs=4*math.sqrt(m0),
-        tp=1.0/math.sqrt(m2/m0),
-        raw=binascii.hexlify(bin_msg)
-    )
+def unpack_wave_packet_W(bin_msg, print_decoded=True):
+    return unpack_wave_packet(bin_msg, _BINARY_DECODER_WAVES_LAYOUTS['W'], print_decoded=print_decoded)
 
-    if print_decoded:
-        print("---------- decoded WAVE message ------------------------------")
-        print("acceleration spectrum at posix {}, i.e. {}".format(posix_timestamp, datetime_fix))
-        for crrt_bin_ind, (crrt_frq, crrt_energy) in enumerate(zip(wave_frequencies, list_energy_values)):
-            print("bin ind {:03d}: frq {:.5f} Hz, energy {:.4e}".format(crrt_bin_ind + _BINARY_DECODER_WAVES_PACKET_X_SPECTRUM_MIN_BIN, crrt_frq, crrt_energy))
 
-        print("m0")
-        waves_packet.m0
-        print("m2")
-        waves_packet.m2
-        print("m4")
-        waves_packet.m4
-        print("hs")
-        waves_packet.hs
-        print("sqrt(m2/m0)")
-        waves_packet.tp
-        print("--------------------------------------------------------------")
+# case for FFT_LEN 2048
 
-    return (waves_packet, char_next_byte)
+def unpack_wave_packet_X(bin_msg, print_decoded=True):
+    return unpack_wave_packet(bin_msg, _BINARY_DECODER_WAVES_LAYOUTS['X'], print_decoded=print_decoded)
 
 #--------------------------------------------------------------------------------
 # decode a whole message with all its packets
@@ -304,7 +285,7 @@ def decode_message(hex_string_msg, print_info=True):
     bin_msg = binascii.unhexlify(hex_string_msg)
 
     list_decoded_packets = []
-    list_valid_message_kinds = ['G', 'W', 'X']
+    list_valid_message_kinds = ['G'] + list(_BINARY_DECODER_WAVES_LAYOUTS.keys())
 
     message_kind = byte_to_char(bin_msg[0])
 
@@ -331,17 +312,20 @@ def decode_message(hex_string_msg, print_info=True):
             if char_next_byte == 'E':
                 break
 
-    elif message_kind == 'W':
+    elif message_kind in _BINARY_DECODER_WAVES_LAYOUTS:
+        layout = _BINARY_DECODER_WAVES_LAYOUTS[message_kind]
+
         if print_info:
-            print("this is a waves message with FFT_LEN 1024")
+            print("this is a waves message with {}".format(layout.firmware))
 
         message_metadata = Waves_Metadata()
 
         # no metadata for now, the package starts right out at next byte and is to the end
         start_of_packet = 1
 
-        decoded_packet, char_next_byte = unpack_wave_packet_W(
-            bin_msg[start_of_packet: start_of_packet+_BINARY_DECODER_WAVES_PACKET_W_LENGTH],
+        decoded_packet, char_next_byte = unpack_wave_packet(
+            bin_msg[start_of_packet: start_of_packet+layout.packet_length],
+            layout,
             print_decoded=print_info
         )
 
@@ -349,28 +333,40 @@ def decode_message(hex_string_msg, print_info=True):
 
         assert char_next_byte == 'E', "a wave message should have a single packet ending by char 'E'"
 
-    elif message_kind == 'X':  # mostly a copy of the W wave message; refactor?
-        if print_info:
-            print("this is a waves message with FFT_LEN 2048")
+    else:
+        raise(RuntimeError("message kind {} unknown or not implemented".format(message_kind)))
 
-        message_metadata = Waves_Metadata()
+    return message_kind, message_metadata, list_decoded_packets
 
-        # no metadata for now, the package starts right out at next byte and is to the end
-        start_of_packet = 1
 
-        decoded_packet, char_next_byte = unpack_wave_packet_X(
-            bin_msg[start_of_packet: start_of_packet+_BINARY_DECODER_WAVES_PACKET_X_LENGTH],
-            print_decoded=print_info
-        )
+def decode_messages_batch(list_hex_string_msgs):
+    """Decode many messages, possibly from instruments running different firmwares, in one pass: the wave
+    messages are grouped by layout, and each group is unpacked by a single call to unpack_wave_packets.
+    Returns the same (message_kind, message_metadata, list_decoded_packets) as decode_message, for each
+    message and in the same order."""
+    list_results = [None] * len(list_hex_string_msgs)
+    dict_indexes_per_layout = {crrt_kind: [] for crrt_kind in _BINARY_DECODER_WAVES_LAYOUTS}
 
-        list_decoded_packets.append(decoded_packet)
+    for crrt_index, crrt_hex_string_msg in enumerate(list_hex_string_msgs):
+        crrt_kind = byte_to_char(int(crrt_hex_string_msg[0:2], 16))
+        if crrt_kind in dict_indexes_per_layout:
+            dict_indexes_per_layout[crrt_kind].append(crrt_index)
+        else:
+            list_results[crrt_index] = decode_message(crrt_hex_string_msg, print_info=False)
 
-        assert char_next_byte == 'E', "a wave message should have a single packet ending by char 'E'"
+    for crrt_kind, crrt_list_indexes in dict_indexes_per_layout.items():
+        layout = _BINARY_DECODER_WAVES_LAYOUTS[crrt_kind]
 
-    else:
-        raise(RuntimeError("message kind {} unknown or not implemented".format(message_kind)))
+        list_bin_packets = []
+        for crrt_index in crrt_list_indexes:
+            crrt_bin_msg = binascii.unhexlify(list_hex_string_msgs[crrt_index])
+            assert len(crrt_bin_msg) >= 1 + layout.packet_length, "wave spectra message should have length {}, got {}".format(layout.packet_length, len(crrt_bin_msg) - 1)
+            list_bin_packets.append(crrt_bin_msg[1: 1+layout.packet_length])
 
-    return message_kind, message_metadata, list_decoded_packets
+        for crrt_index, crrt_waves_packet in zip(crrt_list_indexes, unpack_wave_packets(list_bin_packets, layout)):
+            list_results[crrt_index] = (crrt_kind, Waves_Metadata(), [crrt_waves_packet])
+
+    return list_results
 
 #--------------------------------------------------------------------------------
 # simple CLI
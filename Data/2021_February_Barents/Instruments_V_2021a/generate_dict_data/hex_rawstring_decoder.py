@@ -3,6 +3,7 @@ import datetime
 import os
 import time
 from dataclasses import dataclass
+import numpy as np
 
 @dataclass
 class GNSS_Packet:
@@ -11,6 +12,20 @@ class GNSS_Packet:
     longitude: float
     raw: str
 
+@dataclass
+class Rawstring_Batch:
+    """Many raw string messages decoded at once: one entry per message, as columns. The messages that are not
+    valid (not hex, not 4 fields, not a datetime, or not numbers) have is_valid False, and dummy values."""
+    posix_timestamp: np.ndarray
+    latitude: np.ndarray
+    longitude: np.ndarray
+    battery: np.ndarray
+    is_valid: np.ndarray
+
+# a valid plaintext, put in place of the messages that cannot be split into 4 fields, so that the columns keep one
+# entry per message
+_HR_PLACEHOLDER_PLAINTEXT = b"0,19700101000000,0,0"
+
 # make sure we use UTC in all our work
 os.environ["TZ"] = "UTC"
 time.tzset()
@@ -38,3 +53,110 @@ def decode_hex_rawstring(hex_str_in):
     print("--------------------")
 
     return crrt_packet
+
+
+def parse_float_column(array_fields, array_is_valid):
+    """The float64 values of a column of byte strings; the entries that are not numbers are set to nan and
+    flagged in array_is_valid."""
+    try:
+        return array_fields.astype(np.float64)
+    except ValueError:
+        array_values = np.full((array_fields.shape[0],), np.nan)
+        for crrt_index, crrt_field in enumerate(array_fields.tolist()):
+            try:
+                array_values[crrt_index] = float(crrt_field)
+            except ValueError:
+                array_is_valid[crrt_index] = False
+        return array_values
+
+
+def decode_hex_rawstrings_batch(list_hex_str_in):
+    """Decode a whole column of raw string messages at once, without printing. The plaintexts are joined with
+    commas and split in a single pass, and the fields are parsed as numpy columns; the timestamps are computed
+    from the digits of the YYYYmmddHHMMSS field rather than by strptime. The messages that would make
+    decode_hex_rawstring raise are not valid (see Rawstring_Batch.is_valid), rather than stopping the whole batch."""
+    nbr_messages = len(list_hex_str_in)
+    array_is_valid = np.full((nbr_messages,), True)
+
+    if nbr_messages == 0:
+        return Rawstring_Batch(
+            posix_timestamp=np.zeros((0,), dtype=np.int64),
+            latitude=np.zeros((0,), dtype=np.float64),
+            longitude=np.zeros((0,), dtype=np.float64),
+            battery=np.zeros((0,), dtype=np.float64),
+            is_valid=array_is_valid,
+        )
+
+    list_plaintexts = []
+    for crrt_index, crrt_hex_str in enumerate(list_hex_str_in):
+        try:
+            list_plaintexts.append(bytes.fromhex(crrt_hex_str))
+        except ValueError:
+            list_plaintexts.append(_HR_PLACEHOLDER_PLAINTEXT)
+            array_is_valid[crrt_index] = False
+
+    # check that each message has exactly 4 fields, ie 3 commas of its own
+    array_nbr_commas = np.array([crrt_plaintext.count(b",") for crrt_plaintext in list_plaintexts], dtype=np.int64)
+    for crrt_index in np.flatnonzero(array_nbr_commas != 3).tolist():
+        list_plaintexts[crrt_index] = _HR_PLACEHOLDER_PLAINTEXT
+        array_is_valid[crrt_index] = False
+
+    # the messages become the successive groups of 4 fields of a single plaintext
+    array_fields = np.array(b",".join(list_plaintexts).split(b","), dtype=np.bytes_).reshape(nbr_messages, 4)
+
+    # the timestamp field: 14 digits, YYYYmmddHHMMSS
+    array_is_valid &= np.char.str_len(array_fields[:, 1]) == 14
+    array_timestamp_fields = np.where(array_is_valid, array_fields[:, 1], _HR_PLACEHOLDER_PLAINTEXT.split(b",")[1]).astype("S14")
+    array_digits = array_timestamp_fields.view(np.uint8).reshape(nbr_messages, 14).astype(np.int64) - ord('0')
+    array_is_valid &= np.all((array_digits >= 0) & (array_digits <= 9), axis=1)
+
+    def number_from_digits(crrt_start, crrt_end):
+        return np.clip(array_digits[:, crrt_start:crrt_end], 0, 9) @ (10 ** np.arange(crrt_end - crrt_start - 1, -1, -1))
+
+    array_years = number_from_digits(0, 4)
+    array_months = number_from_digits(4, 6)
+    array_days = number_from_digits(6, 8)
+    array_hours = number_from_digits(8, 10)
+    array_minutes = number_from_digits(10, 12)
+    array_seconds = number_from_digits(12, 14)
+    array_is_valid &= (array_months >= 1) & (array_months <= 12) & (array_days >= 1)
+    array_is_valid &= (array_hours < 24) & (array_minutes < 60) & (array_seconds < 60)
+
+    # the messages not valid get a dummy date, so that the calendar below does not overflow on garbage
+    array_months = np.where(array_is_valid, array_months, 1)
+    array_days = np.where(array_is_valid, array_days, 1)
+
+    # days since the epoch, from the calendar of numpy; a day past the end of its month ends up in the next month,
+    # and is not valid
+    array_month_start = ((array_years - 1970) * 12 + (array_months - 1)).astype("datetime64[M]")
+    array_posix_days = array_month_start.astype("datetime64[D]") + (array_days - 1)
+    array_is_valid &= array_posix_days.astype("datetime64[M]") == array_month_start
+    array_posix_timestamps = array_posix_days.astype(np.int64) * 86400 + array_hours * 3600 + array_minutes * 60 + array_seconds
+
+    return Rawstring_Batch(
+        posix_timestamp=array_posix_timestamps,
+        latitude=parse_float_column(array_fields[:, 2], array_is_valid),
+        longitude=parse_float_column(array_fields[:, 3], array_is_valid),
+        battery=parse_float_column(array_fields[:, 0], array_is_valid),
+        is_valid=array_is_valid,
+    )
+
+
+def rawstring_batch_to_packets(batch, list_hex_str_in):
+    """The GNSS_Packet of each message of a Rawstring_Batch, same as decode_hex_rawstring would give; None for
+    the messages that are not valid."""
+    return [
+        GNSS_Packet(
+            datetime_fix=crrt_datetime_fix,
+            latitude=crrt_latitude,
+            longitude=crrt_longitude,
+            raw=crrt_hex_str,
+        ) if crrt_is_valid else None
+        for (crrt_datetime_fix, crrt_latitude, crrt_longitude, crrt_hex_str, crrt_is_valid) in zip(
+            batch.posix_timestamp.astype("datetime64[s]").tolist(),
+            batch.latitude.tolist(),
+            batch.longitude.tolist(),
+            list_hex_str_in,
+            batch.is_valid.tolist(),
+        )
+    ]
@@ -25,3 +25,7 @@ list_input_files = [
     "./all_JR.csv",
     "./all_MM.csv"
 ]
+
+# what to do with packets that have the same timestamp as an earlier packet of the same device, but a different
+# content: "keep_first", "keep_last", "keep_all", or "raise"; see packet_dedup.py
+packet_conflict_policy = "keep_first"
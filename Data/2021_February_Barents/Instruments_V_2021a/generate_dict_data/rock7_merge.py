@@ -0,0 +1,97 @@
+"""
+Streaming merge of several Rock7 csv exports into a single stream of rows.
+
+Each Rock7 export is sorted by "Date Time (UTC)", newest first. The exports are
+merged with a heap (heapq.merge), holding only the next row of each export, so
+memory use does not grow with the number of rows. Since the merged stream is
+ordered by time, a row that appears in several exports (for example, a device
+that was registered with several accounts) is found again within the rows of the
+same second, and only these need to be remembered to drop the repeats on the fly.
+"""
+
+import csv
+import heapq
+import itertools
+
+import numpy as np
+
+import rock7_datetimes
+
+#--------------------------------------------------------------------------------
+# a few module constants
+
+# the rows of each export are read, and their datetimes parsed, this many at a time
+_RM_NBR_ROWS_PER_BLOCK = 4096
+# the fields that identify a row; the other fields (credits, approximate location) may differ between accounts
+_RM_ROW_KEY_FIELDS = ["Date Time (UTC)", "Device", "Direction", "Payload"]
+
+#--------------------------------------------------------------------------------
+# the merge
+
+
+def iter_timed_rock7_rows(path, newest_first=True, nbr_rows_per_block=_RM_NBR_ROWS_PER_BLOCK):
+    """Yield the (posix time received, row) of a Rock7 export, checking that the rows are sorted as expected. The rows
+    are read nbr_rows_per_block at a time, and the datetimes of a block are parsed in one go."""
+    last_posix_received = None
+
+    with open(path, mode='r') as fh:
+        reader = csv.DictReader(fh)
+
+        while True:
+            list_rows = list(itertools.islice(reader, nbr_rows_per_block))
+            if len(list_rows) == 0:
+                break
+
+            array_posix_received = rock7_datetimes.parse_rock7_datetimes([crrt_row["Date Time (UTC)"] for crrt_row in list_rows])
+
+            # the steps between successive rows, including from the last row of the previous block
+            if last_posix_received is None:
+                array_steps = np.diff(array_posix_received)
+                first_row_of_step = 1
+            else:
+                array_steps = np.diff(array_posix_received, prepend=last_posix_received)
+                first_row_of_step = 0
+            array_is_unsorted = (array_steps > 0) if newest_first else (array_steps < 0)
+            if np.any(array_is_unsorted):
+                crrt_row = list_rows[int(np.argmax(array_is_unsorted)) + first_row_of_step]
+                raise RuntimeError("the rows of {} are not sorted {} first, at {}".format(path, "newest" if newest_first else "oldest", crrt_row["Date Time (UTC)"]))
+            last_posix_received = int(array_posix_received[-1])
+
+            yield from zip(array_posix_received.tolist(), list_rows)
+
+
+def iter_merged_rock7_rows(list_paths, newest_first=True, stats=None):
+    """Yield the rows (as dicts, as given by csv.DictReader) of all the Rock7 exports in list_paths, merged into one
+    stream sorted by time of transmission, newest first as in the exports themselves (or oldest first, if the exports
+    are sorted this way). The rows found in several exports are only yielded once. If a dict stats is given, its
+    "nbr_rows" and "nbr_repeated_rows" entries count the rows read and the rows dropped."""
+    if stats is not None:
+        stats["nbr_rows"] = 0
+        stats["nbr_repeated_rows"] = 0
+
+    iterator_merged = heapq.merge(
+        *[iter_timed_rock7_rows(crrt_path, newest_first=newest_first) for crrt_path in list_paths],
+        key=lambda crrt_timed_row: crrt_timed_row[0],
+        reverse=newest_first,
+    )
+
+    # the keys of the rows of the current second, the only ones that a repeat can match
+    crrt_second = None
+    set_keys_crrt_second = set()
+
+    for (crrt_posix_received, crrt_row) in iterator_merged:
+        if stats is not None:
+            stats["nbr_rows"] += 1
+
+        if crrt_posix_received != crrt_second:
+            crrt_second = crrt_posix_received
+            set_keys_crrt_second = set()
+
+        crrt_key = tuple(crrt_row[crrt_field] for crrt_field in _RM_ROW_KEY_FIELDS)
+        if crrt_key in set_keys_crrt_second:
+            if stats is not None:
+                stats["nbr_repeated_rows"] += 1
+            continue
+        set_keys_crrt_second.add(crrt_key)
+
+        yield crrt_row
@@ -8,14 +8,16 @@
 
 import pickle as pkl
 import decoder
-import datetime
 import os
+import numpy as np
 import time
-import csv
+import itertools
 import matplotlib.pyplot as plt
-from params import list_instruments_and_time, list_instruments_raw_string, list_input_files
-import tqdm
-from hex_rawstring_decoder import decode_hex_rawstring
+from params import list_instruments_and_time, list_instruments_raw_string, list_input_files, packet_conflict_policy
+from hex_rawstring_decoder import decode_hex_rawstrings_batch, rawstring_batch_to_packets
+from packet_dedup import PacketDeduplicator
+from rock7_merge import iter_merged_rock7_rows
+import rock7_datetimes
 import decoder
 
 # make sure we use UTC in all our work
@@ -27,6 +29,7 @@ list_instruments = [entry[0] for entry in list_instruments_and_time]
 dict_instruments_to_start_time = {}
 for crrt_entry in list_instruments_and_time:
     dict_instruments_to_start_time[crrt_entry[0]] = crrt_entry[1]
+dict_instruments_to_start_posix = {crrt_instrument: int(np.datetime64(crrt_start_time, "s").astype(np.int64)) for (crrt_instrument, crrt_start_time) in dict_instruments_to_start_time.items()}
 
 # the dict to contain all the data
 dict_data = {}
@@ -36,86 +39,102 @@ for crrt_instrument in list_instruments:
     dict_data[crrt_instrument]["gnss_fixes"] = []
     dict_data[crrt_instrument]["spectra"] = []
 
-# read all the file inputs
-list_csv_entries = []
-
-for crrt_file in list_input_files:
-    with open(crrt_file, mode='r') as fh:
-        input_dict = csv.DictReader(fh)
-        for row in input_dict:
-            list_csv_entries.append(row)
-
-# decode the data
-for crrt_dict_entry in tqdm.tqdm(list_csv_entries):
-    crrt_device = crrt_dict_entry["Device"][10:15]
-    print(crrt_dict_entry)
-
-    # is this an instrument we want to look at?
-    if crrt_device in list_instruments:
-
-        # ignore empty payloads, ie failed transmissions
-        if (len(crrt_dict_entry["Payload"]) > 0) and (datetime.datetime.strptime(crrt_dict_entry["Date Time (UTC)"], "%d/%b/%Y %H:%M:%S") > dict_instruments_to_start_time[crrt_device]):
-            # from when do we want to look at?
-            crrt_start_time = dict_instruments_to_start_time[crrt_device]
-
-            crrt_msg = crrt_dict_entry["Payload"]
-
-            # is this an instrument that uses raw hex string protocol?
-            if crrt_device in list_instruments_raw_string:
-                crrt_packet = decode_hex_rawstring(crrt_msg)
-
-                # only consider data after start time
-                if crrt_packet.datetime_fix > crrt_start_time:
-                    # we only append if non faulty transmission (avoid repeats)
-                    if crrt_packet not in dict_data[crrt_device]["gnss_fixes"]:
-                        dict_data[crrt_device]["gnss_fixes"].append(crrt_packet)
-
-            # is this an instrument that uses binary protocol?
-            else:
-                msg_kind, msg_metadata, msg_packets = decoder.decode_message(crrt_msg)
-
-                # only consider data after start time
-                if msg_packets[0].datetime_fix > crrt_start_time:
-                    if msg_kind == 'G':  # a GPS fix
-                        for crrt_packet in msg_packets:
-                            if crrt_packet not in dict_data[crrt_device]["gnss_fixes"]:
-                                dict_data[crrt_device]["gnss_fixes"].append(crrt_packet)
-                    elif msg_kind == 'W' or msg_kind == 'X':  # a wave spectrum
+# the repeated packets are dropped as they come, by a hash lookup on (device, kind, timestamp, digest of the packet)
+packet_deduplicator = PacketDeduplicator(conflict_policy=packet_conflict_policy)
+
+# the rows of all the exports, merged into one stream by time of transmission, the rows found in several exports
+# being only kept once; the rows are then decoded nbr_rows_per_chunk at a time
+# the merged stream is newest first, as the exports, and the conflict policy sees the packets in the order in which
+# they are added, so the rows are taken in reverse, oldest first (the rows of a same second in the reverse of their
+# order in the stream); this holds the rows in memory, as the deduplicator holds their packets anyway
+merge_stats = {}
+iterator_rows = reversed(list(iter_merged_rock7_rows(list_input_files, stats=merge_stats)))
+nbr_rows_per_chunk = 4096
+
+while True:
+    list_csv_entries = list(itertools.islice(iterator_rows, nbr_rows_per_chunk))
+    if len(list_csv_entries) == 0:
+        break
+
+    # decode all the binary protocol messages of the chunk in one pass, whatever the firmware (and kind of wave packets)
+    # of the instrument, and all the raw hex string messages in one other pass
+    # the rows to decode: from the instruments we look at, with a payload, and received after the start time of their
+    # instrument; the datetimes of the chunk are parsed in one go, and compared to the start times as one array
+    list_devices = [crrt_dict_entry["Device"][10:15] for crrt_dict_entry in list_csv_entries]
+    array_received_posix = rock7_datetimes.parse_rock7_datetimes([crrt_dict_entry["Date Time (UTC)"] for crrt_dict_entry in list_csv_entries])
+    array_start_posix = np.array([dict_instruments_to_start_posix.get(crrt_device, np.iinfo(np.int64).max) for crrt_device in list_devices], dtype=np.int64)
+    array_has_payload = np.array([len(crrt_dict_entry["Payload"]) > 0 for crrt_dict_entry in list_csv_entries], dtype=bool)
+    array_is_selected = array_has_payload & (array_received_posix > array_start_posix)
+
+    dict_binary_messages_index = {}
+    dict_rawstring_messages_index = {}
+    for crrt_index in np.flatnonzero(array_is_selected).tolist():
+        if list_devices[crrt_index] in list_instruments_raw_string:
+            dict_rawstring_messages_index[crrt_index] = len(dict_rawstring_messages_index)
+        else:
+            dict_binary_messages_index[crrt_index] = len(dict_binary_messages_index)
+    list_binary_messages_decoded = decoder.decode_messages_batch([list_csv_entries[crrt_index]["Payload"] for crrt_index in dict_binary_messages_index])
+    list_rawstring_payloads = [list_csv_entries[crrt_index]["Payload"] for crrt_index in dict_rawstring_messages_index]
+    list_rawstring_packets = rawstring_batch_to_packets(decode_hex_rawstrings_batch(list_rawstring_payloads), list_rawstring_payloads)
+
+    # decode the data
+    for crrt_index, crrt_dict_entry in enumerate(list_csv_entries):
+        crrt_device = crrt_dict_entry["Device"][10:15]
+        print(crrt_dict_entry)
+
+        # is this an instrument we want to look at?
+        if crrt_device in list_instruments:
+
+            # ignore empty payloads, ie failed transmissions
+            if array_is_selected[crrt_index]:
+                # from when do we want to look at?
+                crrt_start_time = dict_instruments_to_start_time[crrt_device]
+
+                crrt_msg = crrt_dict_entry["Payload"]
+
+                # is this an instrument that uses raw hex string protocol?
+                if crrt_device in list_instruments_raw_string:
+                    crrt_packet = list_rawstring_packets[dict_rawstring_messages_index[crrt_index]]
+
+                    # a corrupted transmission, that does not decode
+                    if crrt_packet is None:
+                        print("Warning; non valid raw string message {}".format(crrt_msg))
+
+                    # only consider data after start time
+                    elif crrt_packet.datetime_fix > crrt_start_time:
+                        packet_deduplicator.add(crrt_device, "gnss_fixes", crrt_packet.datetime_fix, crrt_packet)
+
+                # is this an instrument that uses binary protocol?
+                else:
+                    msg_kind, msg_metadata, msg_packets = list_binary_messages_decoded[dict_binary_messages_index[crrt_index]]
+
+                    # only consider data after start time
+                    if msg_packets[0].datetime_fix > crrt_start_time:
+                        if msg_kind == 'G':  # a GPS fix
+                            for crrt_packet in msg_packets:
+                                packet_deduplicator.add(crrt_device, "gnss_fixes", crrt_packet.datetime_fix, crrt_packet)
+                        elif msg_kind == 'W' or msg_kind == 'X':  # a wave spectrum
+                            for crrt_packet in msg_packets:
+                                packet_deduplicator.add(crrt_device, "spectra", crrt_packet.datetime_fix, crrt_packet)
+                        else:
+                            raise(RuntimeError("msg kind {} unknown".format(msg_kind)))
                         for crrt_packet in msg_packets:
-                            if crrt_packet not in dict_data[crrt_device]["spectra"]:
-                                dict_data[crrt_device]["spectra"].append(crrt_packet)
-                    else:
-                        raise(RuntimeError("msg kind {} unknown".format(msg_kind)))
-                    for crrt_packet in msg_packets:
-                        pass
+                            pass
 
-                    if msg_kind == "W" and crrt_device != "19641":
-                        raise RuntimeError("careful, instrument {} uses the old 'X' kind of wave spectrum".format(crrt_device))
+                        if msg_kind == "W" and crrt_device != "19641":
+                            raise RuntimeError("careful, instrument {} uses the old 'X' kind of wave spectrum".format(crrt_device))
 
-# re-order the packages
-for crrt_device in list_instruments:
-    dict_data[crrt_device]["gnss_fixes"].sort(key=lambda x: x.datetime_fix)
-    dict_data[crrt_device]["spectra"].sort(key=lambda x: x.datetime_fix)
+print("merged {} rows from {} exports, dropped {} rows found in several exports".format(
+    merge_stats["nbr_rows"], len(list_input_files), merge_stats["nbr_repeated_rows"]))
+print("dropped {} repeated packets; {} packets conflict with an earlier packet of same timestamp, resolved with policy {}".format(
+    packet_deduplicator.nbr_repeats, len(packet_deduplicator.list_conflicts), packet_conflict_policy))
 
-# remove duplicates in case of bad transmission
+# all the distinct packets, sorted by time, and only one packet per timestamp in gnss_fixes and res_spectra
 for crrt_device in list_instruments:
-    if len(dict_data[crrt_device]["gnss_fixes"]) > 0:
-        res_fixes = [dict_data[crrt_device]["gnss_fixes"][0]]
-        for crrt_entry in dict_data[crrt_device]["gnss_fixes"]:
-            if crrt_entry.datetime_fix == res_fixes[-1].datetime_fix:
-                pass
-            else:
-                res_fixes.append(crrt_entry)
-        dict_data[crrt_device]["gnss_fixes"] = res_fixes
-
+    dict_data[crrt_device]["gnss_fixes"] = packet_deduplicator.packets(crrt_device, "gnss_fixes")
+    dict_data[crrt_device]["spectra"] = packet_deduplicator.packets(crrt_device, "spectra", conflict_policy="keep_all")
     if len(dict_data[crrt_device]["spectra"]) > 0:
-        res_spectra = [dict_data[crrt_device]["spectra"][0]]
-        for crrt_entry in dict_data[crrt_device]["spectra"]:
-            if crrt_entry.datetime_fix == res_fixes[-1].datetime_fix:
-                pass
-            else:
-                res_spectra.append(crrt_entry)
-        dict_data[crrt_device]["res_spectra"] = res_spectra
+        dict_data[crrt_device]["res_spectra"] = packet_deduplicator.packets(crrt_device, "spectra")
 
 # quick and dirty visualization
 plt.figure()
@@ -7,6 +7,10 @@ import pickle
 
 import netCDF4 as nc4
 
+import nc_storage_profiles
+
+import numpy as np
+
 import datetime
 
 # ------------------------------------------------------------------------------------------
@@ -30,6 +34,10 @@ number_of_valid_measurements = 6
 # ------------------------------------------------------------------------------------------
 print("***** prepare the dataset")
 
+# the storage of the netCDF variables (chunk shapes, compression): "contiguous" (uncompressed, as before), or the
+# opt-in "trajectory" or "time_window"; see nc_storage_profiles.py
+nc_storage_profile = "contiguous"
+
 output_file = "data_boat_wave_ultrasound_probes_Barents_2021.nc"
 
 with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
@@ -111,12 +119,12 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
 
     # --------------------
     # time of start and end of measurement segment
-    time_start_segment_var = nc4_out.createVariable("time_start_segment", "f8", ("measurement_segment"))
+    time_start_segment_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "time_start_segment", "f8", ("measurement_segment"))
     time_start_segment_var.standard_name = "time"
     time_start_segment_var.long_name = "time start of measurement segment"
     time_start_segment_var.units = "seconds since 1970-01-01 00:00:00 +0000"
 
-    time_end_segment_var = nc4_out.createVariable("time_end_segment", "f8", ("measurement_segment"))
+    time_end_segment_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "time_end_segment", "f8", ("measurement_segment"))
     time_end_segment_var.standard_name = "time"
     time_end_segment_var.long_name = "time end of measurement segment"
     time_end_segment_var.units = "seconds since 1970-01-01 00:00:00 +0000"
@@ -124,22 +132,22 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # --------------------
     # latitude and longitude of start and end of measurement segment
 
-    lat_start_segment_var = nc4_out.createVariable("lat_start_segment", "f4", ("measurement_segment"))
+    lat_start_segment_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "lat_start_segment", "f4", ("measurement_segment"))
     lat_start_segment_var.standard_name = "latitude"
     lat_start_segment_var.long_name = "latitude at start of measurement segment"
     lat_start_segment_var.units = "degrees_north"
 
-    lat_end_segment_var = nc4_out.createVariable("lat_end_segment", "f4", ("measurement_segment"))
+    lat_end_segment_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "lat_end_segment", "f4", ("measurement_segment"))
     lat_end_segment_var.standard_name = "latitude"
     lat_end_segment_var.long_name = "latitude at end of measurement segment"
     lat_end_segment_var.units = "degrees_north"
 
-    lon_start_segment_var = nc4_out.createVariable("lon_start_segment", "f4", ("measurement_segment"))
+    lon_start_segment_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "lon_start_segment", "f4", ("measurement_segment"))
     lon_start_segment_var.standard_name = "longitude"
     lon_start_segment_var.long_name = "longitude at start of measurement segment"
     lon_start_segment_var.units = "degrees_east"
 
-    lon_end_segment_var = nc4_out.createVariable("lon_end_segment", "f4", ("measurement_segment"))
+    lon_end_segment_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "lon_end_segment", "f4", ("measurement_segment"))
     lon_end_segment_var.standard_name = "longitude"
     lon_end_segment_var.long_name = "longitude at end of measurement segment"
     lon_end_segment_var.units = "degrees_east"
@@ -147,22 +155,22 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     # --------------------
     # scalar statistics of measurement segment: Hs, SWH, Tz, Tp
 
-    hs_var = nc4_out.createVariable("hs", "f4", ("measurement_segment"))
+    hs_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "hs", "f4", ("measurement_segment"))
     hs_var.standard_name = "sea_surface_swell_wave_significant_height"
     hs_var.long_name = "significant wave height of sea ice surface elevation computed as 4*sqrt(m0)"
     hs_var.units = "m"
 
-    swh_var = nc4_out.createVariable("swh", "f4", ("measurement_segment"))
+    swh_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "swh", "f4", ("measurement_segment"))
     swh_var.standard_name = "sea_surface_swell_wave_significant_height"
     swh_var.long_name = "significant wave height of sea ice surface elevation computed as 4*std(eta)"
     swh_var.units = "m"
 
-    tz_var = nc4_out.createVariable("tp", "f4", ("measurement_segment"))
+    tz_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "tp", "f4", ("measurement_segment"))
     tz_var.standard_name = "sea_surface_swell_wave_period"
     tz_var.long_name = "period of sea ice surface elevation computed as sqrt(m0/m2)"
     tz_var.units = "s"
 
-    tm_var = nc4_out.createVariable("tm", "f4", ("measurement_segment"))
+    tm_var = nc_storage_profiles.create_variable(nc4_out, nc_storage_profile, "tm", "f4", ("measurement_segment"))
     tm_var.standard_name = "sea_surface_swell_wave_maximum_spectrum"
     tm_var.long_name = "period of sea ice surface elevation computed from the maximum of the wave spectrum"
     tm_var.units = "s"
@@ -198,19 +206,41 @@ with nc4.Dataset(output_file, "w", format="NETCDF4") as nc4_out:
     nc4_out.time_coverage_end = datetime_end.isoformat()
 
     # ------------------------------------------------------------
-    # filling the data themselves
+    # filling the data themselves; in memory first, and each variable in one go at the end
+
+    array_time_start_segment = np.full((number_of_valid_measurements,), nc4.default_fillvals["f8"])
+    array_time_end_segment = np.full((number_of_valid_measurements,), nc4.default_fillvals["f8"])
+    array_lat_start_segment = np.full((number_of_valid_measurements,), nc4.default_fillvals["f4"])
+    array_lat_end_segment = np.full((number_of_valid_measurements,), nc4.default_fillvals["f4"])
+    array_lon_start_segment = np.full((number_of_valid_measurements,), nc4.default_fillvals["f4"])
+    array_lon_end_segment = np.full((number_of_valid_measurements,), nc4.default_fillvals["f4"])
+    array_hs = np.full((number_of_valid_measurements,), nc4.default_fillvals["f4"])
+    array_swh = np.full((number_of_valid_measurements,), nc4.default_fillvals["f4"])
+    array_tz = np.full((number_of_valid_measurements,), nc4.default_fillvals["f4"])
+    array_tm = np.full((number_of_valid_measurements,), nc4.default_fillvals["f4"])
 
     for crrt_segment_ind, crrt_segment_key in enumerate(dict_observations):
-        time_start_segment_var[crrt_segment_ind] = crrt_segment_key[0].timestamp()
-        time_end_segment_var[crrt_segment_ind] = crrt_segment_key[1].timestamp()
-
-        lat_start_segment_var[crrt_segment_ind] = dict_observations[crrt_segment_key]["boat_positions"][0].latitude
-        lat_end_segment_var[crrt_segment_ind] = dict_observations[crrt_segment_key]["boat_positions"][-1].latitude
-
-        lon_start_segment_var[crrt_segment_ind] = dict_observations[crrt_segment_key]["boat_positions"][0].longitude
-        lon_end_segment_var[crrt_segment_ind] = dict_observations[crrt_segment_key]["boat_positions"][-1].longitude
-
-        hs_var[crrt_segment_ind] = dict_observations[crrt_segment_key]["Hs"]
-        swh_var[crrt_segment_ind] = dict_observations[crrt_segment_key]["SWH"]
-        tz_var[crrt_segment_ind] = dict_observations[crrt_segment_key]["Tz"]
-        tm_var[crrt_segment_ind] = dict_observations[crrt_segment_key]["Tp"]
+        array_time_start_segment[crrt_segment_ind] = crrt_segment_key[0].timestamp()
+        array_time_end_segment[crrt_segment_ind] = crrt_segment_key[1].timestamp()
+
+        array_lat_start_segment[crrt_segment_ind] = dict_observations[crrt_segment_key]["boat_positions"][0].latitude
+        array_lat_end_segment[crrt_segment_ind] = dict_observations[crrt_segment_key]["boat_positions"][-1].latitude
+
+        array_lon_start_segment[crrt_segment_ind] = dict_observations[crrt_segment_key]["boat_positions"][0].longitude
+        array_lon_end_segment[crrt_segment_ind] = dict_observations[crrt_segment_key]["boat_positions"][-1].longitude
+
+        array_hs[crrt_segment_ind] = dict_observations[crrt_segment_key]["Hs"]
+        array_swh[crrt_segment_ind] = dict_observations[crrt_segment_key]["SWH"]
+        array_tz[crrt_segment_ind] = dict_observations[crrt_segment_key]["Tz"]
+        array_tm[crrt_segment_ind] = dict_observations[crrt_segment_key]["Tp"]
+
+    time_start_segment_var[:] = array_time_start_segment
+    time_end_segment_var[:] = array_time_end_segment
+    lat_start_segment_var[:] = array_lat_start_segment
+    lat_end_segment_var[:] = array_lat_end_segment
+    lon_start_segment_var[:] = array_lon_start_segment
+    lon_end_segment_var[:] = array_lon_end_segment
+    hs_var[:] = array_hs
+    swh_var[:] = array_swh
+    tz_var[:] = array_tz
+    tm_var[:] = array_tm
@@ -0,0 +1,174 @@
+"""
+Duplicate elimination for the decoded packets, in linear time.
+
+The same packet can be received several times, for example when a message is sent
+again after a bad transmission. Rather than looking for each new packet in the
+list of all the packets kept so far, the packets are indexed by (device, kind,
+timestamp, packet digest), so that an exact repeat is found with a dict lookup.
+
+Two packets with the same (device, kind, timestamp) but a different content are a
+conflict (for example, a corrupted transmission that still decodes). The conflict
+policy says which packets to keep then:
+- "keep_first": the packet received first;
+- "keep_last": the packet received last;
+- "keep_all": all the distinct packets, in the order in which they were received;
+- "raise": raise a RuntimeError if there is any conflict.
+The order of reception is the order in which the packets are added: the Rock7 exports
+list the newest rows first, so the ingest scripts take their rows oldest first.
+The conflicts are only recorded as the packets come, and the policy is applied when
+the packets are read, so that the entries read with "keep_all" never raise.
+select_by_conflict_policy is the one implementation of the policies; it is also used
+by packet_store.PacketStore.resolve_timestamp_conflicts on the columnar path.
+"""
+
+import dataclasses
+import hashlib
+
+import numpy as np
+
+#--------------------------------------------------------------------------------
+# a few module constants
+
+_PD_CONFLICT_POLICIES = ["keep_first", "keep_last", "keep_all", "raise"]
+_PD_DIGEST_SIZE = 16
+
+#--------------------------------------------------------------------------------
+# digest of a packet
+
+
+def packet_digest(packet):
+    """A digest of the content of a decoded packet (any of the dataclass packets of the decoder): packets
+    that are equal have the same digest. Only the dataclass fields are used, not the cached derived values."""
+    crrt_hash = hashlib.blake2b(digest_size=_PD_DIGEST_SIZE)
+    for crrt_field in dataclasses.fields(packet):
+        crrt_value = getattr(packet, crrt_field.name)
+        if isinstance(crrt_value, np.ndarray):
+            crrt_hash.update(crrt_value.tobytes())
+        else:
+            crrt_hash.update(repr(crrt_value).encode("utf-8"))
+        crrt_hash.update(b"\0")
+    return crrt_hash.digest()
+
+#--------------------------------------------------------------------------------
+# the conflict policies
+
+
+def select_by_conflict_policy(array_timestamps, conflict_policy, description="packets"):
+    """The indexes of the packets to keep following conflict_policy, for distinct packets sorted by timestamp, the
+    packets of a same timestamp being in the order in which they were received. The timestamps can be of any type
+    that compares with ==, for example posix timestamps or datetimes."""
+    assert conflict_policy in _PD_CONFLICT_POLICIES, "unknown conflict policy {}".format(conflict_policy)
+
+    array_timestamps = np.asarray(array_timestamps)
+    if array_timestamps.shape[0] == 0:
+        return np.zeros((0,), dtype=np.int64)
+
+    array_same_as_next = array_timestamps[:-1] == array_timestamps[1:]
+    array_is_first = np.concatenate(([True], ~array_same_as_next))
+    array_is_last = np.concatenate((~array_same_as_next, [True]))
+
+    if conflict_policy == "keep_first":
+        return np.flatnonzero(array_is_first)
+    elif conflict_policy == "keep_last":
+        return np.flatnonzero(array_is_last)
+    elif conflict_policy == "raise" and not np.all(array_is_first):
+        raise RuntimeError("conflicting {} at timestamps {}".format(description, sorted(set(array_timestamps[~array_is_first].tolist()))))
+    return np.arange(array_timestamps.shape[0])
+
+#--------------------------------------------------------------------------------
+# the deduplication layer
+
+
+class PacketDeduplicator:
+    """Collect the packets of all devices and kinds, dropping the exact repeats as they come."""
+
+    def __init__(self, conflict_policy="keep_first"):
+        assert conflict_policy in _PD_CONFLICT_POLICIES, "unknown conflict policy {}".format(conflict_policy)
+        self.conflict_policy = conflict_policy
+        # (device, kind) -> timestamp -> digest -> packet, in the order in which the packets were added
+        self._dict_packets = {}
+        self.nbr_repeats = 0
+        # (device, kind, timestamp) of each packet that conflicts with a packet added before it
+        self.list_conflicts = []
+
+    def add(self, device, kind, timestamp, packet):
+        """Add a packet; returns False if it repeats a packet already added (which is then ignored)."""
+        dict_same_timestamp = self._dict_packets.setdefault((device, kind), {}).setdefault(timestamp, {})
+        crrt_digest = packet_digest(packet)
+
+        if crrt_digest in dict_same_timestamp:
+            self.nbr_repeats += 1
+            return False
+
+        if len(dict_same_timestamp) > 0:
+            self.list_conflicts.append((device, kind, timestamp))
+
+        dict_same_timestamp[crrt_digest] = packet
+        return True
+
+    def packets(self, device, kind, conflict_policy=None):
+        """The packets of a device and kind, sorted by timestamp, with the conflicts resolved following conflict_policy
+        (by default, the policy of the deduplicator)."""
+        if conflict_policy is None:
+            conflict_policy = self.conflict_policy
+        assert conflict_policy in _PD_CONFLICT_POLICIES, "unknown conflict policy {}".format(conflict_policy)
+
+        dict_timestamps = self._dict_packets.get((device, kind), {})
+        list_timestamps = []
+        list_packets = []
+        for crrt_timestamp in sorted(dict_timestamps):
+            for crrt_packet in dict_timestamps[crrt_timestamp].values():
+                list_timestamps.append(crrt_timestamp)
+                list_packets.append(crrt_packet)
+
+        array_indexes = select_by_conflict_policy(list_timestamps, conflict_policy, "packets for device {} kind {}".format(device, kind))
+        return [list_packets[crrt_index] for crrt_index in array_indexes.tolist()]
+
+#--------------------------------------------------------------------------------
+# testing
+
+
+def auto_test():
+    print("------------------------------ START AUTO TEST ------------------------------")
+
+    @dataclasses.dataclass
+    class TestPacket:
+        timestamp: int
+        value: float
+
+    # received in this order: a repeat of (1, 0.0), and two conflicts at timestamp 1
+    list_received = [TestPacket(2, 0.0), TestPacket(1, 0.0), TestPacket(1, 0.0), TestPacket(1, 1.0), TestPacket(3, 0.0), TestPacket(1, 2.0)]
+    dict_expected = {
+        "keep_first": [TestPacket(1, 0.0), TestPacket(2, 0.0), TestPacket(3, 0.0)],
+        "keep_last": [TestPacket(1, 2.0), TestPacket(2, 0.0), TestPacket(3, 0.0)],
+        "keep_all": [TestPacket(1, 0.0), TestPacket(1, 1.0), TestPacket(1, 2.0), TestPacket(2, 0.0), TestPacket(3, 0.0)],
+    }
+
+    for crrt_conflict_policy in _PD_CONFLICT_POLICIES:
+        # adding never raises, whatever the policy
+        packet_deduplicator = PacketDeduplicator(conflict_policy=crrt_conflict_policy)
+        for crrt_packet in list_received:
+            packet_deduplicator.add("device", "kind", crrt_packet.timestamp, crrt_packet)
+        assert packet_deduplicator.nbr_repeats == 1
+        assert len(packet_deduplicator.list_conflicts) == 2
+
+        # only reading with the "raise" policy raises
+        assert packet_deduplicator.packets("device", "kind", conflict_policy="keep_all") == dict_expected["keep_all"]
+        if crrt_conflict_policy == "raise":
+            try:
+                packet_deduplicator.packets("device", "kind")
+                raise AssertionError("the raise conflict policy did not raise")
+            except RuntimeError:
+                pass
+        else:
+            assert packet_deduplicator.packets("device", "kind") == dict_expected[crrt_conflict_policy]
+
+    # without conflicts, all the policies give the same packets
+    assert list(select_by_conflict_policy([1, 2, 3], "raise")) == [0, 1, 2]
+    assert list(select_by_conflict_policy([], "keep_last")) == []
+
+    print("------------------------------ END AUTO TEST ------------------------------")
+
+
+if __name__ == "__main__":
+    auto_test()
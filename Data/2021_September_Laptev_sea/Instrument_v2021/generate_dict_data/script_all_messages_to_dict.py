@@ -13,7 +13,8 @@ import os
 import time
 import csv
 import matplotlib.pyplot as plt
-from params import list_instruments_and_time, list_input_files
+from params import list_instruments_and_time, list_input_files, packet_conflict_policy
+from packet_dedup import PacketDeduplicator
 import tqdm
 from icecream import ic
 
@@ -47,6 +48,13 @@ for crrt_file in list_input_files:
         for row in input_dict:
             list_csv_entries.append(row)
 
+# the exports list the newest rows first; the rows are taken oldest first, so that the conflict policy sees the packets
+# in the order in which they were received (the rows of a same second stay in the reverse of their order in the exports)
+list_csv_entries = sorted(reversed(list_csv_entries), key=lambda row: datetime.datetime.strptime(row["Date Time (UTC)"], "%d/%b/%Y %H:%M:%S"))
+
+# the repeated packets are dropped as they come, by a hash lookup on (device, kind, timestamp, digest of the packet)
+packet_deduplicator = PacketDeduplicator(conflict_policy=packet_conflict_policy)
+
 # decode the data
 for crrt_dict_entry in tqdm.tqdm(list_csv_entries):
     crrt_device = crrt_dict_entry["Device"]
@@ -70,53 +78,31 @@ for crrt_dict_entry in tqdm.tqdm(list_csv_entries):
 
             if msg_kind == 'G':  # a GPS fix
                 for crrt_packet in msg_packets:
-                    if crrt_packet not in dict_data[crrt_device]["gnss_fixes"] and crrt_packet.datetime_fix > crrt_start_time:
-                        dict_data[crrt_device]["gnss_fixes"].append(crrt_packet)
+                    if crrt_packet.datetime_fix > crrt_start_time:
+                        packet_deduplicator.add(crrt_device, "gnss_fixes", crrt_packet.datetime_fix, crrt_packet)
             elif msg_kind == 'Y':  # a wave spectrum
                 for crrt_packet in msg_packets:
-                    if crrt_packet not in dict_data[crrt_device]["spectra"] and crrt_packet.datetime_fix > crrt_start_time:
-                        dict_data[crrt_device]["spectra"].append(crrt_packet)
+                    if crrt_packet.datetime_fix > crrt_start_time:
+                        packet_deduplicator.add(crrt_device, "spectra", crrt_packet.datetime_fix, crrt_packet)
             elif msg_kind == 'T':  # a thermistor packet
                 for crrt_packet in msg_packets:
-                    if crrt_packet not in dict_data[crrt_device]["thermistor"] and crrt_packet.datetime_packet > crrt_start_time:
-                        dict_data[crrt_device]["thermistor"].append(crrt_packet)
+                    if crrt_packet.datetime_packet > crrt_start_time:
+                        packet_deduplicator.add(crrt_device, "thermistor", crrt_packet.datetime_packet, crrt_packet)
             else:
                 raise(RuntimeError("msg kind {} unknown".format(msg_kind)))
 
-# re-order the packages
-for crrt_device in list_instruments:
-    dict_data[crrt_device]["gnss_fixes"].sort(key=lambda x: x.datetime_fix)
-    dict_data[crrt_device]["spectra"].sort(key=lambda x: x.datetime_fix)
-    dict_data[crrt_device]["thermistor"].sort(key=lambda x: x.datetime_packet)
+print("dropped {} repeated packets; {} packets conflict with an earlier packet of same timestamp, resolved with policy {}".format(
+    packet_deduplicator.nbr_repeats, len(packet_deduplicator.list_conflicts), packet_conflict_policy))
 
-# remove duplicates in case of bad transmission
+# all the distinct packets, sorted by time, and only one packet per timestamp in gnss_fixes and res_*
 for crrt_device in list_instruments:
-    if len(dict_data[crrt_device]["gnss_fixes"]) > 0:
-        res_fixes = [dict_data[crrt_device]["gnss_fixes"][0]]
-        for crrt_entry in dict_data[crrt_device]["gnss_fixes"]:
-            if crrt_entry.datetime_fix == res_fixes[-1].datetime_fix:
-                pass
-            else:
-                res_fixes.append(crrt_entry)
-        dict_data[crrt_device]["gnss_fixes"] = res_fixes
-
+    dict_data[crrt_device]["gnss_fixes"] = packet_deduplicator.packets(crrt_device, "gnss_fixes")
+    dict_data[crrt_device]["spectra"] = packet_deduplicator.packets(crrt_device, "spectra", conflict_policy="keep_all")
+    dict_data[crrt_device]["thermistor"] = packet_deduplicator.packets(crrt_device, "thermistor", conflict_policy="keep_all")
     if len(dict_data[crrt_device]["spectra"]) > 0:
-        res_spectra = [dict_data[crrt_device]["spectra"][0]]
-        for crrt_entry in dict_data[crrt_device]["spectra"]:
-            if crrt_entry.datetime_fix == res_fixes[-1].datetime_fix:
-                pass
-            else:
-                res_spectra.append(crrt_entry)
-        dict_data[crrt_device]["res_spectra"] = res_spectra
-
+        dict_data[crrt_device]["res_spectra"] = packet_deduplicator.packets(crrt_device, "spectra")
     if len(dict_data[crrt_device]["thermistor"]) > 0:
-        res_thermistor = [dict_data[crrt_device]["thermistor"][0]]
-        for crrt_entry in dict_data[crrt_device]["thermistor"]:
-            if crrt_entry.datetime_packet == res_thermistor[-1].datetime_packet:
-                pass
-            else:
-                res_thermistor.append(crrt_entry)
-        dict_data[crrt_device]["res_thermistor"] = res_thermistor
+        dict_data[crrt_device]["res_thermistor"] = packet_deduplicator.packets(crrt_device, "thermistor")
 
 # quick and dirty visualization
 plt.figure()
@@ -2,20 +2,17 @@
 # before I used #!/bin/python3 , but some users were experiencing problems
 
 import binascii
+import csv
+import itertools
+import json
 import struct
 import datetime
 import time
-import os
-from dataclasses import dataclass
-import click
-from icecream import ic
+from dataclasses import dataclass, fields
+from functools import cached_property
 import math
 import numpy as np
-import matplotlib.pyplot as plt
-import pprint
-
-ic.configureOutput(prefix='', outputFunction=print)
-p_print = pprint.PrettyPrinter(indent=2).pprint
+import rock7_datetimes
 
 """
 A bit of nomenclature:
@@ -25,12 +22,6 @@ A bit of nomenclature:
 - a message is then composed of 3 parts: kind (which kind of data is in the message), metadata, and list of packets
 """
 
-#--------------------------------------------------------------------------------
-# make sure we are all UTC
-
-os.environ["TZ"] = "UTC"
-time.tzset()
-
 #--------------------------------------------------------------------------------
 # a few module constants
 
@@ -40,6 +31,9 @@ _BD_VERSION_NBR = "2.1"
 # derived properties of the GNSS packets
 # 14; 1 byte start, posix, 2 longs, 1 byte end
 _BD_GNSS_PACKET_LENGTH = 14
+# start byte 'F', posix, latitude, longitude, next byte ('F' or 'E')
+_BD_GNSS_PACKET_STRUCT = struct.Struct('<BlllB')
+assert _BD_GNSS_PACKET_STRUCT.size == _BD_GNSS_PACKET_LENGTH
 
 ####################
 # properties of the wave spectra packets with 2048 FFT_LEN
@@ -59,58 +53,139 @@ _BD_YWAVE_PACKET_LENGTH = \
 LENGTH_FROM_SERIAL_OUTPUT = 138
 assert _BD_YWAVE_PACKET_LENGTH == LENGTH_FROM_SERIAL_OUTPUT, "the arduino printout indicates that wave packets have length {}".format(LENGTH_FROM_SERIAL_OUTPUT)
 
+# start byte 'Y', posix, spectrum number, Hs, 1/Tz, 1/Tc, array max value, uint16 array, alignment, end byte 'E'
+_BD_YWAVE_PACKET_STRUCT = struct.Struct('<Bliffff{}H2xB'.format(_BD_YWAVE_NBR_BINS))
+assert _BD_YWAVE_PACKET_STRUCT.size == _BD_YWAVE_PACKET_LENGTH
+
+# the same layout, as a numpy structured dtype, for decoding many packets at once
+_BD_YWAVE_PACKET_DTYPE = np.dtype([
+    ("start_byte", "u1"),
+    ("posix_timestamp", "<i4"),
+    ("spectrum_number", "<i4"),
+    ("Hs", "<f4"),
+    ("inverse_Tz", "<f4"),
+    ("inverse_Tc", "<f4"),
+    ("_array_max_value", "<f4"),
+    ("_array_uint16", "<u2", (_BD_YWAVE_NBR_BINS,)),
+    ("alignment", "u1", (2,)),
+    ("end_byte", "u1"),
+])
+assert _BD_YWAVE_PACKET_DTYPE.itemsize == _BD_YWAVE_PACKET_LENGTH
+
+# frequency tables of the wave packets; these are the same for all packets
+_BD_YWAVE_FREQUENCIES = (_BD_YWAVE_PACKET_MIN_BIN + np.arange(_BD_YWAVE_NBR_BINS)) * _BD_YWAVE_PACKET_FRQ_RES
+_BD_YWAVE_LIST_FREQUENCIES = _BD_YWAVE_FREQUENCIES.tolist()
+_BD_YWAVE_OMEGA_4 = (2.0 * math.pi * _BD_YWAVE_FREQUENCIES)**4
+
+####################
+# reason codes of the batch validation of messages
+_BD_VALIDATION_OK = 0
+_BD_VALIDATION_NOT_HEX = 1
+_BD_VALIDATION_EMPTY = 2
+_BD_VALIDATION_UNKNOWN_KIND = 3
+_BD_VALIDATION_BAD_LENGTH = 4
+_BD_VALIDATION_BAD_FRAMING = 5
+
+_BD_VALIDATION_REASONS = {
+    _BD_VALIDATION_OK: "ok",
+    _BD_VALIDATION_NOT_HEX: "payload is not a valid hex string",
+    _BD_VALIDATION_EMPTY: "empty message",
+    _BD_VALIDATION_UNKNOWN_KIND: "unknown message kind",
+    _BD_VALIDATION_BAD_LENGTH: "message length does not fit a whole number of packets",
+    _BD_VALIDATION_BAD_FRAMING: "wrong start / end / separator byte",
+}
+
+####################
+# plausibility checks used when recovering packets from damaged messages
+_BD_RECOVERY_MIN_POSIX = 1577836800  # 2020-01-01, no instrument of this generation was running before that
+_BD_RECOVERY_MAX_ABS_LATITUDE = 90.0
+_BD_RECOVERY_MAX_ABS_LONGITUDE = 180.0
+_BD_RECOVERY_MAX_ABS_TEMPERATURE = 50.0
+
+####################
+# columns of the *_Batch classes that are not per packet, but shared by all packets of the batch
+_BD_BATCH_SHARED_COLUMNS = ["frequencies"]
+
 ####################
 # properties of the thermistors packets
 _BD_THERM_MSG_FIXED_LENGTH = 3  # start byte, byte metadata nbr packets, byte end
 _BD_THERM_MSG_NBR_THERMISTORS = 6
 _BD_THERM_PACKET_NBR_BYTES_PER_THERMISTOR = 3
 _BD_THERM_PACKET_LENGTH = 1 + 1*4 + _BD_THERM_PACKET_NBR_BYTES_PER_THERMISTOR * _BD_THERM_MSG_NBR_THERMISTORS * 1 + 6*1
+# start byte 'P', posix, the thermistors readings (skipped, these are bitfields), and the 6 attitude bytes
+_BD_THERM_PACKET_STRUCT = struct.Struct('<Bl{}x6b'.format(_BD_THERM_PACKET_NBR_BYTES_PER_THERMISTOR * _BD_THERM_MSG_NBR_THERMISTORS))
+assert _BD_THERM_PACKET_STRUCT.size == _BD_THERM_PACKET_LENGTH
 # these are from the params of the tracker
 _BD_THERM_ROLL_FLOAT_TO_INT8_FACTOR = 0.7
 _BD_THERM_PITCH_FLOAT_TO_INT8_FACTOR = 1.4
 # factor for converting bin 12 bits signed int to temperature; from thermistor datasheet
 _BD_THERM_12BITS_TO_FLOAT_TEMPERATURE_FACTOR = 1.0 / 16.0
+# the attitude bytes at the end of each thermistors packet, in order, and their int8 to float factor
+_BD_THERM_ATTITUDE_FIELDS = ["mean_pitch", "mean_roll", "min_pitch", "max_pitch", "min_roll", "max_roll"]
+_BD_THERM_ATTITUDE_FLOAT_TO_INT8_FACTORS = np.array([
+    _BD_THERM_PITCH_FLOAT_TO_INT8_FACTOR,
+    _BD_THERM_ROLL_FLOAT_TO_INT8_FACTOR,
+    _BD_THERM_PITCH_FLOAT_TO_INT8_FACTOR,
+    _BD_THERM_PITCH_FLOAT_TO_INT8_FACTOR,
+    _BD_THERM_ROLL_FLOAT_TO_INT8_FACTOR,
+    _BD_THERM_ROLL_FLOAT_TO_INT8_FACTOR,
+])
 
 #--------------------------------------------------------------------------------
 # misc
 
 
+def _debug_ic():
+    """icecream is only used for the debug prints, and is slow to import: import it only when needed."""
+    from icecream import ic
+    ic.configureOutput(prefix='', outputFunction=print)
+    return ic
+
+
 def get_version():
     return _BD_VERSION_NBR
 
 #--------------------------------------------------------------------------------
 # helper functions for unpacking binary data
+# these work in place on any buffer (bytes, memoryview, ...), at a given offset, without copying
+
+_BD_STRUCT_UINT8 = struct.Struct('B')
+_BD_STRUCT_INT8 = struct.Struct('b')
+_BD_STRUCT_LONG = struct.Struct('<l')
+_BD_STRUCT_INT = struct.Struct('<i')
+_BD_STRUCT_UNSIGNEDINT = struct.Struct('<I')
+_BD_STRUCT_FLOAT = struct.Struct('<f')
 
 
 def byte_to_char(crrt_byte):
     return(chr(crrt_byte))
 
 
-def one_byte_to_int(crrt_byte):
-    return(struct.unpack('B', bytes(crrt_byte))[0])
+def one_byte_to_int(crrt_byte, offset=0):
+    return(_BD_STRUCT_UINT8.unpack_from(crrt_byte, offset)[0])
 
 
-def one_byte_to_signed_int(crrt_byte):
-    return(struct.unpack('b', bytes(crrt_byte))[0])
+def one_byte_to_signed_int(crrt_byte, offset=0):
+    return(_BD_STRUCT_INT8.unpack_from(crrt_byte, offset)[0])
 
 
-def four_bytes_to_long(crrt_four_bytes):
-    res = struct.unpack('<l', bytes(crrt_four_bytes))
+def four_bytes_to_long(crrt_four_bytes, offset=0):
+    res = _BD_STRUCT_LONG.unpack_from(crrt_four_bytes, offset)
     return res[0]
 
 
-def four_bytes_to_int(crrt_four_bytes):
-    res = struct.unpack('<i', bytes(crrt_four_bytes))
+def four_bytes_to_int(crrt_four_bytes, offset=0):
+    res = _BD_STRUCT_INT.unpack_from(crrt_four_bytes, offset)
     return res[0]
 
 
-def four_bytes_to_unsignedint(crrt_four_bytes):
-    res = struct.unpack('<I', bytes(crrt_four_bytes))
+def four_bytes_to_unsignedint(crrt_four_bytes, offset=0):
+    res = _BD_STRUCT_UNSIGNEDINT.unpack_from(crrt_four_bytes, offset)
     return res[0]
 
 
-def four_bytes_to_float(crrt_four_bytes):
-    res = struct.unpack('<f', bytes(crrt_four_bytes))
+def four_bytes_to_float(crrt_four_bytes, offset=0):
+    res = _BD_STRUCT_FLOAT.unpack_from(crrt_four_bytes, offset)
     return res[0]
 
 #--------------------------------------------------------------------------------
@@ -136,8 +211,19 @@ class GNSS_Metadata:
     nbr_gnss_fixes: int
 
 
+@dataclass
+class GNSS_Batch:
+    """Many GNSS fixes decoded at once, stored as columns (one entry per fix)."""
+    message_index: np.ndarray
+    posix_timestamp: np.ndarray
+    latitude: np.ndarray
+    longitude: np.ndarray
+
+
 @dataclass
 class Waves_Packet:
+    """Only the raw fields are set at decoding; the spectra and the spectral moments are derived lazily,
+    the first time they are accessed, from the frequency tables shared by all packets."""
     datetime_fix: datetime.datetime
     spectrum_number: int
     Hs: float
@@ -145,19 +231,84 @@ class Waves_Packet:
     Tc: float
     _array_max_value: float
     _array_uint16: float
-    list_frequencies: list
-    list_acceleration_energies: list
-    frequency_resolution: float
-    list_elevation_energies: list
-    wave_spectral_moments: Spectral_Moments
     is_valid: bool
 
+    frequency_resolution = _BD_YWAVE_PACKET_FRQ_RES
+
+    @property
+    def list_frequencies(self):
+        return _BD_YWAVE_LIST_FREQUENCIES
+
+    @cached_property
+    def _acceleration_energies(self):
+        return np.array(self._array_uint16) * self._array_max_value / _BD_YWAVE_PACKET_SCALER
+
+    @cached_property
+    def _elevation_energies(self):
+        return self._acceleration_energies / _BD_YWAVE_OMEGA_4
+
+    @cached_property
+    def list_acceleration_energies(self):
+        return self._acceleration_energies.tolist()
+
+    @cached_property
+    def list_elevation_energies(self):
+        return self._elevation_energies.tolist()
+
+    @cached_property
+    def wave_spectral_moments(self):
+        return Spectral_Moments(
+            np.trapz(self._elevation_energies, _BD_YWAVE_FREQUENCIES),
+            np.trapz(_BD_YWAVE_FREQUENCIES**2 * self._elevation_energies, _BD_YWAVE_FREQUENCIES),
+            np.trapz(_BD_YWAVE_FREQUENCIES**4 * self._elevation_energies, _BD_YWAVE_FREQUENCIES),
+        )
+
+    def __getstate__(self):
+        # the derived fields are cheap to re-compute, do not bloat the pickles with them
+        return {crrt_key: crrt_value for (crrt_key, crrt_value) in self.__dict__.items() if crrt_key not in _WAVES_PACKET_DERIVED_FIELDS}
+
+
+_WAVES_PACKET_DERIVED_FIELDS = [
+    "_acceleration_energies",
+    "_elevation_energies",
+    "list_acceleration_energies",
+    "list_elevation_energies",
+    "wave_spectral_moments",
+    # these were stored on each packet by earlier versions of the decoder
+    "list_frequencies",
+    "frequency_resolution",
+]
+
 
 @dataclass
 class Waves_Metadata:
     None
 
 
+@dataclass
+class Waves_Batch:
+    """Many wave packets decoded at once, stored as columns (one entry / row per packet)."""
+    message_index: np.ndarray
+    posix_timestamp: np.ndarray
+    spectrum_number: np.ndarray
+    Hs: np.ndarray
+    Tz: np.ndarray
+    Tc: np.ndarray
+    _array_max_value: np.ndarray
+    _array_uint16: np.ndarray
+    frequencies: np.ndarray
+    elevation_energies: np.ndarray
+    is_valid: np.ndarray
+
+
+@dataclass
+class Validation_Batch:
+    """The result of validating many messages at once: one entry per message, with a reason code from _BD_VALIDATION_REASONS."""
+    is_valid: np.ndarray
+    reason: np.ndarray
+    kind: np.ndarray
+
+
 @dataclass
 class Thermistors_Reading:
     mean_temperature: float
@@ -182,17 +333,35 @@ class Thermistors_Metadata:
     nbr_thermistors_measurements: int
 
 
+@dataclass
+class Thermistors_Batch:
+    """Many thermistors packets decoded at once, stored as columns (one row per packet, one
+    column per thermistor, or per attitude field following _BD_THERM_ATTITUDE_FIELDS)."""
+    message_index: np.ndarray
+    posix_timestamp: np.ndarray
+    mean_temperature: np.ndarray
+    range_temperature: np.ndarray
+    probe_id: np.ndarray
+    attitude: np.ndarray
+
+
 # --------------------------------------------------------------------------------
 # packets and messages decoding
 
 
 def hex_to_bin_message(hex_string_message, print_info=False):
     if print_info:
+        ic = _debug_ic()
         ic(hex_string_message)
     bin_msg = binascii.unhexlify(hex_string_message)
     return bin_msg
 
 
+def payloads_to_bin_messages(payloads):
+    """Accept either hex strings (as in the Rock7 exports) or already binary messages."""
+    return [hex_to_bin_message(crrt_payload) if isinstance(crrt_payload, str) else bytes(crrt_payload) for crrt_payload in payloads]
+
+
 def message_kind(bin_msg):
     first_char = byte_to_char(bin_msg[0])
     valid_first_chars = ["G", "Y", "T"]
@@ -203,21 +372,19 @@ def message_kind(bin_msg):
 def decode_gnss_packet(bin_packet, print_decoded=False, print_debug_information=False):
     assert len(bin_packet) == _BD_GNSS_PACKET_LENGTH, "GNSS packets with start and end byte have 14 bytes, got {} bytes".format(len(bin_packet))
 
-    char_first_byte = byte_to_char(bin_packet[0])
+    (first_byte, posix_timestamp_fix, latitude_long, longitude_long, next_byte) = _BD_GNSS_PACKET_STRUCT.unpack_from(bin_packet)
+
+    char_first_byte = byte_to_char(first_byte)
 
     assert char_first_byte == 'F', "GNSS packets must start with a 'F', got {}".format(char_first_byte)
 
-    posix_timestamp_fix = four_bytes_to_long(bin_packet[1:5])
     datetime_fix = datetime.datetime.utcfromtimestamp(posix_timestamp_fix)
-
-    latitude_long = four_bytes_to_long(bin_packet[5:9])
     latitude = latitude_long / 1.0e7
-
-    longitude_long = four_bytes_to_long(bin_packet[9:13])
     longitude = longitude_long / 1.0e7
 
     if print_debug_information:
         print("------ START PRINT GNSS DEBUG INFO -----")
+        ic = _debug_ic()
         ic(posix_timestamp_fix)
         ic(datetime_fix)
         ic(latitude_long)
@@ -233,7 +400,7 @@ def decode_gnss_packet(bin_packet, print_decoded=False, print_debug_information=
         print("longitude {}, i.e. {}".format(longitude_long, longitude))
         print("--------------------------------------------------------------")
 
-    char_next_byte = byte_to_char(bin_packet[13])
+    char_next_byte = byte_to_char(next_byte)
 
     assert char_next_byte == 'E' or char_next_byte == 'F', "either end ('E') or fix ('F') expected at the end, got {}".format(char_next_byte)
 
@@ -252,12 +419,13 @@ def decode_gnss_message(bin_msg, print_decoded=True, print_debug_information=Fal
         print("----------------------- START DECODE GNSS MESSAGE -----------------------")
 
     assert message_kind(bin_msg) == 'G'
+    view_msg = memoryview(bin_msg)
     expected_message_length = int(1 + (len(bin_msg) - 2 - _BD_GNSS_PACKET_LENGTH) / (_BD_GNSS_PACKET_LENGTH - 1))
 
     if print_decoded:
         print("expected number of packets based on message length: {}".format(expected_message_length))
 
-    nbr_gnss_fixes = one_byte_to_int(bin_msg[1: 2])
+    nbr_gnss_fixes = one_byte_to_int(view_msg, 1)
     message_metadata = GNSS_Metadata(nbr_gnss_fixes=nbr_gnss_fixes)
 
     if print_decoded:
@@ -270,7 +438,7 @@ def decode_gnss_message(bin_msg, print_decoded=True, print_debug_information=Fal
         crrt_byte_start = byte_to_char(bin_msg[crrt_packet_start])
         assert crrt_byte_start == "F"
 
-        crrt_decoded_packet = decode_gnss_packet(bin_msg[crrt_packet_start: crrt_packet_start+_BD_GNSS_PACKET_LENGTH], print_decoded=print_decoded, print_debug_information=print_debug_information)
+        crrt_decoded_packet = decode_gnss_packet(view_msg[crrt_packet_start: crrt_packet_start+_BD_GNSS_PACKET_LENGTH], print_decoded=print_decoded, print_debug_information=print_debug_information)
         list_decoded_packets.append(crrt_decoded_packet)
 
         trailing_char = byte_to_char(bin_msg[crrt_packet_start + _BD_GNSS_PACKET_LENGTH - 1])
@@ -288,41 +456,75 @@ def decode_gnss_message(bin_msg, print_decoded=True, print_debug_information=Fal
     return message_metadata, list_decoded_packets
 
 
-def decode_ywave_packet(bin_packet, print_decoded=False, print_debug_information=False):
-    assert len(bin_packet) == _BD_YWAVE_PACKET_LENGTH
+def locate_packets_batch(array_msg_lengths, array_nbr_packets, packet_stride):
+    """For messages joined one after the other in a single buffer, find the start of each message, and the
+    start of each packet (the first packet of a message comes after the kind byte and the metadata byte).
+    Returns the message starts, and, for each packet, its message index, rank in the message, and start."""
+    array_msg_starts = np.cumsum(array_msg_lengths) - array_msg_lengths
 
-    char_first_byte = byte_to_char(bin_packet[0])
-    assert char_first_byte == "Y"
+    message_index = np.repeat(np.arange(array_msg_lengths.shape[0]), array_nbr_packets)
+    array_first_packet = np.cumsum(array_nbr_packets) - array_nbr_packets
+    array_packet_rank = np.arange(message_index.shape[0]) - array_first_packet[message_index]
+    array_packet_starts = array_msg_starts[message_index] + 2 + array_packet_rank * packet_stride
 
-    char_last_byte = byte_to_char(bin_packet[-1])
-    assert char_last_byte == "E"
+    return array_msg_starts, message_index, array_packet_rank, array_packet_starts
 
-    crrt_start_data_field = 1
 
-    posix_timestamp = four_bytes_to_long(bin_packet[crrt_start_data_field: crrt_start_data_field+4])
-    crrt_start_data_field += 4
-    datetime_packet = datetime.datetime.utcfromtimestamp(posix_timestamp)
+def decode_gnss_batch(payloads):
+    """Decode many 'G' messages at once. The packets in a 'G' message overlap by one byte (the end
+    byte of a packet is the start byte of the next one), so the packet offsets follow from the
+    message lengths only; all (posix, lat_e7, lon_e7) triplets are then gathered in one go."""
+    list_bin_msgs = payloads_to_bin_messages(payloads)
+
+    array_msg_lengths = np.array([len(crrt_bin_msg) for crrt_bin_msg in list_bin_msgs], dtype=np.int64)
+    array_nbr_packets = (array_msg_lengths - 3) // (_BD_GNSS_PACKET_LENGTH - 1)
+    assert np.all(array_nbr_packets * (_BD_GNSS_PACKET_LENGTH - 1) + 3 == array_msg_lengths), "G messages must contain a whole number of packets"
+    assert np.all(array_nbr_packets > 0)
+
+    array_bytes = np.frombuffer(b"".join(list_bin_msgs), dtype=np.uint8)
+    (array_msg_starts, message_index, array_packet_rank, array_packet_starts) = \
+        locate_packets_batch(array_msg_lengths, array_nbr_packets, _BD_GNSS_PACKET_LENGTH - 1)
+    assert np.all(array_bytes[array_msg_starts] == ord("G"))
 
-    spectrum_number = four_bytes_to_int(bin_packet[crrt_start_data_field: crrt_start_data_field+4])
-    crrt_start_data_field += 4
+    # framing: each packet starts with 'F', and is followed by either 'F' or, for the last one, 'E'
+    array_trailing_bytes = array_bytes[array_packet_starts + _BD_GNSS_PACKET_LENGTH - 1]
+    array_is_last_packet = array_packet_rank == array_nbr_packets[message_index] - 1
+    assert np.all(array_bytes[array_packet_starts] == ord("F"))
+    assert np.all(array_trailing_bytes == np.where(array_is_last_packet, ord("E"), ord("F")))
 
-    Hs = four_bytes_to_float(bin_packet[crrt_start_data_field: crrt_start_data_field+4])
-    crrt_start_data_field += 4
+    return unpack_gnss_packets_batch(array_bytes, array_packet_starts, message_index)
 
-    Tz = 1.0 / four_bytes_to_float(bin_packet[crrt_start_data_field: crrt_start_data_field+4])
-    crrt_start_data_field += 4
 
-    Tc = 1.0 / four_bytes_to_float(bin_packet[crrt_start_data_field: crrt_start_data_field+4])
-    crrt_start_data_field += 4
+def unpack_gnss_packets_batch(array_bytes, array_packet_starts, message_index):
+    """Gather the (posix, lat_e7, lon_e7) fields of the GNSS packets starting at array_packet_starts in array_bytes."""
+    array_fields = array_bytes[array_packet_starts[:, np.newaxis] + np.arange(1, 13)].view("<i4")
 
-    _array_max_value = four_bytes_to_float(bin_packet[crrt_start_data_field: crrt_start_data_field+4])
-    crrt_start_data_field += 4
+    decoded_batch = GNSS_Batch(
+        message_index=message_index,
+        posix_timestamp=array_fields[:, 0].astype(np.int64),
+        latitude=array_fields[:, 1] / 1.0e7,
+        longitude=array_fields[:, 2] / 1.0e7,
+    )
+
+    return decoded_batch
+
+
+def decode_ywave_packet(bin_packet, print_decoded=False, print_debug_information=False):
+    assert len(bin_packet) == _BD_YWAVE_PACKET_LENGTH
 
-    nbr_bytes_uint16_array = _BD_YWAVE_NBR_BINS * 2
-    _array_uint16 = struct.unpack('<' + _BD_YWAVE_NBR_BINS * "H", bin_packet[crrt_start_data_field: crrt_start_data_field+nbr_bytes_uint16_array])
-    crrt_start_data_field += nbr_bytes_uint16_array
+    list_fields = _BD_YWAVE_PACKET_STRUCT.unpack_from(bin_packet)
 
-    assert crrt_start_data_field+1+2 == _BD_YWAVE_PACKET_LENGTH  # the +2 is due to struct alignment issues
+    char_first_byte = byte_to_char(list_fields[0])
+    assert char_first_byte == "Y"
+
+    char_last_byte = byte_to_char(list_fields[-1])
+    assert char_last_byte == "E"
+
+    (posix_timestamp, spectrum_number, Hs, inverse_Tz, inverse_Tc, _array_max_value) = list_fields[1:7]
+    datetime_packet = datetime.datetime.utcfromtimestamp(posix_timestamp)
+    Tz = 1.0 / inverse_Tz
+    Tc = 1.0 / inverse_Tc
+    _array_uint16 = list_fields[7:-1]
 
     if Hs > 1e-5:
         is_valid = True
@@ -332,6 +534,7 @@ def decode_ywave_packet(bin_packet, print_decoded=False, print_debug_information
 
     if print_debug_information:
         print("----- YWAVE START DEBUG INFORMATION -----")
+        ic = _debug_ic()
         ic(posix_timestamp)
         ic(spectrum_number)
         ic(Hs)
@@ -342,36 +545,6 @@ def decode_ywave_packet(bin_packet, print_decoded=False, print_debug_information
         ic(is_valid)
         print("----- YWAVE END DEBUG INFORMATION -----")
 
-    list_frequencies = []
-    list_acceleration_energies = []
-
-    for ind, crrt_uint16 in enumerate(_array_uint16):
-        list_frequencies.append((_BD_YWAVE_PACKET_MIN_BIN + ind) * _BD_YWAVE_PACKET_FRQ_RES)
-        list_acceleration_energies.append(crrt_uint16 * _array_max_value / _BD_YWAVE_PACKET_SCALER)
-
-    list_omega = [2.0 * math.pi * crrt_freq for crrt_freq in list_frequencies]
-    list_omega_4 = [math.pow(crrt_omega, 4) for crrt_omega in list_omega]
-    list_elevation_energies = [crrt_acceleration_energy / crrt_omega_4 for (crrt_acceleration_energy, crrt_omega_4) in zip(list_acceleration_energies, list_omega_4)]
-
-    def compute_spectral_moment(list_frequencies, list_elevation_energies, order):
-        list_to_integrate = [
-            math.pow(crrt_freq, order) * crrt_energy for (crrt_freq, crrt_energy) in zip(list_frequencies, list_elevation_energies)
-        ]
-
-        moment = np.trapz(list_to_integrate, list_frequencies)
-
-        return moment
-
-    m0 = compute_spectral_moment(list_frequencies, list_elevation_energies, 0)
-    m2 = compute_spectral_moment(list_frequencies, list_elevation_energies, 2)
-    m4 = compute_spectral_moment(list_frequencies, list_elevation_energies, 4)
-
-    spectral_moments = Spectral_Moments(
-        m0,
-        m2,
-        m4
-    )
-
     decoded_packet = Waves_Packet(
         datetime_packet,
         spectrum_number,
@@ -380,16 +553,12 @@ def decode_ywave_packet(bin_packet, print_decoded=False, print_debug_information
         Tc,
         _array_max_value,
         _array_uint16,
-        list_frequencies,
-        list_acceleration_energies,
-        _BD_YWAVE_PACKET_FRQ_RES,
-        list_elevation_energies,
-        spectral_moments,
         is_valid
     )
 
     if print_decoded:
         print("----- YWAVE START PRINT DECODED -----")
+        ic = _debug_ic()
         ic(datetime_packet)
         ic(spectrum_number)
         ic(is_valid)
@@ -397,11 +566,14 @@ def decode_ywave_packet(bin_packet, print_decoded=False, print_debug_information
         ic(Tz)
         ic(Tc)
         print("acceleration energy spectrum:")
-        for freq, energy in zip(list_frequencies, list_acceleration_energies):
+        for freq, energy in zip(decoded_packet.list_frequencies, decoded_packet.list_acceleration_energies):
             print("  acceleration spectrum energy at {:.8f} Hz : {:16.8f}".format(freq, energy))
         print("----- YWAVE END PRINT DECODED -----")
 
         print("----- YWAVE START PRINT DERIVED -----")
+        m0 = decoded_packet.wave_spectral_moments.m0
+        m2 = decoded_packet.wave_spectral_moments.m2
+        m4 = decoded_packet.wave_spectral_moments.m4
         ic(m0)
         ic(m2)
         ic(m4)
@@ -409,7 +581,7 @@ def decode_ywave_packet(bin_packet, print_decoded=False, print_debug_information
         ic(math.sqrt(m2 / m0))
         ic(math.sqrt(m4 / m2))
         print("elevation energy spectrum:")
-        for freq, energy in zip(list_frequencies, list_elevation_energies):
+        for freq, energy in zip(decoded_packet.list_frequencies, decoded_packet.list_elevation_energies):
             print("  elevation spectrum energy at {:.8f} Hz : {:16.8f}".format(freq, energy))
         if not is_valid:
             print("*** CAUTIOUS: THIS IS INVALID PACKET!!! ***")
@@ -437,6 +609,70 @@ def decode_ywave_message(bin_msg, print_decoded=True, print_debug_information=Fa
     return message_metadata, list_decoded_packets
 
 
+def decode_ywave_batch(payloads):
+    """Decode many 'Y' messages at once. Each 'Y' message contains exactly one wave packet,
+    so the whole batch can be read through a single np.frombuffer over the packet dtype.
+    The result has one entry per payload, and an (N, _BD_YWAVE_NBR_BINS) elevation spectrum matrix."""
+    list_bin_msgs = payloads_to_bin_messages(payloads)
+
+    for crrt_bin_msg in list_bin_msgs:
+        assert len(crrt_bin_msg) == _BD_YWAVE_PACKET_LENGTH, "Y messages have {} bytes, got {} bytes".format(_BD_YWAVE_PACKET_LENGTH, len(crrt_bin_msg))
+
+    array_packets = np.frombuffer(b"".join(list_bin_msgs), dtype=_BD_YWAVE_PACKET_DTYPE)
+
+    assert np.all(array_packets["start_byte"] == ord("Y"))
+    assert np.all(array_packets["end_byte"] == ord("E"))
+
+    Hs = array_packets["Hs"].astype(np.float64)
+    _array_max_value = array_packets["_array_max_value"].astype(np.float64)
+
+    acceleration_energies = array_packets["_array_uint16"] * (_array_max_value / _BD_YWAVE_PACKET_SCALER)[:, np.newaxis]
+    elevation_energies = acceleration_energies / _BD_YWAVE_OMEGA_4
+
+    with np.errstate(divide="ignore"):
+        Tz = 1.0 / array_packets["inverse_Tz"].astype(np.float64)
+        Tc = 1.0 / array_packets["inverse_Tc"].astype(np.float64)
+
+    decoded_batch = Waves_Batch(
+        message_index=np.arange(array_packets.shape[0]),
+        posix_timestamp=array_packets["posix_timestamp"].astype(np.int64),
+        spectrum_number=array_packets["spectrum_number"].astype(np.int64),
+        Hs=Hs,
+        Tz=Tz,
+        Tc=Tc,
+        _array_max_value=_array_max_value,
+        _array_uint16=array_packets["_array_uint16"],
+        frequencies=_BD_YWAVE_FREQUENCIES,
+        elevation_energies=elevation_energies,
+        is_valid=Hs > 1e-5,
+    )
+
+    return decoded_batch
+
+
+def select_batch_entries(batch, selector):
+    """Select entries (with a boolean mask or an array of indices) in any of the *_Batch columnar
+    classes. Columns that are shared by all entries (for example the frequencies) are kept as is."""
+    dict_columns = {}
+    for crrt_field in fields(batch):
+        crrt_column = getattr(batch, crrt_field.name)
+        if crrt_field.name in _BD_BATCH_SHARED_COLUMNS:
+            dict_columns[crrt_field.name] = crrt_column
+        else:
+            dict_columns[crrt_field.name] = crrt_column[selector]
+    return type(batch)(**dict_columns)
+
+
+def split_batch_by_device(batch, list_devices):
+    """Split a batch decoded from a list of payloads into one batch per device. list_devices
+    gives the device of each payload, in the same order as the payloads given to the decoder."""
+    array_devices = np.asarray(list_devices)[batch.message_index]
+    dict_batches = {}
+    for crrt_device in dict.fromkeys(list_devices):
+        dict_batches[crrt_device] = select_batch_entries(batch, array_devices == crrt_device)
+    return dict_batches
+
+
 def decode_thermistor_reading(crrt_thermistor_bin, print_debug_information=False):
 
     # quite a bit of tweaking...
@@ -444,21 +680,22 @@ def decode_thermistor_reading(crrt_thermistor_bin, print_debug_information=False
 
     # TODO: actually, this can be made with clear syntax a la n & 0xffffffff too, fixme
 
-    id_6_bits = one_byte_to_int(crrt_thermistor_bin[0: 1]) // 4
+    id_6_bits = one_byte_to_int(crrt_thermistor_bin, 0) // 4
 
-    reading_2_higher_bits = one_byte_to_int(crrt_thermistor_bin[0: 1]) % 4
+    reading_2_higher_bits = one_byte_to_int(crrt_thermistor_bin, 0) % 4
     reading_2_higher_bits_lower = reading_2_higher_bits % 2
     reading_2_higher_bits_higher = (reading_2_higher_bits - reading_2_higher_bits_lower) // 2
-    reading_8_middle_bits = one_byte_to_int(crrt_thermistor_bin[1: 2])
-    reading_2_lower_bits = one_byte_to_int(crrt_thermistor_bin[2: 3]) // 64
+    reading_8_middle_bits = one_byte_to_int(crrt_thermistor_bin, 1)
+    reading_2_lower_bits = one_byte_to_int(crrt_thermistor_bin, 2) // 64
 
     reading_reconstructed_bin = reading_2_lower_bits + (2**2) * reading_8_middle_bits + (2**10) * reading_2_higher_bits_lower
     if reading_2_higher_bits_higher:
         reading_reconstructed_bin = reading_reconstructed_bin - 2**11 - 1
 
-    range_6_bits_bin = one_byte_to_int(crrt_thermistor_bin[2:3]) % 64
+    range_6_bits_bin = one_byte_to_int(crrt_thermistor_bin, 2) % 64
 
     if print_debug_information:
+        ic = _debug_ic()
         ic(id_6_bits)
 
         ic(reading_2_higher_bits)
@@ -483,12 +720,14 @@ def decode_thermistor_reading(crrt_thermistor_bin, print_debug_information=False
 
 
 def print_thermistor_reading(crrt_thermistor_reading):
+    ic = _debug_ic()
     ic(crrt_thermistor_reading.probe_id)
     ic(crrt_thermistor_reading.mean_temperature)
     ic(crrt_thermistor_reading.range_temperature)
 
 
 def print_thermistor_packet(crrt_thermistor_packet):
+    ic = _debug_ic()
     ic(crrt_thermistor_packet.datetime_packet)
     ic(crrt_thermistor_packet.mean_pitch)
     ic(crrt_thermistor_packet.min_pitch)
@@ -508,45 +747,28 @@ def decode_thermistors_packet(bin_packet, print_decoded=False, print_debug_infor
 
     assert len(bin_packet) == _BD_THERM_PACKET_LENGTH
 
-    char_first_byte = byte_to_char(bin_packet[0])
-    assert char_first_byte == "P"
+    (first_byte, posix_timestamp, mean_pitch_bin, mean_roll_bin, min_pitch_bin, max_pitch_bin, min_roll_bin, max_roll_bin) = \
+        _BD_THERM_PACKET_STRUCT.unpack_from(bin_packet)
 
-    crrt_start_field = 1
+    char_first_byte = byte_to_char(first_byte)
+    assert char_first_byte == "P"
 
-    posix_timestamp = four_bytes_to_long(bin_packet[crrt_start_field: crrt_start_field+4])
     datetime_packet = datetime.datetime.utcfromtimestamp(posix_timestamp)
-    crrt_start_field += 4
+
+    view_packet = memoryview(bin_packet)
+    crrt_start_field = 5
 
     list_thermistors_readings = []
 
     for crrt_thermistor in range(_BD_THERM_MSG_NBR_THERMISTORS):
-        crrt_thermistor_bin = bin_packet[crrt_start_field: crrt_start_field+3]
-        crrt_start_field += 3
+        crrt_thermistor_bin = view_packet[crrt_start_field: crrt_start_field+_BD_THERM_PACKET_NBR_BYTES_PER_THERMISTOR]
+        crrt_start_field += _BD_THERM_PACKET_NBR_BYTES_PER_THERMISTOR
         crrt_thermistor_reading = decode_thermistor_reading(crrt_thermistor_bin, print_debug_information=print_debug_information)
         assert isinstance(crrt_thermistor_reading, Thermistors_Reading)
         list_thermistors_readings.append(crrt_thermistor_reading)
 
-    mean_pitch_bin = one_byte_to_signed_int(bin_packet[crrt_start_field: crrt_start_field+1])
-    crrt_start_field += 1
-
-    mean_roll_bin = one_byte_to_signed_int(bin_packet[crrt_start_field: crrt_start_field+1])
-    crrt_start_field += 1
-
-    min_pitch_bin = one_byte_to_signed_int(bin_packet[crrt_start_field: crrt_start_field+1])
-    crrt_start_field += 1
-
-    max_pitch_bin = one_byte_to_signed_int(bin_packet[crrt_start_field: crrt_start_field+1])
-    crrt_start_field += 1
-
-    min_roll_bin = one_byte_to_signed_int(bin_packet[crrt_start_field: crrt_start_field+1])
-    crrt_start_field += 1
-
-    max_roll_bin = one_byte_to_signed_int(bin_packet[crrt_start_field: crrt_start_field+1])
-    crrt_start_field += 1
-
-    assert crrt_start_field == _BD_THERM_PACKET_LENGTH
-
     if print_debug_information:
+        ic = _debug_ic()
         ic(mean_pitch_bin)
         ic(mean_roll_bin)
         ic(min_pitch_bin)
@@ -580,6 +802,7 @@ def decode_thermistors_message(bin_msg, print_decoded=False, print_debug_informa
 
     assert message_kind(bin_msg) == "T"
     assert byte_to_char(bin_msg[-1]) == "E"
+    view_msg = memoryview(bin_msg)
 
     if (print_debug_information):
         print("received message of length: {}".format(len(bin_msg)))
@@ -587,7 +810,7 @@ def decode_thermistors_message(bin_msg, print_decoded=False, print_debug_informa
     expected_message_length = int( (len(bin_msg) - _BD_THERM_MSG_FIXED_LENGTH) / _BD_THERM_PACKET_LENGTH )
     assert expected_message_length * _BD_THERM_PACKET_LENGTH + _BD_THERM_MSG_FIXED_LENGTH == len(bin_msg)
 
-    nbr_thermistors_measurements = one_byte_to_int(bin_msg[1: 2])
+    nbr_thermistors_measurements = one_byte_to_int(view_msg, 1)
     message_metadata = Thermistors_Metadata(nbr_thermistors_measurements=nbr_thermistors_measurements)
 
     if print_decoded:
@@ -604,7 +827,7 @@ def decode_thermistors_message(bin_msg, print_decoded=False, print_debug_informa
         assert crrt_byte_start == "P"
 
         # decode
-        crrt_decoded_packet = decode_thermistors_packet(bin_msg[crrt_packet_start: crrt_packet_start+_BD_THERM_PACKET_LENGTH], print_decoded=print_decoded, print_debug_information=print_debug_information)
+        crrt_decoded_packet = decode_thermistors_packet(view_msg[crrt_packet_start: crrt_packet_start+_BD_THERM_PACKET_LENGTH], print_decoded=print_decoded, print_debug_information=print_debug_information)
         list_decoded_packets.append(crrt_decoded_packet)
 
         trailing_char = byte_to_char(bin_msg[crrt_packet_start + _BD_THERM_PACKET_LENGTH])
@@ -625,6 +848,224 @@ def decode_thermistors_message(bin_msg, print_decoded=False, print_debug_informa
     return message_metadata, list_decoded_packets
 
 
+def decode_thermistors_batch(payloads):
+    """Decode many 'T' messages at once. All packets of all messages are gathered into an (N, 6, 3)
+    uint8 view of the thermistor readings, and the bitfields are unpacked with numpy bitwise
+    operations; this is the vectorized counterpart of decode_thermistor_reading."""
+    list_bin_msgs = payloads_to_bin_messages(payloads)
+
+    array_msg_lengths = np.array([len(crrt_bin_msg) for crrt_bin_msg in list_bin_msgs], dtype=np.int64)
+    array_nbr_packets = (array_msg_lengths - _BD_THERM_MSG_FIXED_LENGTH) // _BD_THERM_PACKET_LENGTH
+    assert np.all(array_nbr_packets * _BD_THERM_PACKET_LENGTH + _BD_THERM_MSG_FIXED_LENGTH == array_msg_lengths), "T messages must contain a whole number of packets"
+
+    array_bytes = np.frombuffer(b"".join(list_bin_msgs), dtype=np.uint8)
+    (array_msg_starts, message_index, _, array_packet_starts) = \
+        locate_packets_batch(array_msg_lengths, array_nbr_packets, _BD_THERM_PACKET_LENGTH)
+    assert np.all(array_bytes[array_msg_starts] == ord("T"))
+    assert np.all(array_bytes[array_msg_starts + array_msg_lengths - 1] == ord("E"))
+
+    assert np.all(array_bytes[array_packet_starts] == ord("P"))
+
+    return unpack_thermistors_packets_batch(array_bytes, array_packet_starts, message_index)
+
+
+def unpack_thermistors_packets_batch(array_bytes, array_packet_starts, message_index):
+    """Gather the thermistors packets starting at array_packet_starts in array_bytes, and unpack their bitfields."""
+    array_packets = array_bytes[array_packet_starts[:, np.newaxis] + np.arange(_BD_THERM_PACKET_LENGTH)]
+
+    posix_timestamp = array_packets[:, 1:5].copy().view("<i4")[:, 0].astype(np.int64)
+
+    nbr_bytes_readings = _BD_THERM_MSG_NBR_THERMISTORS * _BD_THERM_PACKET_NBR_BYTES_PER_THERMISTOR
+    array_readings = array_packets[:, 5:5+nbr_bytes_readings].reshape(-1, _BD_THERM_MSG_NBR_THERMISTORS, _BD_THERM_PACKET_NBR_BYTES_PER_THERMISTOR).astype(np.int64)
+
+    # same bit layout and reconstruction as in decode_thermistor_reading
+    probe_id = array_readings[:, :, 0] >> 2
+    reading_bit_10 = array_readings[:, :, 0] & 0b01
+    reading_bit_11 = (array_readings[:, :, 0] >> 1) & 0b01
+    reading_reconstructed_bin = (array_readings[:, :, 2] >> 6) + (array_readings[:, :, 1] << 2) + (reading_bit_10 << 10)
+    reading_reconstructed_bin -= reading_bit_11 * (2**11 + 1)
+    range_6_bits_bin = array_readings[:, :, 2] & 0b111111
+
+    array_attitude_bin = array_packets[:, 5+nbr_bytes_readings:].view(np.int8)
+    assert array_attitude_bin.shape[1] == len(_BD_THERM_ATTITUDE_FIELDS)
+
+    decoded_batch = Thermistors_Batch(
+        message_index=message_index,
+        posix_timestamp=posix_timestamp,
+        mean_temperature=reading_reconstructed_bin * _BD_THERM_12BITS_TO_FLOAT_TEMPERATURE_FACTOR,
+        range_temperature=range_6_bits_bin * _BD_THERM_12BITS_TO_FLOAT_TEMPERATURE_FACTOR,
+        probe_id=probe_id,
+        attitude=array_attitude_bin / _BD_THERM_ATTITUDE_FLOAT_TO_INT8_FACTORS,
+    )
+
+    return decoded_batch
+
+
+def validate_messages_batch(payloads):
+    """Check the framing and length invariants of many messages at once, without raising: a message that
+    passes the checks can be given to the decoders (either per message or batch) without triggering an assert.
+    The reason code of each message says why it is not valid, see _BD_VALIDATION_REASONS."""
+    list_bin_msgs = []
+    array_reason = np.full((len(payloads),), _BD_VALIDATION_OK, dtype=np.int8)
+
+    for crrt_index, crrt_payload in enumerate(payloads):
+        try:
+            list_bin_msgs.append(payloads_to_bin_messages([crrt_payload])[0])
+        except (binascii.Error, ValueError, TypeError):
+            list_bin_msgs.append(b"")
+            array_reason[crrt_index] = _BD_VALIDATION_NOT_HEX
+
+    array_msg_lengths = np.array([len(crrt_bin_msg) for crrt_bin_msg in list_bin_msgs], dtype=np.int64)
+    array_reason[(array_msg_lengths == 0) & (array_reason == _BD_VALIDATION_OK)] = _BD_VALIDATION_EMPTY
+
+    # pad with one byte so that first / last bytes can be read even for empty messages
+    array_bytes = np.frombuffer(b"".join(list_bin_msgs) + b"\0", dtype=np.uint8)
+    array_msg_starts = np.cumsum(array_msg_lengths) - array_msg_lengths
+    array_first_bytes = np.where(array_msg_lengths > 0, array_bytes[array_msg_starts], 0)
+    array_last_bytes = array_bytes[np.maximum(array_msg_starts + array_msg_lengths - 1, 0)]
+
+    def set_reason(array_mask, reason):
+        array_reason[array_mask & (array_reason == _BD_VALIDATION_OK)] = reason
+
+    array_is_gnss = array_first_bytes == ord("G")
+    array_is_ywave = array_first_bytes == ord("Y")
+    array_is_therm = array_first_bytes == ord("T")
+    set_reason(~(array_is_gnss | array_is_ywave | array_is_therm), _BD_VALIDATION_UNKNOWN_KIND)
+
+    # Y: a single packet of fixed length, ending with 'E'
+    set_reason(array_is_ywave & (array_msg_lengths != _BD_YWAVE_PACKET_LENGTH), _BD_VALIDATION_BAD_LENGTH)
+    set_reason(array_is_ywave & (array_last_bytes != ord("E")), _BD_VALIDATION_BAD_FRAMING)
+
+    # G and T: a whole number of packets, each packet starting with the right byte, and the message ending with 'E'
+    for (array_is_kind, packet_stride, packet_start_char) in [
+        (array_is_gnss, _BD_GNSS_PACKET_LENGTH - 1, "F"),
+        (array_is_therm, _BD_THERM_PACKET_LENGTH, "P"),
+    ]:
+        array_nbr_packets = (array_msg_lengths - 3) // packet_stride
+        set_reason(array_is_kind & ((array_nbr_packets < 1) | (array_nbr_packets * packet_stride + 3 != array_msg_lengths)), _BD_VALIDATION_BAD_LENGTH)
+        set_reason(array_is_kind & (array_last_bytes != ord("E")), _BD_VALIDATION_BAD_FRAMING)
+
+        array_nbr_packets[~(array_is_kind & (array_reason == _BD_VALIDATION_OK))] = 0
+        (_, message_index, _, array_packet_starts) = locate_packets_batch(array_msg_lengths, array_nbr_packets, packet_stride)
+        array_bad_packet_start = array_bytes[array_packet_starts] != ord(packet_start_char)
+        set_reason(np.bincount(message_index[array_bad_packet_start], minlength=len(list_bin_msgs)) > 0, _BD_VALIDATION_BAD_FRAMING)
+
+    validation_batch = Validation_Batch(
+        is_valid=array_reason == _BD_VALIDATION_OK,
+        reason=array_reason,
+        kind=np.array([chr(crrt_byte) for crrt_byte in array_first_bytes.tolist()], dtype="U1"),
+    )
+
+    return validation_batch
+
+
+def recover_packets_batch(payloads, kind, min_posix=_BD_RECOVERY_MIN_POSIX, max_posix=None):
+    """Salvage the intact packets of damaged 'G' or 'T' messages (truncated, or with corrupted bytes), that
+    the decoders would reject as a whole. All the packet start markers ('F' or 'P') are found at once in the
+    joined messages, and each candidate packet is kept only if it fits in its message, passes plausibility
+    checks (timestamp in [min_posix, max_posix], position or temperatures / attitude in range), and does
+    not overlap an earlier accepted packet of the same message. min_posix and max_posix can be scalars, or
+    one value per message (for example, the deployment start and the Rock7 reception time). Returns a
+    GNSS_Batch or a Thermistors_Batch, the message_index telling from which message each packet was recovered."""
+    assert kind in ["G", "T"], "can only recover packets from G or T messages, got {}".format(kind)
+
+    if max_posix is None:
+        max_posix = int(time.time())
+
+    list_bin_msgs = payloads_to_bin_messages(payloads)
+    array_msg_lengths = np.array([len(crrt_bin_msg) for crrt_bin_msg in list_bin_msgs], dtype=np.int64)
+    array_msg_starts = np.cumsum(array_msg_lengths) - array_msg_lengths
+    array_min_posix = np.broadcast_to(np.asarray(min_posix, dtype=np.int64), array_msg_lengths.shape)
+    array_max_posix = np.broadcast_to(np.asarray(max_posix, dtype=np.int64), array_msg_lengths.shape)
+
+    if kind == "G":
+        packet_start_char = "F"
+        packet_length = _BD_GNSS_PACKET_LENGTH - 1  # the trailing byte is the start of the next packet, and may be lost
+        unpack_packets_batch = unpack_gnss_packets_batch
+    else:
+        packet_start_char = "P"
+        packet_length = _BD_THERM_PACKET_LENGTH
+        unpack_packets_batch = unpack_thermistors_packets_batch
+
+    # pad so that the candidates at the end of the buffer can be gathered; these do not fit their message and are dropped anyway
+    array_bytes = np.frombuffer(b"".join(list_bin_msgs) + bytes(_BD_THERM_PACKET_LENGTH), dtype=np.uint8)
+
+    # candidate packets: any start marker after the kind and metadata bytes (the metadata byte can itself
+    # be an 'F' or a 'P'), with a whole packet left before the end of the message
+    array_candidates = np.flatnonzero(array_bytes[:int(array_msg_lengths.sum())] == ord(packet_start_char))
+    message_index = np.searchsorted(array_msg_starts, array_candidates, side="right") - 1
+    array_fits = (array_candidates >= array_msg_starts[message_index] + 2) & \
+        (array_candidates + packet_length <= array_msg_starts[message_index] + array_msg_lengths[message_index])
+    array_candidates = array_candidates[array_fits]
+    message_index = message_index[array_fits]
+
+    candidates_batch = unpack_packets_batch(array_bytes, array_candidates, message_index)
+
+    array_is_plausible = (candidates_batch.posix_timestamp >= array_min_posix[message_index]) & \
+        (candidates_batch.posix_timestamp <= array_max_posix[message_index])
+
+    if kind == "G":
+        array_is_plausible &= (np.abs(candidates_batch.latitude) <= _BD_RECOVERY_MAX_ABS_LATITUDE)
+        array_is_plausible &= (np.abs(candidates_batch.longitude) <= _BD_RECOVERY_MAX_ABS_LONGITUDE)
+    else:
+        array_is_plausible &= np.all(np.abs(candidates_batch.mean_temperature) <= _BD_RECOVERY_MAX_ABS_TEMPERATURE, axis=1)
+        # the min / max of the pitch and roll must bracket their mean
+        dict_attitude = {crrt_field: candidates_batch.attitude[:, crrt_index] for (crrt_index, crrt_field) in enumerate(_BD_THERM_ATTITUDE_FIELDS)}
+        for crrt_angle in ["pitch", "roll"]:
+            array_is_plausible &= (dict_attitude["min_" + crrt_angle] <= dict_attitude["mean_" + crrt_angle])
+            array_is_plausible &= (dict_attitude["mean_" + crrt_angle] <= dict_attitude["max_" + crrt_angle])
+
+    # among the plausible candidates, keep the first one of any set of overlapping candidates; only loops over the
+    # (few) plausible candidates, not over the bytes
+    list_kept = []
+    last_message_index = -1
+    last_packet_end = -1
+    for crrt_index in np.flatnonzero(array_is_plausible).tolist():
+        crrt_start = array_candidates[crrt_index]
+        if message_index[crrt_index] != last_message_index or crrt_start >= last_packet_end:
+            list_kept.append(crrt_index)
+            last_message_index = message_index[crrt_index]
+            last_packet_end = crrt_start + packet_length
+
+    return select_batch_entries(candidates_batch, np.array(list_kept, dtype=np.int64))
+
+
+def recover_message(hex_string_message, min_posix=_BD_RECOVERY_MIN_POSIX, max_posix=None):
+    """Per message counterpart of recover_packets_batch: returns (kind, list_recovered_packets), with the
+    same packet dataclasses as decode_message."""
+    bin_msg = hex_to_bin_message(hex_string_message)
+    kind = message_kind(bin_msg)
+    recovered_batch = recover_packets_batch([bin_msg], kind, min_posix=min_posix, max_posix=max_posix)
+
+    list_recovered_packets = []
+
+    if kind == "G":
+        for (crrt_posix, crrt_latitude, crrt_longitude) in zip(recovered_batch.posix_timestamp.tolist(), recovered_batch.latitude.tolist(), recovered_batch.longitude.tolist()):
+            list_recovered_packets.append(GNSS_Packet(
+                datetime_fix=datetime.datetime.utcfromtimestamp(crrt_posix),
+                latitude=crrt_latitude,
+                longitude=crrt_longitude,
+                is_valid=True
+            ))
+    else:
+        for crrt_index, crrt_posix in enumerate(recovered_batch.posix_timestamp.tolist()):
+            list_thermistors_readings = [
+                Thermistors_Reading(mean_temperature=crrt_mean_temperature, range_temperature=crrt_range_temperature, probe_id=crrt_probe_id)
+                for (crrt_mean_temperature, crrt_range_temperature, crrt_probe_id) in zip(
+                    recovered_batch.mean_temperature[crrt_index].tolist(),
+                    recovered_batch.range_temperature[crrt_index].tolist(),
+                    recovered_batch.probe_id[crrt_index].tolist(),
+                )
+            ]
+            list_recovered_packets.append(Thermistors_Packet(
+                datetime_packet=datetime.datetime.utcfromtimestamp(crrt_posix),
+                thermistors_readings=list_thermistors_readings,
+                **dict(zip(_BD_THERM_ATTITUDE_FIELDS, recovered_batch.attitude[crrt_index].tolist()))
+            ))
+
+    return (kind, list_recovered_packets)
+
+
 def decode_message(hex_string_message, print_decoded=True, print_debug_information=False):
     bin_msg = hex_to_bin_message(hex_string_message)
 
@@ -641,163 +1082,355 @@ def decode_message(hex_string_message, print_decoded=True, print_debug_informati
 
     return (kind, message_metadata, list_decoded_packets)
 
+#--------------------------------------------------------------------------------
+# decoding many messages of mixed kinds at once, possibly in parallel
+
+_BD_DECODE_BATCH_FUNCTIONS = {
+    "G": "decode_gnss_batch",
+    "Y": "decode_ywave_batch",
+    "T": "decode_thermistors_batch",
+}
+
+
+def concatenate_batches(list_batches):
+    """Concatenate *_Batch columnar results of the same class, one after the other. The columns shared by
+    all entries (for example the frequencies) are taken from the first batch."""
+    assert len(list_batches) > 0
+    dict_columns = {}
+    for crrt_field in fields(list_batches[0]):
+        if crrt_field.name in _BD_BATCH_SHARED_COLUMNS:
+            dict_columns[crrt_field.name] = getattr(list_batches[0], crrt_field.name)
+        else:
+            dict_columns[crrt_field.name] = np.concatenate([getattr(crrt_batch, crrt_field.name) for crrt_batch in list_batches])
+    return type(list_batches[0])(**dict_columns)
+
+
+def decode_messages_batch(payloads, recover_min_posix=None, recover_max_posix=None):
+    """Decode a list of messages of mixed kinds: the messages are validated, and the valid messages of each kind
+    go through the batch decoder of that kind in a single call. Returns (validation_batch, dict_batches), with one
+    *_Batch per kind in dict_batches, and the message_index relative to payloads. If recover_min_posix is given,
+    the packets of the damaged G and T messages are salvaged with recover_packets_batch, using recover_min_posix and
+    recover_max_posix (scalars, or one value per message) as the timestamp window, and are part of the batches too."""
+    validation_batch = validate_messages_batch(payloads)
+    dict_batches = {}
+
+    for crrt_kind, crrt_function_name in _BD_DECODE_BATCH_FUNCTIONS.items():
+        array_indexes = np.flatnonzero(validation_batch.is_valid & (validation_batch.kind == crrt_kind))
+        crrt_batch = globals()[crrt_function_name]([payloads[crrt_index] for crrt_index in array_indexes.tolist()])
+        crrt_batch.message_index = array_indexes[crrt_batch.message_index]
+        dict_batches[crrt_kind] = crrt_batch
+
+    if recover_min_posix is not None:
+        dict_batches = recover_damaged_messages_batch(payloads, validation_batch, dict_batches, recover_min_posix, recover_max_posix)
+
+    return validation_batch, dict_batches
+
+
+def recover_damaged_messages_batch(payloads, validation_batch, dict_batches, recover_min_posix, recover_max_posix=None):
+    """Salvage the packets of the damaged G and T messages with recover_packets_batch, using recover_min_posix and
+    recover_max_posix (scalars, or one value per message) as the timestamp window. Returns dict_batches, with the
+    recovered packets added in the order of the messages."""
+    if recover_max_posix is None:
+        recover_max_posix = int(time.time())
+
+    dict_batches = dict(dict_batches)
+
+    for crrt_kind in ["G", "T"]:
+        array_damaged = np.flatnonzero((validation_batch.kind == crrt_kind) & np.isin(validation_batch.reason, [_BD_VALIDATION_BAD_LENGTH, _BD_VALIDATION_BAD_FRAMING]))
+        recovered_batch = recover_packets_batch(
+            [payloads[crrt_index] for crrt_index in array_damaged.tolist()],
+            crrt_kind,
+            min_posix=np.broadcast_to(np.asarray(recover_min_posix, dtype=np.int64), (len(payloads),))[array_damaged],
+            max_posix=np.broadcast_to(np.asarray(recover_max_posix, dtype=np.int64), (len(payloads),))[array_damaged],
+        )
+        recovered_batch.message_index = array_damaged[recovered_batch.message_index]
+        crrt_batch = concatenate_batches([dict_batches[crrt_kind], recovered_batch])
+        dict_batches[crrt_kind] = select_batch_entries(crrt_batch, np.argsort(crrt_batch.message_index, kind="stable"))
+
+    return dict_batches
+
+
+def _decode_messages_chunk(chunk_arguments):
+    (payloads, recover_min_posix, recover_max_posix) = chunk_arguments
+    return decode_messages_batch(payloads, recover_min_posix=recover_min_posix, recover_max_posix=recover_max_posix)
+
+
+def decode_messages_parallel(payloads, recover_min_posix=None, recover_max_posix=None, nbr_workers=None, chunk_size=2048):
+    """Same as decode_messages_batch, but the messages are split into chunks that are decoded by a pool of worker
+    processes (nbr_workers defaults to the number of cores). The workers only send back the columnar batches, and
+    the chunks are merged back in the order of the messages, so the result does not depend on the number of workers."""
+    if len(payloads) == 0:
+        return decode_messages_batch(payloads)
+
+    def chunk_of(value, crrt_start):
+        if value is None or np.ndim(value) == 0:
+            return value
+        return value[crrt_start: crrt_start+chunk_size]
+
+    list_chunk_starts = list(range(0, len(payloads), chunk_size))
+    list_chunk_arguments = [
+        (payloads[crrt_start: crrt_start+chunk_size], chunk_of(recover_min_posix, crrt_start), chunk_of(recover_max_posix, crrt_start))
+        for crrt_start in list_chunk_starts
+    ]
+
+    if nbr_workers == 1:
+        list_chunk_results = [_decode_messages_chunk(crrt_chunk_arguments) for crrt_chunk_arguments in list_chunk_arguments]
+    else:
+        # the process pool is only needed here, so it is not imported with the decoder
+        import concurrent.futures
+        import multiprocessing
+
+        # use fork where available: the scripts of the pipeline have no __main__ guard, which the spawn start method needs
+        mp_context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        with concurrent.futures.ProcessPoolExecutor(max_workers=nbr_workers, mp_context=mp_context) as executor:
+            list_chunk_results = list(executor.map(_decode_messages_chunk, list_chunk_arguments))
+
+    for crrt_start, (_, crrt_dict_batches) in zip(list_chunk_starts, list_chunk_results):
+        for crrt_batch in crrt_dict_batches.values():
+            crrt_batch.message_index += crrt_start
+
+    validation_batch = concatenate_batches([crrt_validation_batch for (crrt_validation_batch, _) in list_chunk_results])
+    dict_batches = {
+        crrt_kind: concatenate_batches([crrt_dict_batches[crrt_kind] for (_, crrt_dict_batches) in list_chunk_results])
+        for crrt_kind in _BD_DECODE_BATCH_FUNCTIONS
+    }
+
+    return validation_batch, dict_batches
+
+#--------------------------------------------------------------------------------
+# streaming decoding of many messages, into flat records (one per packet)
+
+# all the fields that can be found in a record; the array fields are written as ';' separated values in csv
+_BD_RECORD_FIELDS = [
+    "device", "rock7_datetime", "kind", "posix_timestamp",
+    "latitude", "longitude",
+    "spectrum_number", "Hs", "Tz", "Tc", "is_valid", "elevation_energies",
+    "mean_temperature", "range_temperature", "probe_id", "attitude",
+]
+_BD_RECORD_FIELDS_PER_KIND = {
+    "G": ["posix_timestamp", "latitude", "longitude"],
+    "Y": ["posix_timestamp", "spectrum_number", "Hs", "Tz", "Tc", "is_valid", "elevation_energies"],
+    "T": ["posix_timestamp", "mean_temperature", "range_temperature", "probe_id", "attitude"],
+}
+
+_BD_ROCK7_DATETIME_FORMAT = "%d/%b/%Y %H:%M:%S"
+
+
+def iter_rock7_entries(fh):
+    """Iterate over the (device, rock7_datetime, hex_payload) entries in either a Rock7 csv export,
+    or a bare list of hex payloads (one per line, in which case device and rock7_datetime are None).
+    Messages sent to the instruments and empty payloads (failed transmissions) are skipped."""
+    first_line = fh.readline()
+
+    if first_line.startswith("Date Time (UTC)"):
+        for row in csv.DictReader(itertools.chain([first_line], fh)):
+            if row["Direction"] == "MT" or len(row["Payload"]) == 0:
+                continue
+            yield (row["Device"], row["Date Time (UTC)"], row["Payload"])
+
+    else:
+        for crrt_line in itertools.chain([first_line], fh):
+            crrt_line = crrt_line.strip()
+            if len(crrt_line) > 0:
+                yield (None, None, crrt_line)
+
+
+@dataclass
+class Packet_Record:
+    """A decoded packet, with the device that sent it, and the Rock7 reception time of its message."""
+    device: str
+    kind: str
+    datetime_received: datetime.datetime
+    packet: object
+
+
+def packet_datetime(packet):
+    """The timestamp of any of the GNSS_Packet / Waves_Packet / Thermistors_Packet."""
+    if isinstance(packet, Thermistors_Packet):
+        return packet.datetime_packet
+    return packet.datetime_fix
+
+
+def iter_decoded_packets(csv_paths, instruments, start_times, chunk_size=256, list_quarantined=None, oldest_first=False):
+    """Lazily read the Rock7 csv exports one row at a time, and yield a Packet_Record for each packet of the messages
+    sent by the instruments (start_times gives the start of the deployment of each instrument, in the same order).
+    The messages received before the start time, and the packets timestamped before it, are dropped. Messages are
+    validated chunk_size at a time; the packets of damaged G and T messages are salvaged with recover_message,
+    and if list_quarantined is given, ((device, datetime_received, payload), reason, nbr_recovered_packets) tuples
+    are appended to it for all the messages that fail validation. Only one chunk of messages is held in memory.
+    The messages come in the order of the exports (newest first); with oldest_first, the rows of all the exports are
+    first read, and put in the order of reception of rock7_datetimes.oldest_first_order, and only the decoding is lazy."""
+    dict_start_times = dict(zip(instruments, start_times))
+
+    def iter_selected_entries():
+        for crrt_path in csv_paths:
+            with open(crrt_path, mode='r') as fh:
+                for (crrt_device, crrt_rock7_datetime, crrt_payload) in iter_rock7_entries(fh):
+                    if crrt_device not in dict_start_times:
+                        continue
+                    crrt_datetime_received = datetime.datetime.strptime(crrt_rock7_datetime, _BD_ROCK7_DATETIME_FORMAT)
+                    if crrt_datetime_received > dict_start_times[crrt_device]:
+                        yield (crrt_device, crrt_datetime_received, crrt_payload)
+
+    if oldest_first:
+        list_entries = list(iter_selected_entries())
+        array_entry_order = rock7_datetimes.oldest_first_order(
+            [int(crrt_datetime_received.replace(tzinfo=datetime.timezone.utc).timestamp()) for (_, crrt_datetime_received, _) in list_entries])
+        iterator_entries = (list_entries[crrt_index] for crrt_index in array_entry_order.tolist())
+    else:
+        iterator_entries = iter_selected_entries()
+
+    while True:
+        list_chunk = list(itertools.islice(iterator_entries, chunk_size))
+        if len(list_chunk) == 0:
+            break
+
+        validation_batch = validate_messages_batch([crrt_entry[2] for crrt_entry in list_chunk])
+
+        for (crrt_entry, crrt_is_valid, crrt_reason) in zip(list_chunk, validation_batch.is_valid.tolist(), validation_batch.reason.tolist()):
+            (crrt_device, crrt_datetime_received, crrt_payload) = crrt_entry
+            crrt_start_time = dict_start_times[crrt_device]
+
+            if crrt_is_valid:
+                crrt_kind, _, list_packets = decode_message(crrt_payload, print_decoded=False)
+
+            elif crrt_reason in [_BD_VALIDATION_BAD_LENGTH, _BD_VALIDATION_BAD_FRAMING] and crrt_payload[0:2] in ["47", "54"]:
+                crrt_kind, list_packets = recover_message(
+                    crrt_payload,
+                    min_posix=int(crrt_start_time.replace(tzinfo=datetime.timezone.utc).timestamp()),
+                    max_posix=int(crrt_datetime_received.replace(tzinfo=datetime.timezone.utc).timestamp()),
+                )
+
+            else:
+                list_packets = []
+
+            if not crrt_is_valid and list_quarantined is not None:
+                list_quarantined.append((crrt_entry, _BD_VALIDATION_REASONS[crrt_reason], len(list_packets)))
+
+            for crrt_packet in list_packets:
+                if packet_datetime(crrt_packet) > crrt_start_time:
+                    yield Packet_Record(device=crrt_device, kind=crrt_kind, datetime_received=crrt_datetime_received, packet=crrt_packet)
+
+
+def _float_or_none(value):
+    # json has no inf / nan
+    return value if math.isfinite(value) else None
+
+
+def iter_decoded_records(iterable_entries, chunk_size=4096, list_quarantined=None):
+    """Decode (device, rock7_datetime, hex_payload) entries chunk by chunk, using the batch decoders,
+    and yield one flat dict record per packet, in the order of the input messages. Messages that fail
+    validation are not decoded; if list_quarantined is given, (entry, reason) tuples are appended to it."""
+    iterator_entries = iter(iterable_entries)
+
+    while True:
+        list_chunk = list(itertools.islice(iterator_entries, chunk_size))
+        if len(list_chunk) == 0:
+            break
+
+        (validation_batch, dict_batches) = decode_messages_batch([crrt_entry[2] for crrt_entry in list_chunk])
+
+        if list_quarantined is not None:
+            for crrt_index in np.flatnonzero(~validation_batch.is_valid).tolist():
+                list_quarantined.append((list_chunk[crrt_index], _BD_VALIDATION_REASONS[int(validation_batch.reason[crrt_index])]))
+
+        list_indexed_records = []
+
+        for crrt_kind, crrt_batch in dict_batches.items():
+            list_fields = _BD_RECORD_FIELDS_PER_KIND[crrt_kind]
+            list_columns = [getattr(crrt_batch, crrt_field).tolist() for crrt_field in list_fields]
+
+            for crrt_chunk_index, crrt_values in zip(crrt_batch.message_index.tolist(), zip(*list_columns)):
+                crrt_record = {
+                    "device": list_chunk[crrt_chunk_index][0],
+                    "rock7_datetime": list_chunk[crrt_chunk_index][1],
+                    "kind": crrt_kind,
+                }
+                crrt_record.update(zip(list_fields, crrt_values))
+                list_indexed_records.append((crrt_chunk_index, crrt_record))
+
+        list_indexed_records.sort(key=lambda x: x[0])
+
+        for (_, crrt_record) in list_indexed_records:
+            for crrt_field in ["Hs", "Tz", "Tc"]:
+                if crrt_field in crrt_record:
+                    crrt_record[crrt_field] = _float_or_none(crrt_record[crrt_field])
+            yield crrt_record
+
+
+def write_decoded_records(iterable_records, fh, output_format="ndjson"):
+    """Write records to fh, either as newline delimited json, or as csv with the _BD_RECORD_FIELDS columns."""
+    if output_format == "ndjson":
+        for crrt_record in iterable_records:
+            fh.write(json.dumps(crrt_record))
+            fh.write("\n")
+
+    elif output_format == "csv":
+        csv_writer = csv.DictWriter(fh, fieldnames=_BD_RECORD_FIELDS)
+        csv_writer.writeheader()
+        for crrt_record in iterable_records:
+            for crrt_field, crrt_value in crrt_record.items():
+                if isinstance(crrt_value, list):
+                    crrt_record[crrt_field] = ";".join(str(crrt_entry) for crrt_entry in crrt_value)
+            csv_writer.writerow(crrt_record)
+
+    else:
+        raise RuntimeError("unknown output format {}".format(output_format))
+
 
 def auto_test():
     # TODO: assert all results for correct values
     print("------------------------------ START AUTO TEST ------------------------------")
+    ic = _debug_ic()
 
     hex_in = "4704469cb62a6007160f2ef5581e1246c2b62a60d3150f2e1b5b1e1246e8b62a6009110f2e2e8a1e1245"
     ic(hex_in)
     decode_gnss_message(hex_to_bin_message(hex_in), print_decoded=True, print_debug_information=True)
     decode_message(hex_in)
 
+    _, list_decoded_packets = decode_gnss_message(hex_to_bin_message(hex_in), print_decoded=False)
+    decoded_batch = decode_gnss_batch([hex_in, hex_in])
+    assert list(decoded_batch.message_index) == [0, 0, 0, 1, 1, 1]
+    assert list(decoded_batch.latitude[3:]) == [crrt_packet.latitude for crrt_packet in list_decoded_packets]
+    assert list(decoded_batch.posix_timestamp[:3]) == [int(crrt_packet.datetime_fix.replace(tzinfo=datetime.timezone.utc).timestamp()) for crrt_packet in list_decoded_packets]
+
+    # a truncated message: the first two fixes are still intact
+    _, list_recovered_packets = recover_message(hex_in[:-10])
+    assert list_recovered_packets == list_decoded_packets[:2]
+
     hex_in = "591700000001000000D9D33440A1E9673E0AFC673E020A61430000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000100050038005D0FE8FD6FC6E804220004000000000000000000000000000000000000000000000000000000000045"
     ic(hex_in)
     decode_ywave_message(hex_to_bin_message(hex_in), print_decoded=True, print_debug_information=True)
     decode_message(hex_in)
 
+    _, list_decoded_packets = decode_ywave_message(hex_to_bin_message(hex_in), print_decoded=False)
+    decoded_batch = decode_ywave_batch([hex_in, hex_in])
+    assert decoded_batch.elevation_energies.shape == (2, _BD_YWAVE_NBR_BINS)
+    assert np.allclose(decoded_batch.elevation_energies[1], list_decoded_packets[0].list_elevation_energies)
+    assert decoded_batch.Hs[0] == list_decoded_packets[0].Hs
+
     hex_in = "54025043000000E85C40605BC1205C41205C41105DC1045CC00608060608085021000000E85C01605BC1205C40205C41105DC0045C8106080606080845"
     ic(hex_in)
     decode_thermistors_message(hex_to_bin_message(hex_in), print_decoded=True, print_debug_information=True)
     decode_message(hex_in)
 
-    print("------------------------------ END AUTO TEST ------------------------------")
-
-
-def plot_wave_packet(list_wave_packet_in):
-    wave_packet_in = list_wave_packet_in[0]
-
-    plt.figure()
-    plt.plot(wave_packet_in.list_frequencies, wave_packet_in.list_elevation_energies)
-    plt.xlabel("frq [Hz]")
-    plt.ylabel("S$_{\eta}$(f) [m$^2$/Hz]")
-    title_str = "{}, Hs={:05.2f}m, Tz={:05.2f}s".format(wave_packet_in.datetime_fix, wave_packet_in.Hs, wave_packet_in.Tz)
-    plt.title(title_str)
-    plt.tight_layout()
-    plt.show()
-
-
-def plot_gnss_fixes(list_gnss_packets_in):
-    list_lats = [crrt_packet.latitude for crrt_packet in list_gnss_packets_in]
-    list_lons = [crrt_packet.longitude for crrt_packet in list_gnss_packets_in]
-
+    _, list_decoded_packets = decode_thermistors_message(hex_to_bin_message(hex_in), print_decoded=False)
+    decoded_batch = decode_thermistors_batch([hex_in])
+    assert decoded_batch.mean_temperature.shape == (2, _BD_THERM_MSG_NBR_THERMISTORS)
+    assert list(decoded_batch.mean_temperature[1]) == [crrt_reading.mean_temperature for crrt_reading in list_decoded_packets[1].thermistors_readings]
+    assert list(decoded_batch.attitude[0]) == [getattr(list_decoded_packets[0], crrt_field) for crrt_field in _BD_THERM_ATTITUDE_FIELDS]
 
-    fig, ax = plt.subplots()
-    plt.plot(list_lons, list_lats)
-    ax.annotate("Start", (list_lons[0], list_lats[0]))
-    plt.scatter(list_lons[0], list_lats[0], s=80)
-    plt.xlabel("lon [DD East]")
-    plt.ylabel("lat [DD North]")
-    title_str = "drift {} to {}".format(list_gnss_packets_in[0].datetime_fix, list_gnss_packets_in[-1].datetime_fix)
-    plt.title(title_str)
-    plt.tight_layout()
-    plt.show()
+    # mixed kinds, decoded in chunks of one message
+    list_hex_in = ["4704469cb62a6007160f2ef5581e1246c2b62a60d3150f2e1b5b1e1246e8b62a6009110f2e2e8a1e1245", hex_in, "", hex_in]
+    validation_batch, dict_batches = decode_messages_parallel(list_hex_in, nbr_workers=1, chunk_size=1)
+    assert list(validation_batch.is_valid) == [True, True, False, True]
+    assert list(dict_batches["G"].message_index) == [0, 0, 0]
+    assert list(dict_batches["T"].message_index) == [1, 1, 3, 3]
 
-
-def plot_decoded(message_kind, message_metadata, list_decoded_packets):
-    if message_kind == "Y":
-        plot_wave_packet(list_decoded_packets)
-    elif message_kind == "G":
-        plot_gnss_fixes(list_decoded_packets)
-    else:
-        raise RuntimeError("Unknown message_kind: {}".format(message_kind))
-
-#--------------------------------------------------------------------------------
-# simple CLI
-
-@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
-@click.option('--example', '-e', is_flag=True, help="Example of installation and use")
-@click.option('--module', '-m', is_flag=True, help="Show how to use as a module")
-@click.option('--autotest', '-t', is_flag=True, help="Run a few autotests to check that the package works")
-@click.option('--version', '-s', is_flag=True, help="Print the version number")
-@click.option('--verbose', '-v', is_flag=True, help="Turn on verbosity")
-@click.option('--verbose-debug', '-b', is_flag=True, help="Turn on verbosity to debug level")
-@click.option('--decode-hex', '-d', default=None, help="Decode the provided hex message")
-@click.option('--plot', '-p', is_flag=True, help="Plot the data contained in the message")
-def cli(example, module, autotest, version, verbose, verbose_debug, plot, decode_hex):
-    """
-    Simple CLI for decoding tracker messages.
-    This can be added as a command by copying into $HOME/bin and making executable.
-    (you may need to $ source ~/.profile to activate)
-    """
-
-    if example:
-        print("download messages directly from Rock7: https://rockblock.rock7.com/ > Messages > Export > Payload")
-        print("for example decoding a GNSS message with 3 packets obtained there:")
-        print("    $ ./decoder.py --verbose --decode-hex 4704469cb62a6007160f2ef5581e1246c2b62a60d3150f2e1b5b1e1246e8b62a6009110f2e2e8a1e1245")
-        print("    ----------------------- START DECODE GNSS MESSAGE -----------------------")
-        print("    expected number of packets based on message length: 3")
-        print("    number of fixes since boot at message creation: 4")
-        print("    -------------------- decoded GNSS packet ---------------------")
-        print("    fix at posix 1613411996, i.e. 2021-02-15 17:59:56")
-        print("    latitude 772740615, i.e. 77.2740615")
-        print("    longitude 303978741, i.e. 30.3978741")
-        print("    --------------------------------------------------------------")
-        print("    -------------------- decoded GNSS packet ---------------------")
-        print("    fix at posix 1613412034, i.e. 2021-02-15 18:00:34")
-        print("    latitude 772740563, i.e. 77.2740563")
-        print("    longitude 303979291, i.e. 30.3979291")
-        print("    --------------------------------------------------------------")
-        print("    -------------------- decoded GNSS packet ---------------------")
-        print("    fix at posix 1613412072, i.e. 2021-02-15 18:01:12")
-        print("    latitude 772739337, i.e. 77.2739337")
-        print("    longitude 303991342, i.e. 30.3991342")
-        print("    --------------------------------------------------------------")
-        print("    ----------------------- DONE DECODE GNSS MESSAGE -----------------------")
-        print("this can also be shortened into: $ ./decoder.py -vd 470146fa30dc602521ba23b4575d0645")
-        print("i.e. the abbreviated form for verbose decode is '-vd'")
-
-    if module:
-        print("this can be used as a module after adding to PYTHONPATH")
-        print("    $ python3")
-        print("    >>> from decoder import *")
-        print('    >>> kind, metadata, list_decoded = decode_message("4704469cb62a6007160f2ef5581e1246c2b62a60d3150f2e1b5b1e1246e8b62a6009110f2e2e8a1e1245")')
-        print("    ----------------------- START DECODE GNSS MESSAGE -----------------------")
-        print("    expected number of packets based on message length: 3")
-        print("    number of fixes since boot at message creation: 4")
-        print("    -------------------- decoded GNSS packet ---------------------")
-        print("    fix at posix 1613411996, i.e. 2021-02-15 17:59:56")
-        print("    latitude 772740615, i.e. 77.2740615")
-        print("    longitude 303978741, i.e. 30.3978741")
-        print("    --------------------------------------------------------------")
-        print("    -------------------- decoded GNSS packet ---------------------")
-        print("    fix at posix 1613412034, i.e. 2021-02-15 18:00:34")
-        print("    latitude 772740563, i.e. 77.2740563")
-        print("    longitude 303979291, i.e. 30.3979291")
-        print("    --------------------------------------------------------------")
-        print("    -------------------- decoded GNSS packet ---------------------")
-        print("    fix at posix 1613412072, i.e. 2021-02-15 18:01:12")
-        print("    latitude 772739337, i.e. 77.2739337")
-        print("    longitude 303991342, i.e. 30.3991342")
-        print("    --------------------------------------------------------------")
-        print("    ----------------------- DONE DECODE GNSS MESSAGE -----------------------")
-        print("    >>> kind")
-        print("    'G'")
-        print("    >>> metadata")
-        print("    GNSS_Metadata(nbr_gnss_fixes=4)")
-        print("    >>> for i in list_decoded:")
-        print("    ...     print(i)")
-        print("    ... ")
-        print("    GNSS_Packet(datetime_fix=datetime.datetime(2021, 2, 15, 17, 59, 56), latitude=77.2740615, longitude=30.3978741)")
-        print("    GNSS_Packet(datetime_fix=datetime.datetime(2021, 2, 15, 18, 0, 34), latitude=77.2740563, longitude=30.3979291)")
-        print("    GNSS_Packet(datetime_fix=datetime.datetime(2021, 2, 15, 18, 1, 12), latitude=77.2739337, longitude=30.3991342)")
-
-    if autotest:
-        print("we will now run a few diagnostic tests to check that the module is working fine...")
-        print("these tests should decode some test messages to check that all work well...")
-        print()
-        auto_test()
-
-    if version:
-        print("version {}".format(_BD_VERSION_NBR))
-
-    if decode_hex:
-        message_kind, message_metadata, list_decoded_packets = decode_message(decode_hex, print_decoded=verbose, print_debug_information=verbose_debug)
-
-        if plot:
-            plot_decoded(message_kind, message_metadata, list_decoded_packets)
+    print("------------------------------ END AUTO TEST ------------------------------")
 
 
 if __name__ == "__main__":
+    # the plotting and the CLI live in decoder_cli.py, so that importing the decoder stays light
+    from decoder_cli import cli
     cli()
-
@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+# before I used #!/bin/python3 , but some users were experiencing problems
+
+"""
+The plotting and the command line interface of the decoder. These are kept apart from decoder.py, so that the
+pipeline scripts (and the pickle loads that need the packet classes) do not pay for importing click and matplotlib.
+Running ./decoder.py works as before, and calls the CLI from here.
+"""
+
+import os
+import sys
+import time
+import click
+
+from decoder import _BD_VERSION_NBR, auto_test, decode_message, iter_decoded_records, iter_rock7_entries, write_decoded_records
+
+#--------------------------------------------------------------------------------
+# make sure we are all UTC
+
+os.environ["TZ"] = "UTC"
+time.tzset()
+
+#--------------------------------------------------------------------------------
+# plotting; matplotlib is only imported when actually plotting
+
+def plot_wave_packet(list_wave_packet_in):
+    import matplotlib.pyplot as plt
+
+    wave_packet_in = list_wave_packet_in[0]
+
+    plt.figure()
+    plt.plot(wave_packet_in.list_frequencies, wave_packet_in.list_elevation_energies)
+    plt.xlabel("frq [Hz]")
+    plt.ylabel("S$_{\eta}$(f) [m$^2$/Hz]")
+    title_str = "{}, Hs={:05.2f}m, Tz={:05.2f}s".format(wave_packet_in.datetime_fix, wave_packet_in.Hs, wave_packet_in.Tz)
+    plt.title(title_str)
+    plt.tight_layout()
+    plt.show()
+
+
+def plot_gnss_fixes(list_gnss_packets_in):
+    import matplotlib.pyplot as plt
+
+    list_lats = [crrt_packet.latitude for crrt_packet in list_gnss_packets_in]
+    list_lons = [crrt_packet.longitude for crrt_packet in list_gnss_packets_in]
+
+
+    fig, ax = plt.subplots()
+    plt.plot(list_lons, list_lats)
+    ax.annotate("Start", (list_lons[0], list_lats[0]))
+    plt.scatter(list_lons[0], list_lats[0], s=80)
+    plt.xlabel("lon [DD East]")
+    plt.ylabel("lat [DD North]")
+    title_str = "drift {} to {}".format(list_gnss_packets_in[0].datetime_fix, list_gnss_packets_in[-1].datetime_fix)
+    plt.title(title_str)
+    plt.tight_layout()
+    plt.show()
+
+
+def plot_decoded(message_kind, message_metadata, list_decoded_packets):
+    if message_kind == "Y":
+        plot_wave_packet(list_decoded_packets)
+    elif message_kind == "G":
+        plot_gnss_fixes(list_decoded_packets)
+    else:
+        raise RuntimeError("Unknown message_kind: {}".format(message_kind))
+
+#--------------------------------------------------------------------------------
+# simple CLI
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option('--example', '-e', is_flag=True, help="Example of installation and use")
+@click.option('--module', '-m', is_flag=True, help="Show how to use as a module")
+@click.option('--autotest', '-t', is_flag=True, help="Run a few autotests to check that the package works")
+@click.option('--version', '-s', is_flag=True, help="Print the version number")
+@click.option('--verbose', '-v', is_flag=True, help="Turn on verbosity")
+@click.option('--verbose-debug', '-b', is_flag=True, help="Turn on verbosity to debug level")
+@click.option('--decode-hex', '-d', default=None, help="Decode the provided hex message")
+@click.option('--plot', '-p', is_flag=True, help="Plot the data contained in the message")
+@click.option('--decode-file', '-f', default=None, type=click.File('r'), help="Decode all the messages in a Rock7 csv export, or a file with one hex payload per line; use - for stdin")
+@click.option('--output-format', '-o', default="ndjson", type=click.Choice(["ndjson", "csv"]), help="Format of the records written to stdout by --decode-file, one record per packet")
+def cli(example, module, autotest, version, verbose, verbose_debug, plot, decode_hex, decode_file, output_format):
+    """
+    Simple CLI for decoding tracker messages.
+    This can be added as a command by copying into $HOME/bin and making executable.
+    (you may need to $ source ~/.profile to activate)
+    """
+
+    if example:
+        print("download messages directly from Rock7: https://rockblock.rock7.com/ > Messages > Export > Payload")
+        print("for example decoding a GNSS message with 3 packets obtained there:")
+        print("    $ ./decoder.py --verbose --decode-hex 4704469cb62a6007160f2ef5581e1246c2b62a60d3150f2e1b5b1e1246e8b62a6009110f2e2e8a1e1245")
+        print("    ----------------------- START DECODE GNSS MESSAGE -----------------------")
+        print("    expected number of packets based on message length: 3")
+        print("    number of fixes since boot at message creation: 4")
+        print("    -------------------- decoded GNSS packet ---------------------")
+        print("    fix at posix 1613411996, i.e. 2021-02-15 17:59:56")
+        print("    latitude 772740615, i.e. 77.2740615")
+        print("    longitude 303978741, i.e. 30.3978741")
+        print("    --------------------------------------------------------------")
+        print("    -------------------- decoded GNSS packet ---------------------")
+        print("    fix at posix 1613412034, i.e. 2021-02-15 18:00:34")
+        print("    latitude 772740563, i.e. 77.2740563")
+        print("    longitude 303979291, i.e. 30.3979291")
+        print("    --------------------------------------------------------------")
+        print("    -------------------- decoded GNSS packet ---------------------")
+        print("    fix at posix 1613412072, i.e. 2021-02-15 18:01:12")
+        print("    latitude 772739337, i.e. 77.2739337")
+        print("    longitude 303991342, i.e. 30.3991342")
+        print("    --------------------------------------------------------------")
+        print("    ----------------------- DONE DECODE GNSS MESSAGE -----------------------")
+        print("this can also be shortened into: $ ./decoder.py -vd 470146fa30dc602521ba23b4575d0645")
+        print("i.e. the abbreviated form for verbose decode is '-vd'")
+        print("a whole Rock7 csv export (or a file / stdin with one hex payload per line) can be decoded into one record per packet:")
+        print("    $ ./decoder.py --decode-file all_messages.csv --output-format csv > all_packets.csv")
+        print("    $ cat payloads.txt | ./decoder.py -f - > all_packets.ndjson")
+
+    if module:
+        print("this can be used as a module after adding to PYTHONPATH")
+        print("    $ python3")
+        print("    >>> from decoder import *")
+        print('    >>> kind, metadata, list_decoded = decode_message("4704469cb62a6007160f2ef5581e1246c2b62a60d3150f2e1b5b1e1246e8b62a6009110f2e2e8a1e1245")')
+        print("    ----------------------- START DECODE GNSS MESSAGE -----------------------")
+        print("    expected number of packets based on message length: 3")
+        print("    number of fixes since boot at message creation: 4")
+        print("    -------------------- decoded GNSS packet ---------------------")
+        print("    fix at posix 1613411996, i.e. 2021-02-15 17:59:56")
+        print("    latitude 772740615, i.e. 77.2740615")
+        print("    longitude 303978741, i.e. 30.3978741")
+        print("    --------------------------------------------------------------")
+        print("    -------------------- decoded GNSS packet ---------------------")
+        print("    fix at posix 1613412034, i.e. 2021-02-15 18:00:34")
+        print("    latitude 772740563, i.e. 77.2740563")
+        print("    longitude 303979291, i.e. 30.3979291")
+        print("    --------------------------------------------------------------")
+        print("    -------------------- decoded GNSS packet ---------------------")
+        print("    fix at posix 1613412072, i.e. 2021-02-15 18:01:12")
+        print("    latitude 772739337, i.e. 77.2739337")
+        print("    longitude 303991342, i.e. 30.3991342")
+        print("    --------------------------------------------------------------")
+        print("    ----------------------- DONE DECODE GNSS MESSAGE -----------------------")
+        print("    >>> kind")
+        print("    'G'")
+        print("    >>> metadata")
+        print("    GNSS_Metadata(nbr_gnss_fixes=4)")
+        print("    >>> for i in list_decoded:")
+        print("    ...     print(i)")
+        print("    ... ")
+        print("    GNSS_Packet(datetime_fix=datetime.datetime(2021, 2, 15, 17, 59, 56), latitude=77.2740615, longitude=30.3978741)")
+        print("    GNSS_Packet(datetime_fix=datetime.datetime(2021, 2, 15, 18, 0, 34), latitude=77.2740563, longitude=30.3979291)")
+        print("    GNSS_Packet(datetime_fix=datetime.datetime(2021, 2, 15, 18, 1, 12), latitude=77.2739337, longitude=30.3991342)")
+
+    if autotest:
+        print("we will now run a few diagnostic tests to check that the module is working fine...")
+        print("these tests should decode some test messages to check that all work well...")
+        print()
+        auto_test()
+
+    if version:
+        print("version {}".format(_BD_VERSION_NBR))
+
+    if decode_hex:
+        message_kind, message_metadata, list_decoded_packets = decode_message(decode_hex, print_decoded=verbose, print_debug_information=verbose_debug)
+
+        if plot:
+            plot_decoded(message_kind, message_metadata, list_decoded_packets)
+
+    if decode_file:
+        list_quarantined = []
+        write_decoded_records(iter_decoded_records(iter_rock7_entries(decode_file), list_quarantined=list_quarantined), sys.stdout, output_format=output_format)
+
+        for (crrt_entry, crrt_reason) in list_quarantined:
+            print("WARNING: quarantined message {}: {}".format(crrt_entry, crrt_reason), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,120 @@
+"""
+The state of the incremental ingestion of the Rock7 exports: for each device, a watermark that says up to where
+the rows of the exports were already processed, so that only the rows received since are decoded on the next run.
+
+The Rock7 exports have no row id, and several messages of a device can be received within the same second, so the
+watermark of a device is the latest "Date Time (UTC)" processed, together with the ids (digests of the device,
+time and payload) of all the rows received at that exact time. A row is new if it was received after the watermark,
+or at the watermark but with an id not seen yet.
+
+The state also holds a signature of everything that the processed data depend on (for example the instruments and
+their start times): a state with another signature is not used, and the next run processes all the rows again.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+
+import numpy as np
+
+#--------------------------------------------------------------------------------
+# a few module constants
+
+_IS_STATE_VERSION = 2
+_IS_ROCK7_DATETIME_FORMAT = "%d/%b/%Y %H:%M:%S"
+_IS_ROW_ID_DIGEST_SIZE = 16
+
+#--------------------------------------------------------------------------------
+# the state itself
+
+
+def rock7_row_id(device, posix_received, payload):
+    """An id for a row of a Rock7 export, since these do not have one."""
+    return hashlib.blake2b(
+        "{},{},{}".format(device, int(posix_received), payload).encode("utf-8"),
+        digest_size=_IS_ROW_ID_DIGEST_SIZE,
+    ).hexdigest()
+
+
+class IngestState:
+    """The watermark of each device, from the rows processed by the previous runs. The rows are given as columns:
+    an array of devices, an array of the posix timestamps of reception, and a list of payloads."""
+
+    def __init__(self, signature):
+        self.signature = signature
+        # device -> (posix timestamp of the latest row processed, set of the ids of the rows processed at that time)
+        self.dict_watermarks = {}
+
+    @classmethod
+    def load(cls, path, signature):
+        """The state saved at path, or None if there is none, or if it was saved with another signature."""
+        if not os.path.exists(path):
+            return None
+
+        with open(path, "r") as fh:
+            dict_state = json.load(fh)
+
+        if dict_state.get("version") != _IS_STATE_VERSION or dict_state.get("signature") != signature:
+            return None
+
+        ingest_state = cls(signature)
+        for crrt_device, dict_crrt_watermark in dict_state["watermarks"].items():
+            crrt_last_datetime = datetime.datetime.strptime(dict_crrt_watermark["last_datetime_received"], _IS_ROCK7_DATETIME_FORMAT)
+            ingest_state.dict_watermarks[crrt_device] = (
+                int(crrt_last_datetime.replace(tzinfo=datetime.timezone.utc).timestamp()),
+                set(dict_crrt_watermark["row_ids_at_last_datetime"]),
+            )
+
+        return ingest_state
+
+    def save(self, path):
+        """Save the state; the file is replaced in one go, so that an interrupted run does not leave half a state."""
+        dict_state = {
+            "version": _IS_STATE_VERSION,
+            "signature": self.signature,
+            "watermarks": {
+                crrt_device: {
+                    "last_datetime_received": datetime.datetime.fromtimestamp(crrt_last_posix, tz=datetime.timezone.utc).strftime(_IS_ROCK7_DATETIME_FORMAT),
+                    "row_ids_at_last_datetime": sorted(crrt_set_row_ids),
+                }
+                for (crrt_device, (crrt_last_posix, crrt_set_row_ids)) in self.dict_watermarks.items()
+            },
+        }
+
+        path_tmp = path + ".tmp"
+        with open(path_tmp, "w") as fh:
+            json.dump(dict_state, fh, indent=2)
+        os.replace(path_tmp, path)
+
+    def select_new(self, array_devices, array_received_posix, list_payloads):
+        """A boolean mask of the rows after the watermark of their device, ie not processed by a previous run."""
+        array_is_new = np.ones((len(list_payloads),), dtype=bool)
+
+        for (crrt_device, (crrt_last_posix, crrt_set_row_ids)) in self.dict_watermarks.items():
+            crrt_is_device = array_devices == crrt_device
+            array_is_new[crrt_is_device] = array_received_posix[crrt_is_device] > crrt_last_posix
+            # only the rows received at the very second of the watermark need their id
+            for crrt_index in np.flatnonzero(crrt_is_device & (array_received_posix == crrt_last_posix)).tolist():
+                array_is_new[crrt_index] = rock7_row_id(crrt_device, crrt_last_posix, list_payloads[crrt_index]) not in crrt_set_row_ids
+
+        return array_is_new
+
+    def update(self, array_devices, array_received_posix, list_payloads):
+        """Move the watermarks past the rows, once these are processed."""
+        for crrt_device in np.unique(array_devices).tolist():
+            crrt_indexes = np.flatnonzero(array_devices == crrt_device)
+            crrt_last_posix = int(np.max(array_received_posix[crrt_indexes]))
+            crrt_set_row_ids = {
+                rock7_row_id(crrt_device, crrt_last_posix, list_payloads[crrt_index])
+                for crrt_index in crrt_indexes[array_received_posix[crrt_indexes] == crrt_last_posix].tolist()
+            }
+
+            if crrt_device in self.dict_watermarks:
+                (crrt_previous_last_posix, crrt_previous_set_row_ids) = self.dict_watermarks[crrt_device]
+                if crrt_last_posix < crrt_previous_last_posix:
+                    continue
+                if crrt_last_posix == crrt_previous_last_posix:
+                    crrt_set_row_ids |= crrt_previous_set_row_ids
+
+            self.dict_watermarks[crrt_device] = (crrt_last_posix, crrt_set_row_ids)
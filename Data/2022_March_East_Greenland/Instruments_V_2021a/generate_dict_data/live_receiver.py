@@ -0,0 +1,414 @@
+"""
+Live ingestion of the messages, from the HTTP POST callbacks of Rock7, rather than from the csv exports.
+
+Rock7 can deliver each message as an HTTP POST to a server of ours, a few seconds after it was received
+by Iridium. The callback holds the same information as a row of the csv exports: the imei of the device,
+the time of transmission, and the hex payload (plus the momsn counter of the modem, and an approximate
+position from Iridium), either url encoded (RockBLOCK) or as json (Rock7 Core).
+
+The receiver is a small asyncio server, using only the standard library:
+- each callback is put in a bounded queue, and only then acknowledged with a 200: when the queue is full,
+  the callback waits for some room, and is refused with a 503 after enqueue_timeout_s, so that Rock7 sends
+  it again later (backpressure); every callback acknowledged is also appended to a csv file in the format
+  of the Rock7 exports, in the order of the queue, so that the usual ingest can always be re-run from it;
+- the queued messages are decoded in batches (decoder.decode_messages_batch), every flush_interval_s or
+  every flush_max_messages, in a worker thread, and merged into the per device PacketStores the same way as
+  the incremental ingest of script_all_messages_to_dict.py; the dict of data is written in full once
+  (packet_store.save_packet_stores), and then each flush only resolves again the recent end of the stores
+  that receive new packets (PacketStore.merge_resolved), and only rewrites these stores
+  (packet_store.save_packet_store_entries), so that it can be opened with load_packet_stores at any time;
+  the messages are merged in the same order as when ingesting the csv file (see LiveReceiver.flush), so
+  that both give the same dict of data;
+- a GET on /status gives the counters of the receiver and the latest packets of each device, as json.
+"""
+
+import asyncio
+import concurrent.futures
+import csv
+import datetime
+import json
+import os
+import urllib.parse
+
+import numpy as np
+
+import decoder
+import rock7_datetimes
+from packet_store import PacketStore, save_packet_stores, save_packet_store_entries, load_packet_stores
+
+#--------------------------------------------------------------------------------
+# a few module constants
+
+# the formats of the transmit_time field of the callbacks, for example "22-05-03 08:14:52"
+_LR_TRANSMIT_TIME_FORMATS = ["%y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d %H:%M:%S"]
+_LR_ROCK7_DATETIME_FORMAT = "%d/%b/%Y %H:%M:%S"
+_LR_ROCK7_EXPORT_FIELDS = ["Date Time (UTC)", "Device", "Direction", "Payload", "Approx Lat/Lng", "Payload (Text)", "Length (Bytes)", "Credits"]
+_LR_MAX_BODY_SIZE = 64 * 1024
+_LR_RETRY_AFTER_S = 60
+_LR_HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+# the entries of the dict of data of each device, with the kind and conflict policy of their packets
+# (None: the policy of the receiver); as in script_all_messages_to_dict.py
+_LR_ENTRIES = {
+    "gnss_fixes": ("G", None),
+    "spectra": ("Y", "keep_all"),
+    "thermistor": ("T", "keep_all"),
+}
+_LR_RESOLVED_ENTRIES = {"spectra": "res_spectra", "thermistor": "res_thermistor"}
+
+#--------------------------------------------------------------------------------
+# the callbacks
+
+
+def parse_transmit_time(transmit_time):
+    """The posix timestamp of the transmit_time field of a Rock7 callback (always in UTC)."""
+    for crrt_format in _LR_TRANSMIT_TIME_FORMATS:
+        try:
+            crrt_datetime = datetime.datetime.strptime(transmit_time, crrt_format)
+        except ValueError:
+            continue
+        return int(crrt_datetime.replace(tzinfo=datetime.timezone.utc).timestamp())
+    raise ValueError("unknown transmit_time format: {}".format(transmit_time))
+
+
+def parse_rock7_callback(body, content_type="application/x-www-form-urlencoded"):
+    """The fields of the body of a Rock7 callback, as a dict of strings; the body is either url encoded or json."""
+    if content_type.split(";")[0].strip() == "application/json":
+        return {crrt_key: str(crrt_value) for (crrt_key, crrt_value) in json.loads(body.decode("utf-8")).items()}
+    return {crrt_key: crrt_values[-1] for (crrt_key, crrt_values) in urllib.parse.parse_qs(body.decode("utf-8"), keep_blank_values=True).items()}
+
+
+def rock7_row_to_callback(row, imei, momsn):
+    """The fields of the Rock7 callback for a row of a Rock7 export (as given by csv.DictReader); used by the mock
+    sender, to replay the exports as if these were received live."""
+    crrt_datetime = datetime.datetime.strptime(row["Date Time (UTC)"], _LR_ROCK7_DATETIME_FORMAT)
+    (crrt_latitude, _, crrt_longitude) = row.get("Approx Lat/Lng", "").partition(",")
+    return {
+        "imei": imei,
+        "momsn": str(momsn),
+        "transmit_time": crrt_datetime.strftime(_LR_TRANSMIT_TIME_FORMATS[0]),
+        "iridium_latitude": crrt_latitude,
+        "iridium_longitude": crrt_longitude,
+        "iridium_cep": "",
+        "data": row["Payload"],
+    }
+
+#--------------------------------------------------------------------------------
+# the receiver
+
+
+class LiveReceiver:
+    """Receive the Rock7 callbacks, and keep the dict of data at data_path up to date with the packets of the instruments
+    of list_instruments_and_time, as (device, start time) pairs; the callbacks of other devices are only logged."""
+
+    def __init__(self, list_instruments_and_time, messages_path, data_path, conflict_policy="keep_first", dict_imei_to_device=None,
+                 queue_max_size=1024, enqueue_timeout_s=10.0, flush_interval_s=5.0, flush_max_messages=256):
+        self.dict_start_posix = {
+            crrt_device: int(crrt_start_time.replace(tzinfo=datetime.timezone.utc).timestamp())
+            for (crrt_device, crrt_start_time) in list_instruments_and_time
+        }
+        self.messages_path = messages_path
+        self.data_path = data_path
+        self.conflict_policy = conflict_policy
+        self.dict_imei_to_device = dict(dict_imei_to_device or {})
+        self.queue_max_size = queue_max_size
+        self.enqueue_timeout_s = enqueue_timeout_s
+        self.flush_interval_s = flush_interval_s
+        self.flush_max_messages = flush_max_messages
+
+        # start from the data of the previous runs, if any
+        if os.path.exists(data_path):
+            self.dict_data = load_packet_stores(data_path, mmap_mode=None)
+        else:
+            self.dict_data = {}
+        for crrt_device in self.dict_start_posix:
+            self.dict_data.setdefault(crrt_device, {})
+            for crrt_entry, (crrt_kind, _) in _LR_ENTRIES.items():
+                self.dict_data[crrt_device].setdefault(crrt_entry, PacketStore.from_packets(crrt_kind, []))
+
+        self.stats = {
+            "nbr_callbacks": 0,
+            "nbr_refused": 0,
+            "nbr_ignored": 0,
+            "nbr_messages_flushed": 0,
+            "nbr_quarantined": 0,
+            "nbr_flushes": 0,
+        }
+
+        self._queue = None
+        self._server = None
+        self._flush_task = None
+        # a single worker, so that the flushes are done one after the other
+        self._flush_executor = None
+        self._messages_fh = None
+        self._messages_writer = None
+        # the first flush writes the whole dict of data, the next ones only the stores they change
+        self._is_saved_in_full = False
+        # the dict of data at start, and the (posix received, payload) of the messages of each device flushed since, in
+        # their order of arrival, and the latest time of reception flushed: a device that receives a late message is
+        # rebuilt from these
+        self._dict_start_data = {crrt_device: dict(dict_entries) for (crrt_device, dict_entries) in self.dict_data.items()}
+        self._dict_device_messages = {crrt_device: [] for crrt_device in self.dict_start_posix}
+        self._dict_last_received_posix = {}
+
+    async def start(self, host, port):
+        """Start listening on (host, port), and flushing the queued messages to disk."""
+        self._queue = asyncio.Queue(maxsize=self.queue_max_size)
+
+        write_header = not os.path.exists(self.messages_path) or os.path.getsize(self.messages_path) == 0
+        self._messages_fh = open(self.messages_path, "a", newline="")
+        self._messages_writer = csv.DictWriter(self._messages_fh, fieldnames=_LR_ROCK7_EXPORT_FIELDS)
+        if write_header:
+            self._messages_writer.writeheader()
+            self._messages_fh.flush()
+
+        self._flush_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server
+
+    async def stop(self):
+        """Stop listening, and flush the messages still in the queue."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+
+        list_entries = []
+        while not self._queue.empty():
+            list_entries.append(self._queue.get_nowait())
+        if len(list_entries) > 0:
+            await asyncio.get_running_loop().run_in_executor(self._flush_executor, self.flush, list_entries)
+
+        # also waits for a flush that was in progress when the flush loop was cancelled
+        self._flush_executor.shutdown(wait=True)
+        self._messages_fh.close()
+
+    #--------------------------------------------------------------------------------
+    # http
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            (status, content_type, response_body) = await self._handle_request(reader)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, UnicodeDecodeError) as crrt_error:
+            (status, content_type, response_body) = (400, "text/plain", "{}\n".format(crrt_error))
+
+        list_headers = [
+            "HTTP/1.1 {} {}".format(status, _LR_HTTP_REASONS[status]),
+            "Content-Type: {}".format(content_type),
+            "Content-Length: {}".format(len(response_body.encode("utf-8"))),
+            "Connection: close",
+        ]
+        if status == 503:
+            list_headers.append("Retry-After: {}".format(_LR_RETRY_AFTER_S))
+
+        try:
+            writer.write(("\r\n".join(list_headers) + "\r\n\r\n" + response_body).encode("utf-8"))
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def _handle_request(self, reader):
+        """Read one request, and give the (status, content type, body) of the response."""
+        (method, target, _) = (await reader.readline()).decode("latin-1").split(" ", 2)
+        dict_headers = {}
+        while True:
+            crrt_line = (await reader.readline()).decode("latin-1").strip()
+            if len(crrt_line) == 0:
+                break
+            (crrt_name, _, crrt_value) = crrt_line.partition(":")
+            dict_headers[crrt_name.strip().lower()] = crrt_value.strip()
+
+        content_length = int(dict_headers.get("content-length", "0"))
+        if content_length > _LR_MAX_BODY_SIZE:
+            return (413, "text/plain", "callback too large\n")
+        body = await reader.readexactly(content_length)
+
+        if method == "GET":
+            if urllib.parse.urlsplit(target).path.rstrip("/") != "/status":
+                return (404, "text/plain", "not found\n")
+            return (200, "application/json", json.dumps(self.status(), indent=2) + "\n")
+        if method != "POST":
+            return (405, "text/plain", "method not allowed\n")
+
+        dict_fields = parse_rock7_callback(body, dict_headers.get("content-type", "application/x-www-form-urlencoded"))
+        return await self._receive_callback(dict_fields)
+
+    async def _receive_callback(self, dict_fields):
+        """Queue the message of a callback, then log it, and only then acknowledge it."""
+        if "imei" not in dict_fields or "transmit_time" not in dict_fields or "data" not in dict_fields:
+            return (400, "text/plain", "missing imei, transmit_time or data\n")
+
+        device = self.dict_imei_to_device.get(dict_fields["imei"], dict_fields["imei"])
+        posix_received = parse_transmit_time(dict_fields["transmit_time"])
+        payload = dict_fields["data"]
+        self.stats["nbr_callbacks"] += 1
+
+        # as in the exports, the empty payloads are failed transmissions
+        if device in self.dict_start_posix and len(payload) > 0:
+            try:
+                await asyncio.wait_for(self._enqueue_and_log(device, posix_received, payload, dict_fields), self.enqueue_timeout_s)
+            except asyncio.TimeoutError:
+                self.stats["nbr_refused"] += 1
+                return (503, "text/plain", "busy, try again later\n")
+        else:
+            self.stats["nbr_ignored"] += 1
+            self._log_message(device, posix_received, payload, dict_fields)
+
+        return (200, "text/plain", "OK\n")
+
+    async def _enqueue_and_log(self, device, posix_received, payload, dict_fields):
+        """Queue a message, and log it right away: nothing runs in between, so that the log is in the order of the queue."""
+        await self._queue.put((device, posix_received, payload))
+        self._log_message(device, posix_received, payload, dict_fields)
+
+    def _log_message(self, device, posix_received, payload, dict_fields):
+        self._messages_writer.writerow({
+            "Date Time (UTC)": datetime.datetime.fromtimestamp(posix_received, tz=datetime.timezone.utc).strftime(_LR_ROCK7_DATETIME_FORMAT),
+            "Device": device,
+            "Direction": "MO",
+            "Payload": payload,
+            "Approx Lat/Lng": "{},{}".format(dict_fields.get("iridium_latitude", ""), dict_fields.get("iridium_longitude", "")),
+            "Payload (Text)": "",
+            "Length (Bytes)": len(payload) // 2,
+            "Credits": "",
+        })
+        self._messages_fh.flush()
+
+    #--------------------------------------------------------------------------------
+    # flushing to disk
+
+    async def _flush_loop(self):
+        """Wait for a first message, gather the messages that come within flush_interval_s (up to flush_max_messages),
+        and flush them all in a worker thread; the next batch is only gathered once the flush is done."""
+        loop = asyncio.get_running_loop()
+        while True:
+            list_entries = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval_s
+            try:
+                while len(list_entries) < self.flush_max_messages:
+                    try:
+                        list_entries.append(await asyncio.wait_for(self._queue.get(), max(deadline - loop.time(), 0)))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # stopping: the messages already gathered are flushed all the same
+                self._flush_executor.submit(self.flush, list_entries)
+                raise
+            try:
+                await loop.run_in_executor(self._flush_executor, self.flush, list_entries)
+            except Exception as crrt_error:
+                # the messages are in the log of the callbacks all the same, and can be ingested from there
+                print("WARNING: failed to flush {} messages to {}: {!r}".format(len(list_entries), self.data_path, crrt_error))
+
+    def flush(self, list_entries):
+        """Decode the (device, posix received, payload) entries, merge their packets into the dict of data, and write it.
+        The messages are merged in the order of the ingest of the log of the callbacks by script_all_messages_to_dict.py:
+        by time of reception, and the messages of the same second in the reverse of their order of arrival, as the rows
+        of the same second of the exports (which list the newest rows first). A device that receives a message no later
+        than one already flushed, for example a callback sent again after a 503, is rebuilt from its data at start and
+        all its messages since, in this order; the data at start come first."""
+        # the devices with late messages; the messages of these are all decoded again
+        set_late_devices = set()
+        dict_nbr_previous_messages = {}
+        for (crrt_device, crrt_posix_received, crrt_payload) in list_entries:
+            if crrt_posix_received <= self._dict_last_received_posix.get(crrt_device, crrt_posix_received - 1):
+                set_late_devices.add(crrt_device)
+            dict_nbr_previous_messages.setdefault(crrt_device, len(self._dict_device_messages[crrt_device]))
+            self._dict_device_messages[crrt_device].append((crrt_posix_received, crrt_payload))
+        for (crrt_device, crrt_posix_received, _) in list_entries:
+            self._dict_last_received_posix[crrt_device] = max(crrt_posix_received, self._dict_last_received_posix.get(crrt_device, crrt_posix_received))
+
+        # the (device, posix received, payload, is flushed now) of the messages to decode, in their order of arrival
+        list_messages = [(crrt_device, crrt_posix_received, crrt_payload, True)
+                         for (crrt_device, crrt_posix_received, crrt_payload) in list_entries if crrt_device not in set_late_devices]
+        for crrt_device in sorted(set_late_devices):
+            list_messages.extend(
+                (crrt_device, crrt_posix_received, crrt_payload, crrt_index >= dict_nbr_previous_messages[crrt_device])
+                for crrt_index, (crrt_posix_received, crrt_payload) in enumerate(self._dict_device_messages[crrt_device])
+            )
+        list_messages = [list_messages[crrt_index] for crrt_index in
+                         rock7_datetimes.oldest_first_order(np.array([crrt_message[1] for crrt_message in list_messages], dtype=np.int64)).tolist()]
+
+        array_device = np.array([crrt_device for (crrt_device, _, _, _) in list_messages], dtype=str)
+        array_received_posix = np.array([crrt_posix for (_, crrt_posix, _, _) in list_messages], dtype=np.int64)
+        list_payloads = [crrt_payload for (_, _, crrt_payload, _) in list_messages]
+        array_is_flushed_now = np.array([crrt_is_new for (_, _, _, crrt_is_new) in list_messages], dtype=bool)
+        array_start_posix = np.array([self.dict_start_posix[crrt_device] for crrt_device in array_device.tolist()], dtype=np.int64)
+
+        validation_batch, dict_batches = decoder.decode_messages_batch(
+            list_payloads,
+            recover_min_posix=array_start_posix,
+            recover_max_posix=array_received_posix,
+        )
+        for crrt_index in np.flatnonzero(~validation_batch.is_valid & array_is_flushed_now).tolist():
+            print("WARNING: message from {} received {} with invalid framing: {}".format(
+                array_device[crrt_index], datetime.datetime.fromtimestamp(int(array_received_posix[crrt_index]), tz=datetime.timezone.utc),
+                decoder._BD_VALIDATION_REASONS[int(validation_batch.reason[crrt_index])]))
+
+        # the (device, entry) stores that receive new packets; only these are merged again, and written
+        list_changed_entries = []
+        for crrt_device in sorted(set(array_device.tolist())):
+            dict_base_entries = self._dict_start_data[crrt_device] if crrt_device in set_late_devices else self.dict_data[crrt_device]
+            for crrt_entry, (crrt_kind, crrt_conflict_policy) in _LR_ENTRIES.items():
+                crrt_batch = dict_batches[crrt_kind]
+                crrt_store = PacketStore.from_batch(crrt_kind, crrt_batch)
+                crrt_selector = (array_device[crrt_batch.message_index] == crrt_device) & \
+                    (crrt_store.columns["posix_timestamp"] > array_start_posix[crrt_batch.message_index])
+                crrt_new_store = crrt_store.select(crrt_selector)
+                if len(crrt_new_store) == 0:
+                    continue
+
+                self.dict_data[crrt_device][crrt_entry] = dict_base_entries[crrt_entry].merge_resolved(crrt_new_store, crrt_conflict_policy or self.conflict_policy)
+                list_changed_entries.append((crrt_device, crrt_entry))
+
+                # the resolved entry only changes from the earliest new timestamp on, as the conflicts are between
+                # packets of the same timestamp; a rebuilt device is resolved again in full
+                if crrt_entry in _LR_RESOLVED_ENTRIES:
+                    crrt_res_entry = _LR_RESOLVED_ENTRIES[crrt_entry]
+                    if crrt_res_entry in self.dict_data[crrt_device] and crrt_device not in set_late_devices:
+                        crrt_first_posix = int(np.min(crrt_new_store.columns["posix_timestamp"]))
+                        (crrt_res_head_store, _) = self.dict_data[crrt_device][crrt_res_entry].split_at_timestamp(crrt_first_posix)
+                        (_, crrt_tail_store) = self.dict_data[crrt_device][crrt_entry].split_at_timestamp(crrt_first_posix)
+                        self.dict_data[crrt_device][crrt_res_entry] = PacketStore.concatenate(
+                            [crrt_res_head_store, crrt_tail_store.resolve_timestamp_conflicts(self.conflict_policy)])
+                    else:
+                        self.dict_data[crrt_device][crrt_res_entry] = self.dict_data[crrt_device][crrt_entry].resolve_timestamp_conflicts(self.conflict_policy)
+                    list_changed_entries.append((crrt_device, crrt_res_entry))
+
+        if self._is_saved_in_full:
+            save_packet_store_entries(self.data_path, self.dict_data, list_changed_entries)
+        else:
+            save_packet_stores(self.data_path, self.dict_data)
+            self._is_saved_in_full = True
+
+        self.stats["nbr_messages_flushed"] += len(list_entries)
+        self.stats["nbr_quarantined"] += int(np.count_nonzero(~validation_batch.is_valid & array_is_flushed_now))
+        self.stats["nbr_flushes"] += 1
+
+    #--------------------------------------------------------------------------------
+    # queries
+
+    def status(self):
+        """The counters of the receiver, and for each device the number of packets and the latest packet of each entry."""
+        dict_devices = {}
+        # the flushes replace the stores from a worker thread, so iterate over copies of the dicts
+        for crrt_device, dict_entries in list(self.dict_data.items()):
+            dict_devices[crrt_device] = {}
+            for crrt_entry, crrt_store in list(dict_entries.items()):
+                dict_devices[crrt_device][crrt_entry] = {"nbr_packets": len(crrt_store)}
+                if len(crrt_store) > 0:
+                    crrt_latest = int(np.argmax(crrt_store.columns["posix_timestamp"]))
+                    dict_devices[crrt_device][crrt_entry]["latest_posix"] = int(crrt_store.columns["posix_timestamp"][crrt_latest])
+                    for crrt_field in ["latitude", "longitude", "Hs"]:
+                        if crrt_field in crrt_store.columns:
+                            dict_devices[crrt_device][crrt_entry][crrt_field] = float(crrt_store.columns[crrt_field][crrt_latest])
+
+        return {"stats": dict(self.stats), "queue_size": self._queue.qsize() if self._queue is not None else 0, "devices": dict_devices}
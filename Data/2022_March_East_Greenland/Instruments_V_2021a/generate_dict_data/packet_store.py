@@ -0,0 +1,403 @@
+"""
+A compact store for the decoded packets of one device and one kind of message.
+
+Rather than keeping a list of dataclass packets (each carrying its own copy of the
+frequencies, spectra, etc), all packets are held in contiguous typed numpy arrays,
+with one frequency axis shared by all the spectra. When per packet access is needed,
+lightweight views are handed out; these expose the same attributes as the
+GNSS_Packet / Waves_Packet / Thermistors_Packet dataclasses of the decoder, so that
+the scripts iterating over packets work the same on a store as on a list of packets.
+
+On disk, a store is a directory with one .npy file per column, which can be memory mapped:
+opening a store costs a few file headers, and only the parts of the columns that are used
+are read from disk. The dict of data of script_all_messages_to_dict.py is written as one
+such directory per device and entry, next to an index (see save_packet_stores).
+"""
+
+import datetime
+import json
+import os
+import shutil
+
+import numpy as np
+
+import decoder
+import packet_dedup
+
+#--------------------------------------------------------------------------------
+# the columns held by the store for each kind of packets, and their dtypes
+
+_PS_COLUMNS = {
+    "G": {
+        "posix_timestamp": np.int64,
+        "latitude": np.float64,
+        "longitude": np.float64,
+    },
+    "Y": {
+        "posix_timestamp": np.int64,
+        "spectrum_number": np.int64,
+        "Hs": np.float32,
+        "Tz": np.float64,
+        "Tc": np.float64,
+        "_array_max_value": np.float32,
+        "_array_uint16": np.uint16,
+    },
+    "T": {
+        "posix_timestamp": np.int64,
+        "mean_temperature": np.float32,
+        "range_temperature": np.float32,
+        "probe_id": np.int8,
+        "attitude_bin": np.int8,
+    },
+}
+# NOTE: the float32 columns hold values that were transmitted as float32, or as 12 bits fixed
+# point numbers, so these are stored exactly; the attitude is kept as transmitted, in int8
+
+_PS_FORMAT_VERSION = 1
+_PS_INDEX_FILENAME = "index.json"
+
+#--------------------------------------------------------------------------------
+# per packet views
+
+
+class _Packet_View:
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getattr__(self, name):
+        if name in _Packet_View.__slots__:
+            raise AttributeError(name)
+        if name in self._store.columns:
+            return self._store.columns[name][self._index].item()
+        raise AttributeError("{} has no attribute {}".format(type(self).__name__, name))
+
+    @property
+    def datetime_packet(self):
+        return datetime.datetime.utcfromtimestamp(self._store.columns["posix_timestamp"][self._index])
+
+    @property
+    def datetime_fix(self):
+        return self.datetime_packet
+
+    def __repr__(self):
+        return "{}(store kind {}, index {}, {})".format(type(self).__name__, self._store.kind, self._index, self.datetime_packet)
+
+
+class GNSS_Packet_View(_Packet_View):
+    __slots__ = ()
+
+    @property
+    def is_valid(self):
+        return True
+
+
+class Waves_Packet_View(_Packet_View):
+    __slots__ = ()
+
+    frequency_resolution = decoder._BD_YWAVE_PACKET_FRQ_RES
+
+    @property
+    def is_valid(self):
+        return self.Hs > 1e-5
+
+    @property
+    def _array_uint16(self):
+        return tuple(self._store.columns["_array_uint16"][self._index].tolist())
+
+    @property
+    def list_frequencies(self):
+        return self._store.frequencies.tolist()
+
+    @property
+    def list_acceleration_energies(self):
+        return self._store.acceleration_energies(self._index).tolist()
+
+    @property
+    def list_elevation_energies(self):
+        return self._store.elevation_energies(self._index).tolist()
+
+    @property
+    def wave_spectral_moments(self):
+        return self._store.wave_spectral_moments(self._index)
+
+
+class Thermistors_Packet_View(_Packet_View):
+    __slots__ = ()
+
+    @property
+    def thermistors_readings(self):
+        return [
+            decoder.Thermistors_Reading(
+                mean_temperature=crrt_mean_temperature,
+                range_temperature=crrt_range_temperature,
+                probe_id=crrt_probe_id,
+            )
+            for (crrt_mean_temperature, crrt_range_temperature, crrt_probe_id) in zip(
+                self._store.columns["mean_temperature"][self._index].tolist(),
+                self._store.columns["range_temperature"][self._index].tolist(),
+                self._store.columns["probe_id"][self._index].tolist(),
+            )
+        ]
+
+    def __getattr__(self, name):
+        if name in decoder._BD_THERM_ATTITUDE_FIELDS:
+            crrt_field_index = decoder._BD_THERM_ATTITUDE_FIELDS.index(name)
+            return self._store.columns["attitude_bin"][self._index, crrt_field_index].item() / float(decoder._BD_THERM_ATTITUDE_FLOAT_TO_INT8_FACTORS[crrt_field_index])
+        return super().__getattr__(name)
+
+
+_PS_VIEWS = {
+    "G": GNSS_Packet_View,
+    "Y": Waves_Packet_View,
+    "T": Thermistors_Packet_View,
+}
+
+#--------------------------------------------------------------------------------
+# the store itself
+
+
+class PacketStore:
+    """All the packets of one kind ('G', 'Y', or 'T') for one device, as columns."""
+
+    def __init__(self, kind, columns):
+        assert kind in _PS_COLUMNS, "unknown packet kind {}".format(kind)
+        assert set(columns.keys()) == set(_PS_COLUMNS[kind].keys())
+
+        self.kind = kind
+        self.columns = {}
+        for crrt_name, crrt_dtype in _PS_COLUMNS[kind].items():
+            self.columns[crrt_name] = np.ascontiguousarray(columns[crrt_name], dtype=crrt_dtype)
+
+        if kind == "Y":
+            self.frequencies = decoder._BD_YWAVE_FREQUENCIES
+        else:
+            self.frequencies = None
+
+        assert all(crrt_column.shape[0] == len(self) for crrt_column in self.columns.values())
+
+    @classmethod
+    def from_batch(cls, kind, batch):
+        """Build the store from one of the decoder *_Batch columnar results."""
+        columns = {}
+        for crrt_name in _PS_COLUMNS[kind]:
+            if crrt_name == "attitude_bin":
+                columns[crrt_name] = np.rint(batch.attitude * decoder._BD_THERM_ATTITUDE_FLOAT_TO_INT8_FACTORS)
+            else:
+                columns[crrt_name] = getattr(batch, crrt_name)
+        return cls(kind, columns)
+
+    @classmethod
+    def from_packets(cls, kind, list_packets):
+        """Build the store from a list of decoded dataclass packets."""
+        if kind == "G":
+            columns = {
+                "posix_timestamp": [crrt_packet.datetime_fix.replace(tzinfo=datetime.timezone.utc).timestamp() for crrt_packet in list_packets],
+                "latitude": [crrt_packet.latitude for crrt_packet in list_packets],
+                "longitude": [crrt_packet.longitude for crrt_packet in list_packets],
+            }
+        elif kind == "Y":
+            columns = {
+                "posix_timestamp": [crrt_packet.datetime_fix.replace(tzinfo=datetime.timezone.utc).timestamp() for crrt_packet in list_packets],
+                "spectrum_number": [crrt_packet.spectrum_number for crrt_packet in list_packets],
+                "Hs": [crrt_packet.Hs for crrt_packet in list_packets],
+                "Tz": [crrt_packet.Tz for crrt_packet in list_packets],
+                "Tc": [crrt_packet.Tc for crrt_packet in list_packets],
+                "_array_max_value": [crrt_packet._array_max_value for crrt_packet in list_packets],
+                "_array_uint16": np.array([crrt_packet._array_uint16 for crrt_packet in list_packets]).reshape(-1, decoder._BD_YWAVE_NBR_BINS),
+            }
+        elif kind == "T":
+            columns = {
+                "posix_timestamp": [crrt_packet.datetime_packet.replace(tzinfo=datetime.timezone.utc).timestamp() for crrt_packet in list_packets],
+                "mean_temperature": np.array([[crrt_reading.mean_temperature for crrt_reading in crrt_packet.thermistors_readings] for crrt_packet in list_packets]).reshape(-1, decoder._BD_THERM_MSG_NBR_THERMISTORS),
+                "range_temperature": np.array([[crrt_reading.range_temperature for crrt_reading in crrt_packet.thermistors_readings] for crrt_packet in list_packets]).reshape(-1, decoder._BD_THERM_MSG_NBR_THERMISTORS),
+                "probe_id": np.array([[crrt_reading.probe_id for crrt_reading in crrt_packet.thermistors_readings] for crrt_packet in list_packets]).reshape(-1, decoder._BD_THERM_MSG_NBR_THERMISTORS),
+                "attitude_bin": np.rint(np.array([[getattr(crrt_packet, crrt_field) for crrt_field in decoder._BD_THERM_ATTITUDE_FIELDS] for crrt_packet in list_packets]).reshape(-1, len(decoder._BD_THERM_ATTITUDE_FIELDS)) * decoder._BD_THERM_ATTITUDE_FLOAT_TO_INT8_FACTORS),
+            }
+        else:
+            raise RuntimeError("unknown packet kind {}".format(kind))
+
+        return cls(kind, columns)
+
+    @classmethod
+    def concatenate(cls, list_stores):
+        """A new store with the packets of all the stores (of the same kind), one store after the other."""
+        assert len(list_stores) > 0
+        kind = list_stores[0].kind
+        assert all(crrt_store.kind == kind for crrt_store in list_stores)
+        return cls(kind, {crrt_name: np.concatenate([crrt_store.columns[crrt_name] for crrt_store in list_stores]) for crrt_name in _PS_COLUMNS[kind]})
+
+    def save(self, path):
+        """Write the store as a directory holding one .npy file per column."""
+        os.makedirs(path, exist_ok=True)
+        for crrt_name, crrt_column in self.columns.items():
+            np.save(os.path.join(path, crrt_name + ".npy"), crrt_column)
+
+    @classmethod
+    def load(cls, path, kind, mmap_mode="r"):
+        """Open a store written by save; by default the columns are memory mapped (read only), use mmap_mode=None
+        to read them in memory."""
+        return cls(kind, {crrt_name: np.load(os.path.join(path, crrt_name + ".npy"), mmap_mode=mmap_mode) for crrt_name in _PS_COLUMNS[kind]})
+
+    def __len__(self):
+        return self.columns["posix_timestamp"].shape[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.select(np.arange(len(self))[index])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("packet index out of range")
+        return _PS_VIEWS[self.kind](self, index)
+
+    def __iter__(self):
+        for crrt_index in range(len(self)):
+            yield _PS_VIEWS[self.kind](self, crrt_index)
+
+    def __repr__(self):
+        return "PacketStore(kind {}, {} packets)".format(self.kind, len(self))
+
+    def select(self, selector):
+        """A new store with only the packets selected by a boolean mask or an array of indices."""
+        return PacketStore(self.kind, {crrt_name: crrt_column[selector] for (crrt_name, crrt_column) in self.columns.items()})
+
+    def sorted_by_time(self):
+        """A new store with the packets sorted by timestamp; packets with the same timestamp keep their order."""
+        return self.select(np.argsort(self.columns["posix_timestamp"], kind="stable"))
+
+    def unique_timestamps(self):
+        """A new store with only the first packet of each timestamp, sorted by timestamp."""
+        _, array_first_indexes = np.unique(self.columns["posix_timestamp"], return_index=True)
+        return self.select(array_first_indexes)
+
+    def unique_packets(self):
+        """A new store without the packets that repeat an earlier packet exactly (for example, from a message
+        transmitted twice), sorted by timestamp."""
+        if len(self) == 0:
+            return self
+        array_rows = np.concatenate(
+            [crrt_column.reshape(len(self), -1).view(np.uint8) for crrt_column in self.columns.values()],
+            axis=1
+        )
+        _, array_first_indexes = np.unique(array_rows, axis=0, return_index=True)
+        return self.select(np.sort(array_first_indexes)).sorted_by_time()
+
+    def resolve_timestamp_conflicts(self, conflict_policy="keep_first"):
+        """A new store without the repeated packets, sorted by timestamp, where the distinct packets that share a
+        timestamp are resolved following conflict_policy, as in packet_dedup.PacketDeduplicator. The order of reception
+        is the order of the packets in the store: the ingest builds the stores from the rows taken oldest first."""
+        unique_store = self.unique_packets()
+        return unique_store.select(packet_dedup.select_by_conflict_policy(
+            unique_store.columns["posix_timestamp"], conflict_policy, "packets of kind {}".format(self.kind)))
+
+    def split_at_timestamp(self, posix_timestamp):
+        """The (packets before posix_timestamp, packets from posix_timestamp on) of a store sorted by timestamp."""
+        crrt_index = int(np.searchsorted(self.columns["posix_timestamp"], posix_timestamp, side="left"))
+        return (self.select(slice(None, crrt_index)), self.select(slice(crrt_index, None)))
+
+    def merge_resolved(self, new_store, conflict_policy="keep_first"):
+        """Same as PacketStore.concatenate([self, new_store]).resolve_timestamp_conflicts(conflict_policy), for a store
+        already resolved with conflict_policy: only the packets from the earliest timestamp of new_store on are resolved
+        again together with new_store, so that adding a few recent packets does not sort the whole store."""
+        if len(new_store) == 0:
+            return self
+        (head_store, tail_store) = self.split_at_timestamp(np.min(new_store.columns["posix_timestamp"]))
+        return PacketStore.concatenate([head_store, PacketStore.concatenate([tail_store, new_store]).resolve_timestamp_conflicts(conflict_policy)])
+
+    def datetimes(self):
+        """The timestamps of all the packets, as a list of naive datetimes in UTC (as datetime_fix / datetime_packet)."""
+        return self.columns["posix_timestamp"].astype("datetime64[s]").tolist()
+
+    def acceleration_energies(self, selector=slice(None)):
+        assert self.kind == "Y"
+        return self.columns["_array_uint16"][selector] * self.columns["_array_max_value"][selector].astype(np.float64)[..., np.newaxis] / decoder._BD_YWAVE_PACKET_SCALER
+
+    def elevation_energies(self, selector=slice(None)):
+        """The elevation spectra, as a (nbr_packets, nbr_bins) matrix (or a single spectrum for an int selector)."""
+        return self.acceleration_energies(selector) / decoder._BD_YWAVE_OMEGA_4
+
+    def wave_spectral_moments(self, index):
+        crrt_elevation_energies = self.elevation_energies(index)
+        return decoder.Spectral_Moments(
+            np.trapz(crrt_elevation_energies, self.frequencies),
+            np.trapz(self.frequencies**2 * crrt_elevation_energies, self.frequencies),
+            np.trapz(self.frequencies**4 * crrt_elevation_energies, self.frequencies),
+        )
+
+#--------------------------------------------------------------------------------
+# the dict of data, on disk
+
+
+def save_packet_stores(path, dict_data):
+    """Write a dict of data (device -> entry, such as "gnss_fixes", -> PacketStore) as one directory per device and
+    entry, together with an index of the kinds of the entries. The previous content of path is replaced in one go, so
+    that the readers never see half a dict of data."""
+    path_tmp = path + ".tmp"
+    path_old = path + ".old"
+    for crrt_path in [path_tmp, path_old]:
+        if os.path.exists(crrt_path):
+            shutil.rmtree(crrt_path)
+
+    dict_index = {"version": _PS_FORMAT_VERSION, "devices": {}}
+    for crrt_device, dict_entries in dict_data.items():
+        dict_index["devices"][crrt_device] = {}
+        for crrt_entry, crrt_store in dict_entries.items():
+            crrt_store.save(os.path.join(path_tmp, crrt_device, crrt_entry))
+            dict_index["devices"][crrt_device][crrt_entry] = crrt_store.kind
+
+    os.makedirs(path_tmp, exist_ok=True)
+    with open(os.path.join(path_tmp, _PS_INDEX_FILENAME), "w") as fh:
+        json.dump(dict_index, fh, indent=2)
+
+    if os.path.exists(path):
+        os.replace(path, path_old)
+    os.replace(path_tmp, path)
+    shutil.rmtree(path_old, ignore_errors=True)
+
+
+def save_packet_store_entries(path, dict_data, list_device_entries):
+    """Write only the (device, entry) stores of list_device_entries of a dict of data, into the directory at path that
+    was written by save_packet_stores, and update its index. Each store is replaced in one go, but a reader may see
+    some of the stores before and some after the update; use save_packet_stores when all must change at once."""
+    for (crrt_device, crrt_entry) in list_device_entries:
+        crrt_path = os.path.join(path, crrt_device, crrt_entry)
+        crrt_path_tmp = crrt_path + ".tmp"
+        crrt_path_old = crrt_path + ".old"
+        for crrt_other_path in [crrt_path_tmp, crrt_path_old]:
+            if os.path.exists(crrt_other_path):
+                shutil.rmtree(crrt_other_path)
+
+        dict_data[crrt_device][crrt_entry].save(crrt_path_tmp)
+        if os.path.exists(crrt_path):
+            os.replace(crrt_path, crrt_path_old)
+        os.replace(crrt_path_tmp, crrt_path)
+        shutil.rmtree(crrt_path_old, ignore_errors=True)
+
+    with open(os.path.join(path, _PS_INDEX_FILENAME), "r") as fh:
+        dict_index = json.load(fh)
+    for (crrt_device, crrt_entry) in list_device_entries:
+        dict_index["devices"].setdefault(crrt_device, {})[crrt_entry] = dict_data[crrt_device][crrt_entry].kind
+
+    path_index_tmp = os.path.join(path, _PS_INDEX_FILENAME + ".tmp")
+    with open(path_index_tmp, "w") as fh:
+        json.dump(dict_index, fh, indent=2)
+    os.replace(path_index_tmp, os.path.join(path, _PS_INDEX_FILENAME))
+
+
+def load_packet_stores(path, mmap_mode="r"):
+    """Open a dict of data written by save_packet_stores, as device -> entry -> PacketStore; by default the columns
+    are memory mapped, so that only what is used is read from disk."""
+    with open(os.path.join(path, _PS_INDEX_FILENAME), "r") as fh:
+        dict_index = json.load(fh)
+    assert dict_index["version"] == _PS_FORMAT_VERSION, "unknown packet stores format version {}".format(dict_index["version"])
+
+    dict_data = {}
+    for crrt_device, dict_entries in dict_index["devices"].items():
+        dict_data[crrt_device] = {}
+        for crrt_entry, crrt_kind in dict_entries.items():
+            dict_data[crrt_device][crrt_entry] = PacketStore.load(os.path.join(path, crrt_device, crrt_entry), crrt_kind, mmap_mode=mmap_mode)
+
+    return dict_data
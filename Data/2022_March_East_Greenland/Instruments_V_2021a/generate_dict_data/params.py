@@ -9,3 +9,36 @@ list_instruments_and_time = [
 list_input_files = [
     "./all_messages.csv",
 ]
+
+# decode the messages in chunks spread over a pool of processes, rather than one by one; nbr_ingest_workers None
+# means one process per core, 1 means decoding in the current process
+parallel_ingest = False
+nbr_ingest_workers = None
+
+# what to do with packets that have the same timestamp as an earlier packet of the same device, but a different
+# content: "keep_first", "keep_last", "keep_all", or "raise"; see packet_dedup.py
+packet_conflict_policy = "keep_first"
+
+# only decode the rows of the Rock7 exports received since the previous run, and merge their packets into the
+# dict_all_data of that run; the watermarks of the previous run are kept in ingest_state_path. This uses the same
+# columnar decoding as parallel_ingest
+incremental_ingest = False
+ingest_state_path = "./ingest_state.json"
+
+# live ingestion of the Rock7 HTTP POST callbacks, see live_receiver.py: run script_live_receiver.py, and point the
+# Rock7 delivery to http://<host>:<port>/ (script_mock_rock7_sender.py replays the exports, for testing)
+live_receiver_host = "127.0.0.1"
+live_receiver_port = 8730
+# every callback acknowledged is appended to live_messages_path, in the format of the Rock7 exports; the packets are
+# written to live_data_path as a dict of packet stores, every live_flush_interval_s or every live_flush_max_messages
+live_messages_path = "./live_messages.csv"
+live_data_path = "./dict_live_data"
+live_flush_interval_s = 5.0
+live_flush_max_messages = 256
+# at most live_queue_max_size messages wait to be flushed; past that, the callbacks are refused (503) so that Rock7 retries
+live_queue_max_size = 1024
+# the callbacks give the imei of the devices; the devices not listed here keep their imei as name
+# NOTE: the real Rock7 callbacks carry the imei of the modem, not the device names of list_instruments_and_time,
+# so that with an empty dict all of them are ignored (counted in nbr_ignored), and only script_mock_rock7_sender.py,
+# which sends the device names as imei, gets through; fill in {"<imei>": "<device>"} for a real deployment
+dict_live_imei_to_device = {}
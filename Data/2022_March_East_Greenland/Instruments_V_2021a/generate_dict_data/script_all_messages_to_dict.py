@@ -1,28 +1,32 @@
 
 # load the messages
 # there are some repeats on bad transmissions; check for repeating message contents and ignore them
-# dump as a dict with pickle for easy re-use
+# dump as a dict of columnar packet stores, one directory per device and entry, for easy and fast re-use (see packet_store.load_packet_stores)
 
 # NOTE: this is quick and dirty stuff done in a half afternoon, would need to write a nice piece of code to to this...
 # NOTE: there is not data cleaning and validation performed; if a transmission is corrupted, will result in corrupted data: need to clean later!!
+# NOTE: the framing of the messages is validated though; messages with a broken framing are not decoded, but put in quarantine, see quarantined_messages.csv
+# NOTE: the intact packets of quarantined G and T messages are salvaged when they pass the plausibility checks of decoder.recover_packets_batch
 
-import pickle as pkl
 import decoder
+import rock7_datetimes
+from packet_store import PacketStore, save_packet_stores, load_packet_stores
+from packet_dedup import PacketDeduplicator
+from ingest_state import IngestState
 import datetime
 import os
 import time
 import csv
 import matplotlib.pyplot as plt
-from params import list_instruments_and_time, list_input_files
+import numpy as np
+from params import list_instruments_and_time, list_input_files, parallel_ingest, nbr_ingest_workers, packet_conflict_policy
+from params import incremental_ingest, ingest_state_path
 import tqdm
-from icecream import ic
 
 # make sure we use UTC in all our work
 os.environ["TZ"] = "UTC"
 time.tzset()
 
-ic.configureOutput(prefix="", outputFunction=print)
-
 # convenience list_instruments and start time dict
 list_instruments = [entry[0] for entry in list_instruments_and_time]
 dict_instruments_to_start_time = {}
@@ -38,85 +42,141 @@ for crrt_instrument in list_instruments:
     dict_data[crrt_instrument]["spectra"] = []
     dict_data[crrt_instrument]["thermistor"] = []
 
-# read all the file inputs
-list_csv_entries = []
-
-for crrt_file in list_input_files:
-    with open(crrt_file, mode='r') as fh:
-        input_dict = csv.DictReader(fh)
-        for row in input_dict:
-            list_csv_entries.append(row)
-
-# decode the data
-for crrt_dict_entry in tqdm.tqdm(list_csv_entries):
-    crrt_device = crrt_dict_entry["Device"]
-    ic(crrt_dict_entry)
-
-    # ignore messages that we send TO the instrument
-    if crrt_dict_entry["Direction"] == "MT":
-        continue
-
-    # is this an instrument we want to look at?
-    if crrt_device in list_instruments:
-
-        # ignore empty payloads, ie failed transmissions
-        if (len(crrt_dict_entry["Payload"]) > 0) and (datetime.datetime.strptime(crrt_dict_entry["Date Time (UTC)"], "%d/%b/%Y %H:%M:%S") > dict_instruments_to_start_time[crrt_device]):
-            # from when do we want to look at?
-            crrt_start_time = dict_instruments_to_start_time[crrt_device]
-
-            crrt_msg = crrt_dict_entry["Payload"]
-
-            msg_kind, msg_metadata, msg_packets = decoder.decode_message(crrt_msg)
-
-            if msg_kind == 'G':  # a GPS fix
-                for crrt_packet in msg_packets:
-                    if crrt_packet not in dict_data[crrt_device]["gnss_fixes"] and crrt_packet.datetime_fix > crrt_start_time:
-                        dict_data[crrt_device]["gnss_fixes"].append(crrt_packet)
-            elif msg_kind == 'Y':  # a wave spectrum
-                for crrt_packet in msg_packets:
-                    if crrt_packet not in dict_data[crrt_device]["spectra"] and crrt_packet.datetime_fix > crrt_start_time:
-                        dict_data[crrt_device]["spectra"].append(crrt_packet)
-            elif msg_kind == 'T':  # a thermistor packet
-                for crrt_packet in msg_packets:
-                    if crrt_packet not in dict_data[crrt_device]["thermistor"] and crrt_packet.datetime_packet > crrt_start_time:
-                        dict_data[crrt_device]["thermistor"].append(crrt_packet)
-            else:
-                raise(RuntimeError("msg kind {} unknown".format(msg_kind)))
-
-# re-order the packages
-for crrt_device in list_instruments:
-    dict_data[crrt_device]["gnss_fixes"].sort(key=lambda x: x.datetime_fix)
-    dict_data[crrt_device]["spectra"].sort(key=lambda x: x.datetime_fix)
-    dict_data[crrt_device]["thermistor"].sort(key=lambda x: x.datetime_packet)
-
-# remove duplicates in case of bad transmission
-for crrt_device in list_instruments:
-    if len(dict_data[crrt_device]["gnss_fixes"]) > 0:
-        res_fixes = [dict_data[crrt_device]["gnss_fixes"][0]]
-        for crrt_entry in dict_data[crrt_device]["gnss_fixes"]:
-            if crrt_entry.datetime_fix == res_fixes[-1].datetime_fix:
-                pass
-            else:
-                res_fixes.append(crrt_entry)
-        dict_data[crrt_device]["gnss_fixes"] = res_fixes
-
-    if len(dict_data[crrt_device]["spectra"]) > 0:
-        res_spectra = [dict_data[crrt_device]["spectra"][0]]
-        for crrt_entry in dict_data[crrt_device]["spectra"]:
-            if crrt_entry.datetime_fix == res_fixes[-1].datetime_fix:
-                pass
-            else:
-                res_spectra.append(crrt_entry)
-        dict_data[crrt_device]["res_spectra"] = res_spectra
-
-    if len(dict_data[crrt_device]["thermistor"]) > 0:
-        res_thermistor = [dict_data[crrt_device]["thermistor"][0]]
-        for crrt_entry in dict_data[crrt_device]["thermistor"]:
-            if crrt_entry.datetime_packet == res_thermistor[-1].datetime_packet:
-                pass
-            else:
-                res_thermistor.append(crrt_entry)
-        dict_data[crrt_device]["res_thermistor"] = res_thermistor
+# the messages that fail validation, as ((device, datetime received, payload), reason, nbr of recovered packets)
+list_quarantined_entries = []
+
+# in incremental mode, only the rows past the watermarks of the previous run are decoded, and merged into its data;
+# the state is only used if it was made with the same decoder and instruments, and if the data of that run are there
+ingest_signature = repr((decoder._BD_VERSION_NBR, list_instruments_and_time, packet_conflict_policy))
+ingest_state = None
+dict_previous_data = None
+if incremental_ingest and os.path.exists("./dict_all_data"):
+    ingest_state = IngestState.load(ingest_state_path, ingest_signature)
+    if ingest_state is not None:
+        dict_previous_data = load_packet_stores("./dict_all_data", mmap_mode=None)
+if ingest_state is None:
+    ingest_state = IngestState(ingest_signature)
+else:
+    print("incremental ingest: only the rows received after the watermarks in {} are decoded".format(ingest_state_path))
+
+if parallel_ingest or incremental_ingest:
+    # decode all the messages at once, in chunks spread over several processes; everything stays columnar (no packet
+    # dataclasses), and the packets of each device and kind go straight into a PacketStore
+    list_instrument_entries = []
+    for crrt_file in list_input_files:
+        with open(crrt_file, mode='r') as fh:
+            list_instrument_entries.extend(crrt_entry for crrt_entry in decoder.iter_rock7_entries(fh) if crrt_entry[0] in list_instruments)
+
+    # the reception times are parsed as a whole column, and the rows are then selected with array comparisons
+    array_entry_device = np.array([crrt_device for (crrt_device, _, _) in list_instrument_entries], dtype=str)
+    array_entry_received_posix = rock7_datetimes.parse_rock7_datetimes([crrt_rock7_datetime for (_, crrt_rock7_datetime, _) in list_instrument_entries])
+    list_entry_payloads = [crrt_payload for (_, _, crrt_payload) in list_instrument_entries]
+    array_entry_start_posix = np.zeros((len(list_instrument_entries),), dtype=np.int64)
+    for crrt_device in list_instruments:
+        array_entry_start_posix[array_entry_device == crrt_device] = int(dict_instruments_to_start_time[crrt_device].timestamp())
+
+    array_is_new = ingest_state.select_new(array_entry_device, array_entry_received_posix, list_entry_payloads)
+    array_processed_indexes = np.flatnonzero(array_is_new)
+    # the rows are decoded oldest first, so that the packets of the stores are in the order in which they were received,
+    # which is the order in which resolve_timestamp_conflicts applies the conflict policy
+    array_entry_order = rock7_datetimes.oldest_first_order(array_entry_received_posix)
+    array_selected_indexes = array_entry_order[(array_is_new & (array_entry_received_posix > array_entry_start_posix))[array_entry_order]]
+
+    array_message_device = array_entry_device[array_selected_indexes]
+    array_message_start_posix = array_entry_start_posix[array_selected_indexes]
+    array_message_received_posix = array_entry_received_posix[array_selected_indexes]
+    list_message_payloads = [list_entry_payloads[crrt_index] for crrt_index in array_selected_indexes.tolist()]
+
+    validation_batch, dict_batches = decoder.decode_messages_parallel(
+        list_message_payloads,
+        recover_min_posix=array_message_start_posix,
+        recover_max_posix=array_message_received_posix,
+        nbr_workers=nbr_ingest_workers,
+    )
+
+    # the packets recovered from the damaged messages are part of the batches
+    array_nbr_recovered_packets = np.zeros((len(list_message_payloads),), dtype=np.int64)
+    for crrt_kind in ["G", "T"]:
+        array_nbr_recovered_packets += np.bincount(dict_batches[crrt_kind].message_index, minlength=len(list_message_payloads))
+    list_quarantined_entries = [
+        (
+            (str(array_message_device[crrt_index]), datetime.datetime.fromtimestamp(int(array_message_received_posix[crrt_index])), list_message_payloads[crrt_index]),
+            decoder._BD_VALIDATION_REASONS[int(validation_batch.reason[crrt_index])],
+            int(array_nbr_recovered_packets[crrt_index]),
+        )
+        for crrt_index in np.flatnonzero(~validation_batch.is_valid).tolist()
+    ]
+
+    for crrt_device in list_instruments:
+        dict_stores = {}
+        for crrt_kind, crrt_batch in dict_batches.items():
+            crrt_store = PacketStore.from_batch(crrt_kind, crrt_batch)
+            crrt_selector = (array_message_device[crrt_batch.message_index] == crrt_device) & \
+                (crrt_store.columns["posix_timestamp"] > array_message_start_posix[crrt_batch.message_index])
+            dict_stores[crrt_kind] = crrt_store.select(crrt_selector)
+
+        # same as the serial ingest: the repeated transmissions are removed, and only one packet per timestamp is kept in
+        # gnss_fixes and res_*, following the conflict policy
+        dict_data[crrt_device]["gnss_fixes"] = dict_stores["G"].resolve_timestamp_conflicts(packet_conflict_policy)
+        dict_data[crrt_device]["spectra"] = dict_stores["Y"].resolve_timestamp_conflicts("keep_all")
+        dict_data[crrt_device]["thermistor"] = dict_stores["T"].resolve_timestamp_conflicts("keep_all")
+        if len(dict_stores["Y"]) > 0:
+            dict_data[crrt_device]["res_spectra"] = dict_stores["Y"].resolve_timestamp_conflicts(packet_conflict_policy)
+        if len(dict_stores["T"]) > 0:
+            dict_data[crrt_device]["res_thermistor"] = dict_stores["T"].resolve_timestamp_conflicts(packet_conflict_policy)
+
+else:
+    # decode the data; the rows of the files are read and put in the order of reception first, and the packets are then
+    # decoded on the fly
+    iterator_records = decoder.iter_decoded_packets(
+        list_input_files,
+        list_instruments,
+        [dict_instruments_to_start_time[crrt_instrument] for crrt_instrument in list_instruments],
+        list_quarantined=list_quarantined_entries,
+        oldest_first=True,
+    )
+
+    # the repeated packets are dropped as they come, by a hash lookup on (device, kind, timestamp, digest of the packet);
+    # the messages come oldest first, so that the conflict policy sees the packets in the order in which they were received
+    packet_deduplicator = PacketDeduplicator(conflict_policy=packet_conflict_policy)
+
+    for crrt_record in tqdm.tqdm(iterator_records):
+        packet_deduplicator.add(crrt_record.device, crrt_record.kind, decoder.packet_datetime(crrt_record.packet), crrt_record.packet)
+
+    for ((crrt_device, crrt_datetime_received, _), crrt_reason, crrt_nbr_recovered_packets) in list_quarantined_entries:
+        print("WARNING: message from {} received {} with invalid framing, put in quarantine: {}; recovered {} packets".format(crrt_device, crrt_datetime_received, crrt_reason, crrt_nbr_recovered_packets))
+
+    print("dropped {} repeated packets; {} packets conflict with an earlier packet of same timestamp, resolved with policy {}".format(
+        packet_deduplicator.nbr_repeats, len(packet_deduplicator.list_conflicts), packet_conflict_policy))
+
+    # all the distinct packets, sorted by time, and only one packet per timestamp in gnss_fixes and res_*
+    for crrt_device in list_instruments:
+        dict_data[crrt_device]["gnss_fixes"] = packet_deduplicator.packets(crrt_device, "G")
+        dict_data[crrt_device]["spectra"] = packet_deduplicator.packets(crrt_device, "Y", conflict_policy="keep_all")
+        dict_data[crrt_device]["thermistor"] = packet_deduplicator.packets(crrt_device, "T", conflict_policy="keep_all")
+        if len(dict_data[crrt_device]["spectra"]) > 0:
+            dict_data[crrt_device]["res_spectra"] = packet_deduplicator.packets(crrt_device, "Y")
+        if len(dict_data[crrt_device]["thermistor"]) > 0:
+            dict_data[crrt_device]["res_thermistor"] = packet_deduplicator.packets(crrt_device, "T")
+
+if dict_previous_data is not None:
+    # merge the packets of the new rows into the stores of the previous run; the rows of the previous run were received
+    # before the new rows, and the rows are taken oldest first, so the previous packets come first, as in a full run
+    # (a row inserted in the exports before the watermarks is not seen; script_check_incremental_ingest.py checks this)
+    dict_entry_to_kind_and_conflict_policy = {
+        "gnss_fixes": ("G", packet_conflict_policy),
+        "spectra": ("Y", "keep_all"),
+        "thermistor": ("T", "keep_all"),
+    }
+    for crrt_device in list_instruments:
+        for crrt_entry, (crrt_kind, crrt_conflict_policy) in dict_entry_to_kind_and_conflict_policy.items():
+            crrt_previous_store = dict_previous_data.get(crrt_device, {}).get(crrt_entry, PacketStore.from_packets(crrt_kind, []))
+            dict_data[crrt_device][crrt_entry] = PacketStore.concatenate([crrt_previous_store, dict_data[crrt_device][crrt_entry]]).resolve_timestamp_conflicts(crrt_conflict_policy)
+
+        for (crrt_entry, crrt_res_entry) in [("spectra", "res_spectra"), ("thermistor", "res_thermistor")]:
+            dict_data[crrt_device].pop(crrt_res_entry, None)
+            if len(dict_data[crrt_device][crrt_entry]) > 0:
+                dict_data[crrt_device][crrt_res_entry] = dict_data[crrt_device][crrt_entry].resolve_timestamp_conflicts(packet_conflict_policy)
 
 # quick and dirty visualization
 plt.figure()
@@ -138,6 +198,32 @@ for crrt_device in list_instruments:
             assert crrt_entry.datetime_fix > last_datetime
             last_datetime = crrt_entry.datetime_fix
 
+# store the packets of each device and kind as compact columnar stores, rather than as lists of packets
+dict_kind_of_entry = {
+    "gnss_fixes": "G",
+    "spectra": "Y",
+    "res_spectra": "Y",
+    "thermistor": "T",
+    "res_thermistor": "T",
+}
+for crrt_device in list_instruments:
+    for crrt_entry, crrt_kind in dict_kind_of_entry.items():
+        if crrt_entry in dict_data[crrt_device] and not isinstance(dict_data[crrt_device][crrt_entry], PacketStore):
+            dict_data[crrt_device][crrt_entry] = PacketStore.from_packets(crrt_kind, dict_data[crrt_device][crrt_entry])
+
+# dump the quarantined messages, for checking them by hand; in incremental mode, the new ones are added to the previous ones
+append_quarantined = dict_previous_data is not None and os.path.exists("./quarantined_messages.csv")
+with open("./quarantined_messages.csv", "a" if append_quarantined else "w") as fh:
+    csv_writer = csv.writer(fh)
+    if not append_quarantined:
+        csv_writer.writerow(["Date Time (UTC)", "Device", "Payload", "reason", "nbr_recovered_packets"])
+    for ((crrt_device, crrt_datetime_received, crrt_payload), crrt_reason, crrt_nbr_recovered_packets) in list_quarantined_entries:
+        csv_writer.writerow([crrt_datetime_received.strftime("%d/%b/%Y %H:%M:%S"), crrt_device, crrt_payload, crrt_reason, crrt_nbr_recovered_packets])
+
 # dump the data
-with open("./dict_all_data.pkl", 'wb') as fh:
-        pkl.dump(dict_data, fh)
+save_packet_stores("./dict_all_data", dict_data)
+
+# only now that the data are written, move the watermarks past the rows processed by this run
+if incremental_ingest:
+    ingest_state.update(array_entry_device[array_processed_indexes], array_entry_received_posix[array_processed_indexes], [list_entry_payloads[crrt_index] for crrt_index in array_processed_indexes.tolist()])
+    ingest_state.save(ingest_state_path)
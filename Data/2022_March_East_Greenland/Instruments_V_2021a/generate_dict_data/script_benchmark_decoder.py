@@ -0,0 +1,59 @@
+# micro benchmark of the decoder: per message decoding cost for each kind of message
+# uses the messages of the deployment, as found in the Rock7 export(s) listed in params.py
+
+import csv
+import timeit
+
+import decoder
+from params import list_input_files
+
+nbr_repeats = 5
+
+# ------------------------------------------------------------------------------------------
+print("***** load the payloads")
+
+dict_payloads_per_kind = {"G": [], "Y": [], "T": []}
+
+for crrt_file in list_input_files:
+    with open(crrt_file, mode='r') as fh:
+        for row in csv.DictReader(fh):
+            if row["Direction"] == "MT" or len(row["Payload"]) == 0:
+                continue
+            crrt_bin_msg = decoder.hex_to_bin_message(row["Payload"])
+            dict_payloads_per_kind[decoder.message_kind(crrt_bin_msg)].append(crrt_bin_msg)
+
+for crrt_kind, crrt_list_payloads in dict_payloads_per_kind.items():
+    print("{} messages of kind {}".format(len(crrt_list_payloads), crrt_kind))
+
+# ------------------------------------------------------------------------------------------
+print("***** per message decoding")
+
+dict_decode_message_function = {
+    "G": decoder.decode_gnss_message,
+    "Y": decoder.decode_ywave_message,
+    "T": decoder.decode_thermistors_message,
+}
+
+for crrt_kind, crrt_list_payloads in dict_payloads_per_kind.items():
+    crrt_function = dict_decode_message_function[crrt_kind]
+
+    def decode_all():
+        for crrt_bin_msg in crrt_list_payloads:
+            crrt_function(crrt_bin_msg, print_decoded=False)
+
+    crrt_time = min(timeit.repeat(decode_all, number=1, repeat=nbr_repeats))
+    print("kind {}: {:8.2f} us per message".format(crrt_kind, 1e6 * crrt_time / len(crrt_list_payloads)))
+
+# ------------------------------------------------------------------------------------------
+print("***** batch decoding")
+
+dict_decode_batch_function = {
+    "G": decoder.decode_gnss_batch,
+    "Y": decoder.decode_ywave_batch,
+    "T": decoder.decode_thermistors_batch,
+}
+
+for crrt_kind, crrt_list_payloads in dict_payloads_per_kind.items():
+    crrt_function = dict_decode_batch_function[crrt_kind]
+    crrt_time = min(timeit.repeat(lambda: crrt_function(crrt_list_payloads), number=1, repeat=nbr_repeats))
+    print("kind {}: {:8.2f} us per message".format(crrt_kind, 1e6 * crrt_time / len(crrt_list_payloads)))
@@ -0,0 +1,37 @@
+# micro benchmark of the start up cost of the pipeline: time to import the decoder and the packet store
+# each import is timed in a fresh python process, and the start up of python itself is removed
+
+import subprocess
+import sys
+import time
+
+nbr_repeats = 10
+
+list_statements = [
+    "pass",
+    "import numpy",
+    "import decoder",
+    "import packet_store",
+    "import decoder_cli",
+]
+
+
+def time_statement(statement):
+    """best wall time, over nbr_repeats fresh python processes, to run the statement"""
+    list_times = []
+    for _ in range(nbr_repeats):
+        crrt_start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True)
+        list_times.append(time.perf_counter() - crrt_start)
+    return min(list_times)
+
+
+# ------------------------------------------------------------------------------------------
+print("***** import times, python start up removed")
+
+time_baseline = time_statement(list_statements[0])
+print("python start up: {:8.1f} ms".format(1e3 * time_baseline))
+
+for crrt_statement in list_statements[1:]:
+    crrt_time = time_statement(crrt_statement)
+    print("{:20s}: {:8.1f} ms".format(crrt_statement, 1e3 * (crrt_time - time_baseline)))
@@ -0,0 +1,127 @@
+# check that the incremental ingest gives the same dict of data as a full run, also when packets conflict
+# script_all_messages_to_dict.py is run in temporary copies of this folder, on exports made from all_messages.csv:
+# - the old export is all_messages.csv without its nbr_new_rows newest rows;
+# - the new export is all_messages.csv, with an extra row (received last) that repeats a G message of the old export,
+#   with one byte of the latitude of its first packet changed, so that its packet conflicts with a packet already
+#   ingested; and in the "past row" case, also a changed copy of an old G row, at the same time as the original
+# for each case and conflict policy, the dicts of data of a full serial run, a full parallel run, and an incremental
+# run (on the old export, then on the new one) must be the same
+
+import datetime
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from packet_store import load_packet_stores
+import rock7_datetimes
+
+input_file = "./all_messages.csv"
+
+nbr_new_rows = 50
+
+# the rows inserted in the past of the watermarks are not seen by the incremental ingest, so that this case only
+# gives the same data as a full run when the packet already ingested is kept, ie with keep_first; keep_all is not
+# checked, since script_all_messages_to_dict.py asserts that the times of the gnss fixes are strictly increasing
+list_cases_and_policies = [
+    ("new row", "keep_first"),
+    ("new row", "keep_last"),
+    ("past row", "keep_first"),
+]
+
+
+def changed_g_payload(payload):
+    """the G message payload, with the lowest byte of the latitude of its first packet changed"""
+    # kind, number of packets, and the timestamp of the first packet, before its latitude
+    crrt_position = 2 + 2 + 2 + 8
+    crrt_byte = "00" if payload[crrt_position:crrt_position + 2] != "00" else "01"
+    return payload[:crrt_position] + crrt_byte + payload[crrt_position + 2:]
+
+
+def run_ingest(folder, dict_params, list_export_lines):
+    """write the export and the params in folder, and run script_all_messages_to_dict.py there"""
+    with open(os.path.join(folder, "all_messages.csv"), "w") as fh:
+        fh.write("\n".join(list_export_lines) + "\n")
+
+    with open(os.path.join(folder, "params.py"), "r") as fh:
+        params = fh.read()
+    for crrt_name, crrt_value in dict_params.items():
+        params = re.sub(r"^{} = .*$".format(crrt_name), "{} = {!r}".format(crrt_name, crrt_value), params, flags=re.M)
+    with open(os.path.join(folder, "params.py"), "w") as fh:
+        fh.write(params)
+
+    subprocess.run([sys.executable, "script_all_messages_to_dict.py"], cwd=folder, check=True,
+                   stdout=subprocess.DEVNULL, env=dict(os.environ, MPLBACKEND="Agg"))
+
+    return load_packet_stores(os.path.join(folder, "dict_all_data"), mmap_mode=None)
+
+
+def assert_same_data(dict_data_1, dict_data_2, description):
+    assert dict_data_1.keys() == dict_data_2.keys(), description
+    for crrt_device in dict_data_1:
+        assert dict_data_1[crrt_device].keys() == dict_data_2[crrt_device].keys(), description
+        for crrt_entry, crrt_store in dict_data_1[crrt_device].items():
+            for crrt_name, crrt_column in crrt_store.columns.items():
+                assert np.array_equal(crrt_column, dict_data_2[crrt_device][crrt_entry].columns[crrt_name]), \
+                    "{}: {} {} {} differ".format(description, crrt_device, crrt_entry, crrt_name)
+
+
+# ------------------------------------------------------------------------------------------
+print("***** make the exports")
+
+with open(input_file, "r") as fh:
+    list_lines = fh.read().splitlines()
+(header_line, list_rows) = (list_lines[0], [crrt_line for crrt_line in list_lines[1:] if len(crrt_line) > 0])
+
+list_old_rows = list_rows[nbr_new_rows:]
+list_old_g_rows = [crrt_row for crrt_row in list_old_rows if crrt_row.split(",")[3].startswith("47")]
+conflicting_row = list_old_g_rows[0]
+(conflicting_datetime, conflicting_device, _, conflicting_payload) = conflicting_row.split(",")[:4]
+newest_posix = int(rock7_datetimes.parse_rock7_datetimes([list_rows[0].split(",")[0]])[0])
+
+# received a minute after the newest row
+new_row = ",".join(
+    [datetime.datetime.fromtimestamp(newest_posix + 60, tz=datetime.timezone.utc).strftime("%d/%b/%Y %H:%M:%S"),
+     conflicting_device, "MO", changed_g_payload(conflicting_payload)]
+    + conflicting_row.split(",")[4:]
+)
+# received at the same time as the original row, and listed before it, as a newer row
+past_row = conflicting_row.replace(conflicting_payload, changed_g_payload(conflicting_payload))
+
+dict_new_exports = {
+    "new row": [header_line, new_row] + list_rows,
+    "past row": [header_line, past_row] + list_rows,
+}
+print("{} old rows, {} new rows; conflicting G message from {} received {}".format(
+    len(list_old_rows), nbr_new_rows, conflicting_device, conflicting_datetime))
+
+# ------------------------------------------------------------------------------------------
+print("***** compare the full and incremental ingests")
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for (crrt_case, crrt_conflict_policy) in list_cases_and_policies:
+        dict_runs = {}
+        for crrt_run in ["serial", "parallel", "incremental"]:
+            crrt_folder = os.path.join(tmp_dir, "{}_{}_{}".format(crrt_case.replace(" ", "_"), crrt_conflict_policy, crrt_run))
+            shutil.copytree(".", crrt_folder, ignore=shutil.ignore_patterns("dict_*", "ingest_state.json", "quarantined_messages.csv", "live_*", "*.png", "*.pdf"))
+            dict_params = {
+                "packet_conflict_policy": crrt_conflict_policy,
+                "parallel_ingest": crrt_run == "parallel",
+                "incremental_ingest": crrt_run == "incremental",
+                "nbr_ingest_workers": 2,
+            }
+            if crrt_run == "incremental":
+                run_ingest(crrt_folder, dict_params, [header_line] + list_old_rows)
+            dict_runs[crrt_run] = run_ingest(crrt_folder, dict_params, dict_new_exports[crrt_case])
+
+        assert_same_data(dict_runs["serial"], dict_runs["parallel"], "{}, {}: serial and parallel".format(crrt_case, crrt_conflict_policy))
+        assert_same_data(dict_runs["serial"], dict_runs["incremental"], "{}, {}: full and incremental".format(crrt_case, crrt_conflict_policy))
+
+        crrt_store = dict_runs["incremental"][conflicting_device]["gnss_fixes"]
+        crrt_conflicting_posix = int(np.frombuffer(bytes.fromhex(conflicting_payload[6:14]), dtype="<u4")[0])
+        print("{:8s} {:10s}: identical; latitudes at the conflicting timestamp: {}".format(
+            crrt_case, crrt_conflict_policy, crrt_store.columns["latitude"][crrt_store.columns["posix_timestamp"] == crrt_conflicting_posix].tolist()))
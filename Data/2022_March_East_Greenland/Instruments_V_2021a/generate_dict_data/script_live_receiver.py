@@ -0,0 +1,44 @@
+# receive the messages live, from the HTTP POST callbacks of Rock7, rather than from the csv exports
+# the packets are written to live_data_path every few seconds; open it with packet_store.load_packet_stores
+# GET /status on the receiver gives its counters and the latest packets of each device
+# stop with ctrl-c (or SIGTERM): the messages still queued are flushed before exiting
+
+import asyncio
+import os
+import signal
+import time
+
+from live_receiver import LiveReceiver
+from params import list_instruments_and_time, packet_conflict_policy
+from params import live_receiver_host, live_receiver_port, live_messages_path, live_data_path
+from params import live_flush_interval_s, live_flush_max_messages, live_queue_max_size, dict_live_imei_to_device
+
+# make sure we use UTC in all our work
+os.environ["TZ"] = "UTC"
+time.tzset()
+
+
+async def main():
+    live_receiver = LiveReceiver(
+        list_instruments_and_time,
+        live_messages_path,
+        live_data_path,
+        conflict_policy=packet_conflict_policy,
+        dict_imei_to_device=dict_live_imei_to_device,
+        queue_max_size=live_queue_max_size,
+        flush_interval_s=live_flush_interval_s,
+        flush_max_messages=live_flush_max_messages,
+    )
+    await live_receiver.start(live_receiver_host, live_receiver_port)
+    print("receiving the Rock7 callbacks on http://{}:{}/".format(live_receiver_host, live_receiver_port))
+
+    event_stop = asyncio.Event()
+    for crrt_signal in [signal.SIGINT, signal.SIGTERM]:
+        asyncio.get_running_loop().add_signal_handler(crrt_signal, event_stop.set)
+    await event_stop.wait()
+
+    await live_receiver.stop()
+    print("stopped; {}".format(live_receiver.stats))
+
+
+asyncio.run(main())
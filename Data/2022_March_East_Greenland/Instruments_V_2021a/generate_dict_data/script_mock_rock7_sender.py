@@ -0,0 +1,57 @@
+# a local stand-in for Rock7, to test the live receiver (script_live_receiver.py) without any instrument
+# replays the rows of the Rock7 export(s) listed in params.py, oldest first, as Rock7 HTTP POST callbacks
+# the callbacks refused by the receiver (503, when its queue is full) are sent again, as Rock7 would do
+
+import csv
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from live_receiver import rock7_row_to_callback
+from params import list_input_files, live_receiver_host, live_receiver_port, dict_live_imei_to_device
+
+# the pace of the replay; None to send as fast as the receiver accepts
+messages_per_second = 20.0
+# the number of messages to replay; None for all of them
+max_nbr_messages = None
+# how long to wait before sending again a refused callback; Rock7 waits much longer, but this is a test
+retry_delay_s = 1.0
+
+url_receiver = "http://{}:{}/".format(live_receiver_host, live_receiver_port)
+dict_device_to_imei = {crrt_device: crrt_imei for (crrt_imei, crrt_device) in dict_live_imei_to_device.items()}
+
+list_rows = []
+for crrt_file in list_input_files:
+    with open(crrt_file, mode='r') as fh:
+        list_rows.extend(row for row in csv.DictReader(fh) if row["Direction"] == "MO")
+# the exports are newest first
+list_rows.reverse()
+if max_nbr_messages is not None:
+    list_rows = list_rows[:max_nbr_messages]
+
+dict_device_momsn = {}
+nbr_retries = 0
+time_start = time.time()
+
+for crrt_index, crrt_row in enumerate(list_rows):
+    crrt_device = crrt_row["Device"]
+    dict_device_momsn[crrt_device] = dict_device_momsn.get(crrt_device, 0) + 1
+    crrt_callback = rock7_row_to_callback(crrt_row, dict_device_to_imei.get(crrt_device, crrt_device), dict_device_momsn[crrt_device])
+    crrt_request = urllib.request.Request(url_receiver, data=urllib.parse.urlencode(crrt_callback).encode("utf-8"), method="POST")
+
+    if messages_per_second is not None:
+        time.sleep(max(time_start + crrt_index / messages_per_second - time.time(), 0))
+
+    while True:
+        try:
+            with urllib.request.urlopen(crrt_request) as response:
+                response.read()
+            break
+        except urllib.error.HTTPError as crrt_error:
+            if crrt_error.code != 503:
+                raise
+            nbr_retries += 1
+            time.sleep(retry_delay_s)
+
+print("sent {} callbacks to {} in {:.1f} s, {} refused and sent again".format(len(list_rows), url_receiver, time.time() - time_start, nbr_retries))
@@ -1,5 +1,4 @@
 import math
-import pickle as pkl
 import matplotlib.pyplot as plt
 import datetime
 import numpy as np
@@ -10,6 +9,7 @@ import os
 import time
 
 from icecream import ic
+from packet_store import load_packet_stores
 
 # ------------------------------------------------------------------------------------------
 print("***** Put the interpreter in UTC, to make sure no TZ issues")
@@ -26,8 +26,7 @@ list_colors.append("k")
 dict_bad_data = {
 }
 
-with open("./dict_all_data.pkl", "rb") as fh:
-    dict_data_each_logger = pkl.load(fh)
+dict_data_each_logger = load_packet_stores("./dict_all_data")
 
 list_instruments_with_thermistor = []
 instruments_blacklist = []
@@ -1,5 +1,3 @@
-import pickle as pkl
-
 import datetime
 from more_itertools import first
 
@@ -16,14 +14,14 @@ from cartopy.mpl.gridliner import LONGITUDE_FORMATTER, LATITUDE_FORMATTER
 from utils import sliding_filter_nsigma
 
 from utils import get_index_of_first_list_elem_greater_starting_smaller
+from packet_store import load_packet_stores
 
 # ------------------------------------------------------------------------------------------
 # a few quick and dirty utils
 
 # ------------------------------------------------------------------------------------------
 # load all trajectory data
-with open("./dict_all_data.pkl", "rb") as fh:
-    dict_data_each_logger = pkl.load(fh)
+dict_data_each_logger = load_packet_stores("./dict_all_data")
 
 # ------------------------------------------------------------------------------------------
 # show the trajectories on the map
@@ -61,9 +59,9 @@ list_colors.append("k")
 # plot the trajectories
 for ind, crrt_instrument in enumerate(dict_data_each_logger.keys()):
     # get the data
-    list_datetime = [crrt_fix.datetime_fix for crrt_fix in dict_data_each_logger[crrt_instrument]["gnss_fixes"]]
-    list_latitude = [crrt_fix.latitude for crrt_fix in dict_data_each_logger[crrt_instrument]["gnss_fixes"]]
-    list_longitude = [crrt_fix.longitude for crrt_fix in dict_data_each_logger[crrt_instrument]["gnss_fixes"]]
+    list_datetime = dict_data_each_logger[crrt_instrument]["gnss_fixes"].datetimes()
+    list_latitude = dict_data_each_logger[crrt_instrument]["gnss_fixes"].columns["latitude"].tolist()
+    list_longitude = dict_data_each_logger[crrt_instrument]["gnss_fixes"].columns["longitude"].tolist()
 
     np_latitude = sliding_filter_nsigma(np.array(list_latitude))
     np_longitude = sliding_filter_nsigma(np.array(list_longitude))
@@ -79,9 +77,9 @@ for ind, crrt_instrument in enumerate(dict_data_each_logger.keys()):
 
 for ind, crrt_instrument in enumerate(dict_data_each_logger.keys()):
     # get the data
-    list_datetime = [crrt_fix.datetime_fix for crrt_fix in dict_data_each_logger[crrt_instrument]["gnss_fixes"]]
-    list_latitude = [crrt_fix.latitude for crrt_fix in dict_data_each_logger[crrt_instrument]["gnss_fixes"]]
-    list_longitude = [crrt_fix.longitude for crrt_fix in dict_data_each_logger[crrt_instrument]["gnss_fixes"]]
+    list_datetime = dict_data_each_logger[crrt_instrument]["gnss_fixes"].datetimes()
+    list_latitude = dict_data_each_logger[crrt_instrument]["gnss_fixes"].columns["latitude"].tolist()
+    list_longitude = dict_data_each_logger[crrt_instrument]["gnss_fixes"].columns["longitude"].tolist()
 
     # get instrument ID
     ID = crrt_instrument
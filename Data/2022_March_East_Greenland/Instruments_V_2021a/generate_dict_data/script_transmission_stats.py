@@ -0,0 +1,46 @@
+# transmission statistics of all the devices found in the Rock7 export(s) listed in params.py: delivery latency,
+# packets lost (from the counters carried by the messages), and repeated messages / packets
+# written as two small tables: transmission_stats.csv (per device and kind), and transmission_stats_daily.csv (per
+# device, kind, and day of reception); see transmission_stats.py for the definitions
+
+import os
+import time
+
+import numpy as np
+
+import decoder
+import rock7_datetimes
+import transmission_stats
+from params import list_input_files
+
+# make sure we use UTC in all our work
+os.environ["TZ"] = "UTC"
+time.tzset()
+
+list_entries = []
+for crrt_file in list_input_files:
+    with open(crrt_file, mode='r') as fh:
+        list_entries.extend(decoder.iter_rock7_entries(fh))
+
+array_devices = np.array([crrt_device for (crrt_device, _, _) in list_entries], dtype=str)
+array_received_posix = rock7_datetimes.parse_rock7_datetimes([crrt_rock7_datetime for (_, crrt_rock7_datetime, _) in list_entries])
+list_payloads = [crrt_payload for (_, _, crrt_payload) in list_entries]
+
+dict_message_stats = transmission_stats.compute_message_stats(array_devices, array_received_posix, list_payloads)
+
+dict_summary = transmission_stats.summarize_message_stats(dict_message_stats)
+transmission_stats.write_table("./transmission_stats.csv", dict_summary)
+transmission_stats.write_table("./transmission_stats_daily.csv", transmission_stats.summarize_message_stats(dict_message_stats, per_day=True))
+
+for crrt_index in range(dict_summary["device"].shape[0]):
+    print("{} {}: {} messages ({} repeated, {} invalid), median latency {} s, {} packets lost ({:.1%}), {} counter resets".format(
+        dict_summary["device"][crrt_index],
+        dict_summary["kind"][crrt_index],
+        dict_summary["nbr_messages"][crrt_index],
+        dict_summary["nbr_repeated_messages"][crrt_index],
+        dict_summary["nbr_invalid_messages"][crrt_index],
+        dict_summary["latency_median_s"][crrt_index],
+        dict_summary["nbr_lost_packets"][crrt_index],
+        dict_summary["loss_rate"][crrt_index],
+        dict_summary["nbr_counter_resets"][crrt_index],
+    ))
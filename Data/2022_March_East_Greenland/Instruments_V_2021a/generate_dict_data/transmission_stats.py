@@ -0,0 +1,288 @@
+"""
+Transmission statistics of the Iridium messages: delivery latency, lost messages, and repeats.
+
+Each row of the Rock7 exports gives the time at which Iridium received the message, and the
+packets in the message carry the time at which they were measured. Each message also carries a
+counter of the packets produced since boot:
+- 'G' messages: nbr_gnss_fixes, one byte, counting the fixes (so modulo 256);
+- 'T' messages: nbr_thermistors_measurements, one byte, counting the thermistors packets (so modulo 256);
+- 'Y' messages: the spectrum_number of their single packet.
+When no message is lost, the counter of a message is the counter of the previous message plus the
+number of packets in the message; a larger step means that the packets in between were never
+received. A counter that goes back while being consistent with a fresh start is a reboot of the
+instrument. The 'G' and 'T' messages hold the backlog of the packets not sent yet, and are sent in
+the order in which they are made, so they are followed in the order of reception; the 'Y' messages
+can be received out of order, and are followed in the order of measurement of their packet. A
+message that holds more packets than its step (for example, the end of a backlog after a message
+that was full) makes up for the apparent loss at the previous message: the gaps are summed.
+
+All the statistics are computed on columns (one entry per message), and summarized per device and
+kind, optionally per day, into small tables of columns that can be written as csv.
+"""
+
+import csv
+
+import numpy as np
+
+import decoder
+
+#--------------------------------------------------------------------------------
+# a few module constants
+
+_TS_KINDS = ["G", "Y", "T"]
+# the modulus of the counter carried by the messages of each kind; None for a counter that does not wrap
+_TS_COUNTER_MODULUS = {"G": 256, "Y": None, "T": 256}
+# follow the counter of each kind in the order of reception of the messages, rather than of measurement of the packets
+_TS_FOLLOW_RECEPTION_ORDER = {"G": True, "Y": False, "T": True}
+# the quantiles of the latency in the summary tables, as (column suffix, quantile)
+_TS_LATENCY_QUANTILES = [("min", 0.0), ("median", 0.5), ("p90", 0.9), ("max", 1.0)]
+_TS_SECONDS_PER_DAY = 86400
+
+# the classification of the step of the counter from one message to the next one of the same device and kind
+_TS_STEP_FIRST = 0  # first message of the device and kind, nothing to compare with
+_TS_STEP_CONTINUOUS = 1  # the counter moved by at least the packets of the message; any extra are lost packets
+_TS_STEP_RESET = 2  # the counter went back, the instrument rebooted
+_TS_STEP_ANOMALY = 3  # the counter moved by less than the packets of the message (end of a backlog, or out of order)
+
+#--------------------------------------------------------------------------------
+# per message columns
+
+
+def message_counters_batch(payloads, validation_batch, dict_batches):
+    """The counter, number of packets, and newest packet posix timestamp of each message, from the result of
+    decoder.decode_messages_batch on payloads; -1 for the messages that are not valid."""
+    array_counter = np.full((len(payloads),), -1, dtype=np.int64)
+    array_nbr_packets = np.zeros((len(payloads),), dtype=np.int64)
+    array_newest_posix = np.full((len(payloads),), -1, dtype=np.int64)
+
+    for crrt_kind in _TS_KINDS:
+        crrt_batch = dict_batches[crrt_kind]
+        array_nbr_packets += np.bincount(crrt_batch.message_index, minlength=len(payloads))
+        np.maximum.at(array_newest_posix, crrt_batch.message_index, crrt_batch.posix_timestamp)
+
+    # the spectrum number is decoded with the Y packets; the one byte counter of G and T messages is the second
+    # byte of the message, read here from the hex digits of all the valid messages at once
+    array_counter[dict_batches["Y"].message_index] = dict_batches["Y"].spectrum_number
+
+    array_gt_indexes = np.flatnonzero(validation_batch.is_valid & np.isin(validation_batch.kind, ["G", "T"]))
+    if array_gt_indexes.shape[0] > 0:
+        array_hex = np.array([payloads[crrt_index][2:4] for crrt_index in array_gt_indexes.tolist()], dtype="U2")
+        array_digits = array_hex.view(np.uint32).reshape(-1, 2).astype(np.int64)
+        array_digits = np.where(array_digits >= ord("a"), array_digits - ord("a") + 10, np.where(array_digits >= ord("A"), array_digits - ord("A") + 10, array_digits - ord("0")))
+        array_counter[array_gt_indexes] = array_digits[:, 0] * 16 + array_digits[:, 1]
+
+    array_counter[~validation_batch.is_valid] = -1
+
+    return array_counter, array_nbr_packets, array_newest_posix
+
+
+def classify_counter_steps(array_group, array_counter, array_nbr_packets, modulus):
+    """For messages sorted by group (device) and then in the order in which they were made, classify the step of the
+    counter from the previous message of the same group (see the _TS_STEP_* codes), and give the gap: the number of
+    packets counted in between but not in the message, which is negative for the anomalies. After a reset, the gap
+    is the number of packets counted since the reboot but not in the message."""
+    array_step = np.full(array_counter.shape, _TS_STEP_FIRST, dtype=np.int8)
+    array_gap = np.zeros(array_counter.shape, dtype=np.int64)
+    if array_counter.shape[0] < 2:
+        return array_step, array_gap
+
+    array_previous = array_counter[:-1]
+    array_crrt = array_counter[1:]
+    array_nbr = array_nbr_packets[1:]
+    array_has_previous = array_group[1:] == array_group[:-1]
+
+    array_delta = array_crrt - array_previous
+    if modulus is not None:
+        array_delta %= modulus
+    array_crrt_gap = array_delta - array_nbr
+
+    # a wrap of the counter that exactly follows on the previous message is not a reset
+    array_went_back = (array_crrt < array_previous) & (array_crrt_gap != 0)
+    if modulus is None:
+        array_is_reset = array_went_back
+        array_is_continuous = ~array_is_reset & (array_crrt_gap >= 0)
+    else:
+        # a large step modulo the counter size is more likely a reboot than hundreds of lost packets
+        array_is_reset = array_went_back & ((array_crrt <= array_nbr) | (array_crrt_gap >= modulus // 2))
+        array_is_continuous = ~array_is_reset & (array_crrt_gap >= 0) & (array_crrt_gap < modulus // 2)
+        # a step of more than half the counter size that does not go back can not be told apart from one going back
+        array_crrt_gap = np.where(array_crrt_gap >= modulus // 2, array_crrt_gap - modulus, array_crrt_gap)
+
+    array_crrt_step = np.full(array_crrt.shape, _TS_STEP_ANOMALY, dtype=np.int8)
+    array_crrt_step[array_is_continuous] = _TS_STEP_CONTINUOUS
+    array_crrt_step[array_is_reset] = _TS_STEP_RESET
+    array_crrt_step[~array_has_previous] = _TS_STEP_FIRST
+
+    array_crrt_gap[array_is_reset] = np.maximum(array_crrt - array_nbr, 0)[array_is_reset]
+    array_crrt_gap[~array_has_previous] = 0
+
+    array_step[1:] = array_crrt_step
+    array_gap[1:] = array_crrt_gap
+
+    return array_step, array_gap
+
+
+def compute_message_stats(array_devices, array_received_posix, payloads):
+    """The per message columns of the transmission statistics, for the messages given as columns (device, posix
+    timestamp of reception, hex payload), in any order. The messages are decoded with decoder.decode_messages_batch.
+    Returns a dict of columns, one entry per message, in the order given:
+    - "device", "kind", "received_posix", "is_valid", "counter", "nbr_packets", "newest_packet_posix";
+    - "is_repeat": the same payload was already received from the device (the first reception is not a repeat);
+    - "latency_s": time of reception minus time of the newest packet in the message;
+    - "nbr_repeated_packets": the packets of the message with the same timestamp as a packet of an earlier message;
+    - "counter_step" (see the _TS_STEP_* codes) and "counter_gap" (see classify_counter_steps), computed over the valid
+    messages that are not repeats, for each device and kind in the order given by _TS_FOLLOW_RECEPTION_ORDER."""
+    array_devices = np.asarray(array_devices, dtype=str)
+    array_received_posix = np.asarray(array_received_posix, dtype=np.int64)
+    nbr_messages = len(payloads)
+    assert array_devices.shape == (nbr_messages,) and array_received_posix.shape == (nbr_messages,)
+
+    validation_batch, dict_batches = decoder.decode_messages_batch(payloads)
+    (array_counter, array_nbr_packets, array_newest_posix) = message_counters_batch(payloads, validation_batch, dict_batches)
+
+    # the rank of each message in the order of reception, and the repeats of a (device, payload) received before
+    array_reception_order = np.lexsort((np.arange(nbr_messages), array_received_posix))
+    array_reception_rank = np.empty((nbr_messages,), dtype=np.int64)
+    array_reception_rank[array_reception_order] = np.arange(nbr_messages)
+
+    array_payloads = np.asarray(payloads, dtype=str)
+    (_, array_message_key) = np.unique(np.char.add(np.char.add(array_devices, ","), array_payloads), return_inverse=True)
+    array_first_rank = np.full((array_message_key.max() + 1 if nbr_messages > 0 else 0,), nbr_messages, dtype=np.int64)
+    np.minimum.at(array_first_rank, array_message_key, array_reception_rank)
+    array_is_repeat = array_reception_rank > array_first_rank[array_message_key]
+
+    array_is_used = validation_batch.is_valid & ~array_is_repeat
+
+    # the packets with the timestamp of a packet already received from the same device, in an earlier message
+    array_nbr_repeated_packets = np.zeros((nbr_messages,), dtype=np.int64)
+    (_, array_device_index) = np.unique(array_devices, return_inverse=True)
+    for crrt_kind in _TS_KINDS:
+        crrt_batch = dict_batches[crrt_kind]
+        crrt_used = array_is_used[crrt_batch.message_index]
+        crrt_message_index = crrt_batch.message_index[crrt_used]
+        crrt_posix = crrt_batch.posix_timestamp[crrt_used]
+        crrt_order = np.lexsort((array_reception_rank[crrt_message_index], crrt_posix, array_device_index[crrt_message_index]))
+        crrt_sorted_device = array_device_index[crrt_message_index][crrt_order]
+        crrt_sorted_posix = crrt_posix[crrt_order]
+        crrt_is_repeated = np.zeros(crrt_order.shape, dtype=bool)
+        crrt_is_repeated[1:] = (crrt_sorted_device[1:] == crrt_sorted_device[:-1]) & (crrt_sorted_posix[1:] == crrt_sorted_posix[:-1])
+        array_nbr_repeated_packets += np.bincount(crrt_message_index[crrt_order][crrt_is_repeated], minlength=nbr_messages)
+
+    # the steps of the counters, in the order in which the messages of each device and kind were made
+    array_counter_step = np.full((nbr_messages,), _TS_STEP_FIRST, dtype=np.int8)
+    array_counter_gap = np.zeros((nbr_messages,), dtype=np.int64)
+    for crrt_kind in _TS_KINDS:
+        crrt_indexes = np.flatnonzero(array_is_used & (validation_batch.kind == crrt_kind))
+        if _TS_FOLLOW_RECEPTION_ORDER[crrt_kind]:
+            crrt_order_keys = (array_reception_rank[crrt_indexes], array_device_index[crrt_indexes])
+        else:
+            crrt_order_keys = (array_reception_rank[crrt_indexes], array_counter[crrt_indexes], array_newest_posix[crrt_indexes], array_device_index[crrt_indexes])
+        crrt_indexes = crrt_indexes[np.lexsort(crrt_order_keys)]
+        (crrt_step, crrt_gap) = classify_counter_steps(
+            array_device_index[crrt_indexes],
+            array_counter[crrt_indexes],
+            array_nbr_packets[crrt_indexes],
+            _TS_COUNTER_MODULUS[crrt_kind],
+        )
+        array_counter_step[crrt_indexes] = crrt_step
+        array_counter_gap[crrt_indexes] = crrt_gap
+
+    dict_message_stats = {
+        "device": array_devices,
+        "kind": validation_batch.kind,
+        "received_posix": array_received_posix,
+        "is_valid": validation_batch.is_valid,
+        "counter": array_counter,
+        "nbr_packets": array_nbr_packets,
+        "newest_packet_posix": array_newest_posix,
+        "is_repeat": array_is_repeat,
+        "latency_s": np.where(validation_batch.is_valid, array_received_posix - array_newest_posix, 0),
+        "nbr_repeated_packets": array_nbr_repeated_packets,
+        "counter_step": array_counter_step,
+        "counter_gap": array_counter_gap,
+    }
+
+    return dict_message_stats
+
+#--------------------------------------------------------------------------------
+# summary tables
+
+
+def grouped_quantiles(array_group, nbr_groups, array_values, quantile):
+    """The quantile (with linear interpolation, as np.quantile) of the values of each group, for all the groups at
+    once; NaN for the groups without values."""
+    array_order = np.lexsort((array_values, array_group))
+    array_sorted_values = array_values[array_order].astype(np.float64)
+    array_counts = np.bincount(array_group, minlength=nbr_groups)
+    array_starts = np.cumsum(array_counts) - array_counts
+
+    array_has_values = array_counts > 0
+    array_position = array_starts + quantile * np.maximum(array_counts - 1, 0)
+    array_below = np.floor(array_position).astype(np.int64)
+    array_above = np.minimum(array_below + 1, array_starts + array_counts - 1)
+    array_fraction = array_position - array_below
+
+    array_quantiles = np.full((nbr_groups,), np.nan)
+    array_quantiles[array_has_values] = (
+        array_sorted_values[array_below[array_has_values]] * (1.0 - array_fraction[array_has_values]) +
+        array_sorted_values[array_above[array_has_values]] * array_fraction[array_has_values]
+    )
+    return array_quantiles
+
+
+def summarize_message_stats(dict_message_stats, per_day=False):
+    """Summarize the per message columns of compute_message_stats per device and kind (and per day of reception, if
+    per_day), into a dict of columns with one entry per group, sorted by device, kind (and day). Only the messages of
+    the kinds in _TS_KINDS are summarized; the latency quantiles are over the valid messages that are not repeats.
+    The packets lost are the sum of the counter gaps of the group (0 if negative), and the loss rate is the fraction
+    of the packets produced (received or lost) that were lost."""
+    array_is_known_kind = np.isin(dict_message_stats["kind"], _TS_KINDS)
+    dict_stats = {crrt_name: crrt_column[array_is_known_kind] for (crrt_name, crrt_column) in dict_message_stats.items()}
+
+    list_keys = [dict_stats["device"], dict_stats["kind"]]
+    if per_day:
+        list_keys.append((dict_stats["received_posix"] // _TS_SECONDS_PER_DAY).astype("datetime64[D]").astype(str))
+    array_keys = np.array(list(zip(*[crrt_key.tolist() for crrt_key in list_keys])), dtype=str).reshape(-1, len(list_keys))
+    (array_unique_keys, array_group) = np.unique(array_keys, axis=0, return_inverse=True)
+    array_group = array_group.reshape(-1)
+    nbr_groups = array_unique_keys.shape[0]
+
+    def group_sum(array_values):
+        return np.bincount(array_group, weights=array_values, minlength=nbr_groups).astype(np.int64)
+
+    array_is_used = dict_stats["is_valid"] & ~dict_stats["is_repeat"]
+    array_nbr_packets = group_sum(np.where(array_is_used, dict_stats["nbr_packets"], 0))
+    array_nbr_lost_packets = np.maximum(group_sum(dict_stats["counter_gap"]), 0)
+    array_nbr_messages = group_sum(np.ones(array_group.shape))
+    array_nbr_repeats = group_sum(dict_stats["is_repeat"])
+
+    dict_summary = {"device": array_unique_keys[:, 0], "kind": array_unique_keys[:, 1]}
+    if per_day:
+        dict_summary["day"] = array_unique_keys[:, 2]
+    dict_summary["nbr_messages"] = array_nbr_messages
+    dict_summary["nbr_invalid_messages"] = group_sum(~dict_stats["is_valid"])
+    dict_summary["nbr_repeated_messages"] = array_nbr_repeats
+    dict_summary["repeat_rate"] = array_nbr_repeats / np.maximum(array_nbr_messages, 1)
+    dict_summary["nbr_packets"] = array_nbr_packets
+    dict_summary["nbr_repeated_packets"] = group_sum(dict_stats["nbr_repeated_packets"])
+
+    for (crrt_suffix, crrt_quantile) in _TS_LATENCY_QUANTILES:
+        dict_summary["latency_{}_s".format(crrt_suffix)] = grouped_quantiles(
+            array_group[array_is_used], nbr_groups, dict_stats["latency_s"][array_is_used], crrt_quantile)
+
+    dict_summary["nbr_counter_resets"] = group_sum(dict_stats["counter_step"] == _TS_STEP_RESET)
+    dict_summary["nbr_counter_anomalies"] = group_sum(dict_stats["counter_step"] == _TS_STEP_ANOMALY)
+    dict_summary["nbr_lost_packets"] = array_nbr_lost_packets
+    dict_summary["loss_rate"] = array_nbr_lost_packets / np.maximum(array_nbr_packets + array_nbr_lost_packets, 1)
+
+    return dict_summary
+
+
+def write_table(path, dict_columns, float_format="{:.4g}"):
+    """Write a dict of columns (as given by summarize_message_stats) as a csv file, one row per entry."""
+    list_names = list(dict_columns.keys())
+    with open(path, "w") as fh:
+        csv_writer = csv.writer(fh)
+        csv_writer.writerow(list_names)
+        for crrt_row in zip(*[dict_columns[crrt_name].tolist() for crrt_name in list_names]):
+            csv_writer.writerow([float_format.format(crrt_value) if isinstance(crrt_value, float) else crrt_value for crrt_value in crrt_row])
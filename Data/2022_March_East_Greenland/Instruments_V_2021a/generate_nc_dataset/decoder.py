@@ -4,18 +4,10 @@
 import binascii
 import struct
 import datetime
-import time
-import os
 from dataclasses import dataclass
-import click
-from icecream import ic
+from functools import cached_property
 import math
 import numpy as np
-import matplotlib.pyplot as plt
-import pprint
-
-ic.configureOutput(prefix='', outputFunction=print)
-p_print = pprint.PrettyPrinter(indent=2).pprint
 
 """
 A bit of nomenclature:
@@ -25,12 +17,6 @@ A bit of nomenclature:
 - a message is then composed of 3 parts: kind (which kind of data is in the message), metadata, and list of packets
 """
 
-#--------------------------------------------------------------------------------
-# make sure we are all UTC
-
-os.environ["TZ"] = "UTC"
-time.tzset()
-
 #--------------------------------------------------------------------------------
 # a few module constants
 
@@ -59,6 +45,11 @@ _BD_YWAVE_PACKET_LENGTH = \
 LENGTH_FROM_SERIAL_OUTPUT = 138
 assert _BD_YWAVE_PACKET_LENGTH == LENGTH_FROM_SERIAL_OUTPUT, "the arduino printout indicates that wave packets have length {}".format(LENGTH_FROM_SERIAL_OUTPUT)
 
+# frequency tables of the wave packets; these are the same for all packets
+_BD_YWAVE_FREQUENCIES = (_BD_YWAVE_PACKET_MIN_BIN + np.arange(_BD_YWAVE_NBR_BINS)) * _BD_YWAVE_PACKET_FRQ_RES
+_BD_YWAVE_LIST_FREQUENCIES = _BD_YWAVE_FREQUENCIES.tolist()
+_BD_YWAVE_OMEGA_4 = (2.0 * math.pi * _BD_YWAVE_FREQUENCIES)**4
+
 ####################
 # properties of the thermistors packets
 _BD_THERM_MSG_FIXED_LENGTH = 3  # start byte, byte metadata nbr packets, byte end
@@ -70,11 +61,28 @@ _BD_THERM_ROLL_FLOAT_TO_INT8_FACTOR = 0.7
 _BD_THERM_PITCH_FLOAT_TO_INT8_FACTOR = 1.4
 # factor for converting bin 12 bits signed int to temperature; from thermistor datasheet
 _BD_THERM_12BITS_TO_FLOAT_TEMPERATURE_FACTOR = 1.0 / 16.0
+# the attitude bytes at the end of each thermistors packet, in order, and their int8 to float factor
+_BD_THERM_ATTITUDE_FIELDS = ["mean_pitch", "mean_roll", "min_pitch", "max_pitch", "min_roll", "max_roll"]
+_BD_THERM_ATTITUDE_FLOAT_TO_INT8_FACTORS = np.array([
+    _BD_THERM_PITCH_FLOAT_TO_INT8_FACTOR,
+    _BD_THERM_ROLL_FLOAT_TO_INT8_FACTOR,
+    _BD_THERM_PITCH_FLOAT_TO_INT8_FACTOR,
+    _BD_THERM_PITCH_FLOAT_TO_INT8_FACTOR,
+    _BD_THERM_ROLL_FLOAT_TO_INT8_FACTOR,
+    _BD_THERM_ROLL_FLOAT_TO_INT8_FACTOR,
+])
 
 #--------------------------------------------------------------------------------
 # misc
 
 
+def _debug_ic():
+    """icecream is only used for the debug prints, and is slow to import: import it only when needed."""
+    from icecream import ic
+    ic.configureOutput(prefix='', outputFunction=print)
+    return ic
+
+
 def get_version():
     return _BD_VERSION_NBR
 
@@ -138,6 +146,8 @@ class GNSS_Metadata:
 
 @dataclass
 class Waves_Packet:
+    """Only the raw fields are set at decoding; the spectra and the spectral moments are derived lazily,
+    the first time they are accessed, from the frequency tables shared by all packets."""
     datetime_fix: datetime.datetime
     spectrum_number: int
     Hs: float
@@ -145,13 +155,54 @@ class Waves_Packet:
     Tc: float
     _array_max_value: float
     _array_uint16: float
-    list_frequencies: list
-    list_acceleration_energies: list
-    frequency_resolution: float
-    list_elevation_energies: list
-    wave_spectral_moments: Spectral_Moments
     is_valid: bool
 
+    frequency_resolution = _BD_YWAVE_PACKET_FRQ_RES
+
+    @property
+    def list_frequencies(self):
+        return _BD_YWAVE_LIST_FREQUENCIES
+
+    @cached_property
+    def _acceleration_energies(self):
+        return np.array(self._array_uint16) * self._array_max_value / _BD_YWAVE_PACKET_SCALER
+
+    @cached_property
+    def _elevation_energies(self):
+        return self._acceleration_energies / _BD_YWAVE_OMEGA_4
+
+    @cached_property
+    def list_acceleration_energies(self):
+        return self._acceleration_energies.tolist()
+
+    @cached_property
+    def list_elevation_energies(self):
+        return self._elevation_energies.tolist()
+
+    @cached_property
+    def wave_spectral_moments(self):
+        return Spectral_Moments(
+            np.trapz(self._elevation_energies, _BD_YWAVE_FREQUENCIES),
+            np.trapz(_BD_YWAVE_FREQUENCIES**2 * self._elevation_energies, _BD_YWAVE_FREQUENCIES),
+            np.trapz(_BD_YWAVE_FREQUENCIES**4 * self._elevation_energies, _BD_YWAVE_FREQUENCIES),
+        )
+
+    def __getstate__(self):
+        # the derived fields are cheap to re-compute, do not bloat the pickles with them
+        return {crrt_key: crrt_value for (crrt_key, crrt_value) in self.__dict__.items() if crrt_key not in _WAVES_PACKET_DERIVED_FIELDS}
+
+
+_WAVES_PACKET_DERIVED_FIELDS = [
+    "_acceleration_energies",
+    "_elevation_energies",
+    "list_acceleration_energies",
+    "list_elevation_energies",
+    "wave_spectral_moments",
+    # these were stored on each packet by earlier versions of the decoder
+    "list_frequencies",
+    "frequency_resolution",
+]
+
 
 @dataclass
 class Waves_Metadata:
@@ -188,6 +239,7 @@ class Thermistors_Metadata:
 
 def hex_to_bin_message(hex_string_message, print_info=False):
     if print_info:
+        ic = _debug_ic()
         ic(hex_string_message)
     bin_msg = binascii.unhexlify(hex_string_message)
     return bin_msg
@@ -218,6 +270,7 @@ def decode_gnss_packet(bin_packet, print_decoded=False, print_debug_information=
 
     if print_debug_information:
         print("------ START PRINT GNSS DEBUG INFO -----")
+        ic = _debug_ic()
         ic(posix_timestamp_fix)
         ic(datetime_fix)
         ic(latitude_long)
@@ -332,6 +385,7 @@ def decode_ywave_packet(bin_packet, print_decoded=False, print_debug_information
 
     if print_debug_information:
         print("----- YWAVE START DEBUG INFORMATION -----")
+        ic = _debug_ic()
         ic(posix_timestamp)
         ic(spectrum_number)
         ic(Hs)
@@ -342,36 +396,6 @@ def decode_ywave_packet(bin_packet, print_decoded=False, print_debug_information
         ic(is_valid)
         print("----- YWAVE END DEBUG INFORMATION -----")
 
-    list_frequencies = []
-    list_acceleration_energies = []
-
-    for ind, crrt_uint16 in enumerate(_array_uint16):
-        list_frequencies.append((_BD_YWAVE_PACKET_MIN_BIN + ind) * _BD_YWAVE_PACKET_FRQ_RES)
-        list_acceleration_energies.append(crrt_uint16 * _array_max_value / _BD_YWAVE_PACKET_SCALER)
-
-    list_omega = [2.0 * math.pi * crrt_freq for crrt_freq in list_frequencies]
-    list_omega_4 = [math.pow(crrt_omega, 4) for crrt_omega in list_omega]
-    list_elevation_energies = [crrt_acceleration_energy / crrt_omega_4 for (crrt_acceleration_energy, crrt_omega_4) in zip(list_acceleration_energies, list_omega_4)]
-
-    def compute_spectral_moment(list_frequencies, list_elevation_energies, order):
-        list_to_integrate = [
-            math.pow(crrt_freq, order) * crrt_energy for (crrt_freq, crrt_energy) in zip(list_frequencies, list_elevation_energies)
-        ]
-
-        moment = np.trapz(list_to_integrate, list_frequencies)
-
-        return moment
-
-    m0 = compute_spectral_moment(list_frequencies, list_elevation_energies, 0)
-    m2 = compute_spectral_moment(list_frequencies, list_elevation_energies, 2)
-    m4 = compute_spectral_moment(list_frequencies, list_elevation_energies, 4)
-
-    spectral_moments = Spectral_Moments(
-        m0,
-        m2,
-        m4
-    )
-
     decoded_packet = Waves_Packet(
         datetime_packet,
         spectrum_number,
@@ -380,16 +404,12 @@ def decode_ywave_packet(bin_packet, print_decoded=False, print_debug_information
         Tc,
         _array_max_value,
         _array_uint16,
-        list_frequencies,
-        list_acceleration_energies,
-        _BD_YWAVE_PACKET_FRQ_RES,
-        list_elevation_energies,
-        spectral_moments,
         is_valid
     )
 
     if print_decoded:
         print("----- YWAVE START PRINT DECODED -----")
+        ic = _debug_ic()
         ic(datetime_packet)
         ic(spectrum_number)
         ic(is_valid)
@@ -397,11 +417,15 @@ def decode_ywave_packet(bin_packet, print_decoded=False, print_debug_information
         ic(Tz)
         ic(Tc)
         print("acceleration energy spectrum:")
-        for freq, energy in zip(list_frequencies, list_acceleration_energies):
+        for freq, energy in zip(decoded_packet.list_frequencies, decoded_packet.list_acceleration_energies):
             print("  acceleration spectrum energy at {:.8f} Hz : {:16.8f}".format(freq, energy))
         print("----- YWAVE END PRINT DECODED -----")
 
         print("----- YWAVE START PRINT DERIVED -----")
+        m0 = decoded_packet.wave_spectral_moments.m0
+        m2 = decoded_packet.wave_spectral_moments.m2
+        m4 = decoded_packet.wave_spectral_moments.m4
+        ic = _debug_ic()
         ic(m0)
         ic(m2)
         ic(m4)
@@ -409,7 +433,7 @@ def decode_ywave_packet(bin_packet, print_decoded=False, print_debug_information
         ic(math.sqrt(m2 / m0))
         ic(math.sqrt(m4 / m2))
         print("elevation energy spectrum:")
-        for freq, energy in zip(list_frequencies, list_elevation_energies):
+        for freq, energy in zip(decoded_packet.list_frequencies, decoded_packet.list_elevation_energies):
             print("  elevation spectrum energy at {:.8f} Hz : {:16.8f}".format(freq, energy))
         if not is_valid:
             print("*** CAUTIOUS: THIS IS INVALID PACKET!!! ***")
@@ -459,6 +483,7 @@ def decode_thermistor_reading(crrt_thermistor_bin, print_debug_information=False
     range_6_bits_bin = one_byte_to_int(crrt_thermistor_bin[2:3]) % 64
 
     if print_debug_information:
+        ic = _debug_ic()
         ic(id_6_bits)
 
         ic(reading_2_higher_bits)
@@ -483,12 +508,14 @@ def decode_thermistor_reading(crrt_thermistor_bin, print_debug_information=False
 
 
 def print_thermistor_reading(crrt_thermistor_reading):
+    ic = _debug_ic()
     ic(crrt_thermistor_reading.probe_id)
     ic(crrt_thermistor_reading.mean_temperature)
     ic(crrt_thermistor_reading.range_temperature)
 
 
 def print_thermistor_packet(crrt_thermistor_packet):
+    ic = _debug_ic()
     ic(crrt_thermistor_packet.datetime_packet)
     ic(crrt_thermistor_packet.mean_pitch)
     ic(crrt_thermistor_packet.min_pitch)
@@ -547,6 +574,7 @@ def decode_thermistors_packet(bin_packet, print_decoded=False, print_debug_infor
     assert crrt_start_field == _BD_THERM_PACKET_LENGTH
 
     if print_debug_information:
+        ic = _debug_ic()
         ic(mean_pitch_bin)
         ic(mean_roll_bin)
         ic(min_pitch_bin)
@@ -645,6 +673,7 @@ def decode_message(hex_string_message, print_decoded=True, print_debug_informati
 def auto_test():
     # TODO: assert all results for correct values
     print("------------------------------ START AUTO TEST ------------------------------")
+    ic = _debug_ic()
 
     hex_in = "4704469cb62a6007160f2ef5581e1246c2b62a60d3150f2e1b5b1e1246e8b62a6009110f2e2e8a1e1245"
     ic(hex_in)
@@ -664,140 +693,7 @@ def auto_test():
     print("------------------------------ END AUTO TEST ------------------------------")
 
 
-def plot_wave_packet(list_wave_packet_in):
-    wave_packet_in = list_wave_packet_in[0]
-
-    plt.figure()
-    plt.plot(wave_packet_in.list_frequencies, wave_packet_in.list_elevation_energies)
-    plt.xlabel("frq [Hz]")
-    plt.ylabel("S$_{\eta}$(f) [m$^2$/Hz]")
-    title_str = "{}, Hs={:05.2f}m, Tz={:05.2f}s".format(wave_packet_in.datetime_fix, wave_packet_in.Hs, wave_packet_in.Tz)
-    plt.title(title_str)
-    plt.tight_layout()
-    plt.show()
-
-
-def plot_gnss_fixes(list_gnss_packets_in):
-    list_lats = [crrt_packet.latitude for crrt_packet in list_gnss_packets_in]
-    list_lons = [crrt_packet.longitude for crrt_packet in list_gnss_packets_in]
-
-
-    fig, ax = plt.subplots()
-    plt.plot(list_lons, list_lats)
-    ax.annotate("Start", (list_lons[0], list_lats[0]))
-    plt.scatter(list_lons[0], list_lats[0], s=80)
-    plt.xlabel("lon [DD East]")
-    plt.ylabel("lat [DD North]")
-    title_str = "drift {} to {}".format(list_gnss_packets_in[0].datetime_fix, list_gnss_packets_in[-1].datetime_fix)
-    plt.title(title_str)
-    plt.tight_layout()
-    plt.show()
-
-
-def plot_decoded(message_kind, message_metadata, list_decoded_packets):
-    if message_kind == "Y":
-        plot_wave_packet(list_decoded_packets)
-    elif message_kind == "G":
-        plot_gnss_fixes(list_decoded_packets)
-    else:
-        raise RuntimeError("Unknown message_kind: {}".format(message_kind))
-
-#--------------------------------------------------------------------------------
-# simple CLI
-
-@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
-@click.option('--example', '-e', is_flag=True, help="Example of installation and use")
-@click.option('--module', '-m', is_flag=True, help="Show how to use as a module")
-@click.option('--autotest', '-t', is_flag=True, help="Run a few autotests to check that the package works")
-@click.option('--version', '-s', is_flag=True, help="Print the version number")
-@click.option('--verbose', '-v', is_flag=True, help="Turn on verbosity")
-@click.option('--verbose-debug', '-b', is_flag=True, help="Turn on verbosity to debug level")
-@click.option('--decode-hex', '-d', default=None, help="Decode the provided hex message")
-@click.option('--plot', '-p', is_flag=True, help="Plot the data contained in the message")
-def cli(example, module, autotest, version, verbose, verbose_debug, plot, decode_hex):
-    """
-    Simple CLI for decoding tracker messages.
-    This can be added as a command by copying into $HOME/bin and making executable.
-    (you may need to $ source ~/.profile to activate)
-    """
-
-    if example:
-        print("download messages directly from Rock7: https://rockblock.rock7.com/ > Messages > Export > Payload")
-        print("for example decoding a GNSS message with 3 packets obtained there:")
-        print("    $ ./decoder.py --verbose --decode-hex 4704469cb62a6007160f2ef5581e1246c2b62a60d3150f2e1b5b1e1246e8b62a6009110f2e2e8a1e1245")
-        print("    ----------------------- START DECODE GNSS MESSAGE -----------------------")
-        print("    expected number of packets based on message length: 3")
-        print("    number of fixes since boot at message creation: 4")
-        print("    -------------------- decoded GNSS packet ---------------------")
-        print("    fix at posix 1613411996, i.e. 2021-02-15 17:59:56")
-        print("    latitude 772740615, i.e. 77.2740615")
-        print("    longitude 303978741, i.e. 30.3978741")
-        print("    --------------------------------------------------------------")
-        print("    -------------------- decoded GNSS packet ---------------------")
-        print("    fix at posix 1613412034, i.e. 2021-02-15 18:00:34")
-        print("    latitude 772740563, i.e. 77.2740563")
-        print("    longitude 303979291, i.e. 30.3979291")
-        print("    --------------------------------------------------------------")
-        print("    -------------------- decoded GNSS packet ---------------------")
-        print("    fix at posix 1613412072, i.e. 2021-02-15 18:01:12")
-        print("    latitude 772739337, i.e. 77.2739337")
-        print("    longitude 303991342, i.e. 30.3991342")
-        print("    --------------------------------------------------------------")
-        print("    ----------------------- DONE DECODE GNSS MESSAGE -----------------------")
-        print("this can also be shortened into: $ ./decoder.py -vd 470146fa30dc602521ba23b4575d0645")
-        print("i.e. the abbreviated form for verbose decode is '-vd'")
-
-    if module:
-        print("this can be used as a module after adding to PYTHONPATH")
-        print("    $ python3")
-        print("    >>> from decoder import *")
-        print('    >>> kind, metadata, list_decoded = decode_message("4704469cb62a6007160f2ef5581e1246c2b62a60d3150f2e1b5b1e1246e8b62a6009110f2e2e8a1e1245")')
-        print("    ----------------------- START DECODE GNSS MESSAGE -----------------------")
-        print("    expected number of packets based on message length: 3")
-        print("    number of fixes since boot at message creation: 4")
-        print("    -------------------- decoded GNSS packet ---------------------")
-        print("    fix at posix 1613411996, i.e. 2021-02-15 17:59:56")
-        print("    latitude 772740615, i.e. 77.2740615")
-        print("    longitude 303978741, i.e. 30.3978741")
-        print("    --------------------------------------------------------------")
-        print("    -------------------- decoded GNSS packet ---------------------")
-        print("    fix at posix 1613412034, i.e. 2021-02-15 18:00:34")
-        print("    latitude 772740563, i.e. 77.2740563")
-        print("    longitude 303979291, i.e. 30.3979291")
-        print("    --------------------------------------------------------------")
-        print("    -------------------- decoded GNSS packet ---------------------")
-        print("    fix at posix 1613412072, i.e. 2021-02-15 18:01:12")
-        print("    latitude 772739337, i.e. 77.2739337")
-        print("    longitude 303991342, i.e. 30.3991342")
-        print("    --------------------------------------------------------------")
-        print("    ----------------------- DONE DECODE GNSS MESSAGE -----------------------")
-        print("    >>> kind")
-        print("    'G'")
-        print("    >>> metadata")
-        print("    GNSS_Metadata(nbr_gnss_fixes=4)")
-        print("    >>> for i in list_decoded:")
-        print("    ...     print(i)")
-        print("    ... ")
-        print("    GNSS_Packet(datetime_fix=datetime.datetime(2021, 2, 15, 17, 59, 56), latitude=77.2740615, longitude=30.3978741)")
-        print("    GNSS_Packet(datetime_fix=datetime.datetime(2021, 2, 15, 18, 0, 34), latitude=77.2740563, longitude=30.3979291)")
-        print("    GNSS_Packet(datetime_fix=datetime.datetime(2021, 2, 15, 18, 1, 12), latitude=77.2739337, longitude=30.3991342)")
-
-    if autotest:
-        print("we will now run a few diagnostic tests to check that the module is working fine...")
-        print("these tests should decode some test messages to check that all work well...")
-        print()
-        auto_test()
-
-    if version:
-        print("version {}".format(_BD_VERSION_NBR))
-
-    if decode_hex:
-        message_kind, message_metadata, list_decoded_packets = decode_message(decode_hex, print_decoded=verbose, print_debug_information=verbose_debug)
-
-        if plot:
-            plot_decoded(message_kind, message_metadata, list_decoded_packets)
-
-
 if __name__ == "__main__":
+    # the plotting and the CLI live in decoder_cli.py, so that importing the decoder stays light
+    from decoder_cli import cli
     cli()
-
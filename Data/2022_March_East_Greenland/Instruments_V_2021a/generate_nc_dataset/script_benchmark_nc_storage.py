@@ -0,0 +1,119 @@
+# benchmark of the storage profiles of nc_storage_profiles.py: the dataset written by create_nc_dataset.py is written
+# again under each profile, and for each we measure the size of the file, the time to write it, and the time to read:
+# - the full time series (time, position, spectra) of one trajectory, averaged over all the trajectories;
+# - all the spectra and positions of all the trajectories at one time window, averaged over nbr_time_windows windows
+# each read is done on a freshly opened file, and the best of nbr_repeats is kept; the data read back are checked
+# to be the same as in the input file, as all the profiles are lossless
+
+import os
+import tempfile
+import time
+
+import netCDF4 as nc4
+import numpy as np
+
+import nc_storage_profiles
+
+input_file = "data_drift_waves_Greenland_2022_seals_cruise.nc"
+
+nbr_repeats = 5
+nbr_time_windows = 20
+
+# the variables read for each trajectory, and for each time window
+list_variables_trajectory = ["time", "lat", "lon", "wave_spectrum"]
+list_variables_time_window = ["lat", "lon", "wave_spectrum"]
+
+
+def write_with_profile(nc4_in, path_out, storage_profile):
+    """write all the content of nc4_in to path_out, with the storage profile"""
+    with nc4.Dataset(path_out, "w", format="NETCDF4") as nc4_out:
+        nc4_out.set_auto_mask(False)
+        nc4_out.setncatts(nc4_in.__dict__)
+
+        for crrt_name, crrt_dimension in nc4_in.dimensions.items():
+            nc4_out.createDimension(crrt_name, len(crrt_dimension))
+
+        for crrt_name, crrt_var_in in nc4_in.variables.items():
+            crrt_var_out = nc_storage_profiles.create_variable(nc4_out, storage_profile, crrt_name, crrt_var_in.dtype, crrt_var_in.dimensions)
+            crrt_var_out.setncatts(crrt_var_in.__dict__)
+            crrt_var_out[:] = crrt_var_in[:]
+
+
+def best_read_time(path, read_function):
+    """best wall time, over nbr_repeats freshly opened files, to run read_function(nc4_in); and its result"""
+    list_times = []
+    for _ in range(nbr_repeats):
+        with nc4.Dataset(path, "r") as nc4_in:
+            nc4_in.set_auto_mask(False)
+            crrt_start = time.perf_counter()
+            result = read_function(nc4_in)
+            list_times.append(time.perf_counter() - crrt_start)
+    return min(list_times), result
+
+
+# ------------------------------------------------------------------------------------------
+print("***** load the reference data")
+
+with nc4.Dataset(input_file, "r") as nc4_in:
+    nc4_in.set_auto_mask(False)
+    dict_reference = {crrt_name: nc4_in[crrt_name][:] for crrt_name in nc4_in.variables}
+
+nbr_trajectories = dict_reference["time"].shape[0]
+array_is_entry = dict_reference["message_kind"] != b"\0"
+time_min = np.min(dict_reference["time"][array_is_entry])
+time_max = np.max(dict_reference["time"][array_is_entry])
+array_window_edges = np.linspace(time_min, time_max, nbr_time_windows + 1)
+
+# the block of observations covering each time window, over all the trajectories; found once for all from the
+# reference data, as a reader would from an index, so that only the access to the data themselves is timed
+list_time_window_slices = []
+for crrt_window_start, crrt_window_end in zip(array_window_edges[:-1], array_window_edges[1:]):
+    array_in_window = array_is_entry & (dict_reference["time"] >= crrt_window_start) & (dict_reference["time"] < crrt_window_end)
+    array_observations = np.nonzero(np.any(array_in_window, axis=0))[0]
+    if array_observations.shape[0] > 0:
+        list_time_window_slices.append(slice(array_observations[0], array_observations[-1] + 1))
+
+print("{} trajectories, {} observations, {} time windows".format(nbr_trajectories, dict_reference["time"].shape[1], len(list_time_window_slices)))
+
+# ------------------------------------------------------------------------------------------
+print("***** write and read under each storage profile")
+
+print("{:12s} {:>10s} {:>10s} {:>16s} {:>16s}".format("profile", "size kB", "write ms", "trajectory ms", "time window ms"))
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for crrt_profile in nc_storage_profiles.storage_profile_names():
+        crrt_path = os.path.join(tmp_dir, "{}.nc".format(crrt_profile))
+
+        with nc4.Dataset(input_file, "r") as nc4_in:
+            nc4_in.set_auto_mask(False)
+            crrt_start = time.perf_counter()
+            write_with_profile(nc4_in, crrt_path, crrt_profile)
+            crrt_write_time = time.perf_counter() - crrt_start
+
+        crrt_trajectory_time = 0.0
+        for crrt_trajectory in range(nbr_trajectories):
+            crrt_time, dict_read = best_read_time(
+                crrt_path,
+                lambda nc4_in: {crrt_name: nc4_in[crrt_name][crrt_trajectory] for crrt_name in list_variables_trajectory}
+            )
+            crrt_trajectory_time += crrt_time / nbr_trajectories
+            for crrt_name in list_variables_trajectory:
+                assert np.array_equal(dict_read[crrt_name], dict_reference[crrt_name][crrt_trajectory])
+
+        crrt_time_window_time = 0.0
+        for crrt_slice in list_time_window_slices:
+            crrt_time, dict_read = best_read_time(
+                crrt_path,
+                lambda nc4_in: {crrt_name: nc4_in[crrt_name][:, crrt_slice] for crrt_name in list_variables_time_window}
+            )
+            crrt_time_window_time += crrt_time / len(list_time_window_slices)
+            for crrt_name in list_variables_time_window:
+                assert np.array_equal(dict_read[crrt_name], dict_reference[crrt_name][:, crrt_slice])
+
+        print("{:12s} {:10.1f} {:10.1f} {:16.3f} {:16.3f}".format(
+            crrt_profile,
+            os.path.getsize(crrt_path) / 1e3,
+            1e3 * crrt_write_time,
+            1e3 * crrt_trajectory_time,
+            1e3 * crrt_time_window_time,
+        ))